@@ -0,0 +1,119 @@
+from typing import Any, List, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
+
+from app.core.profiling import memory_tracker, profile_store
+from app.db.slow_queries import slow_query_log
+from app.schemas.admin import MemoryGrowth, MemoryStatus, ProfileArtifact, SlowQuerySummary
+from app.services.auth import Principal, get_current_teacher
+
+router = APIRouter()
+
+
+@router.get("/slow-queries", response_model=List[SlowQuerySummary])
+def read_slow_queries(
+    sort: Literal["total_ms", "count", "p95_ms", "max_ms"] = "total_ms",
+    limit: int = Query(50, ge=1, le=500),
+    current_user: Principal = Depends(get_current_teacher),
+) -> Any:
+    """
+    スロークエリをフィンガープリントごとに集計して返す (教員のみ)
+
+    集計はこのワーカーが起動してから記録したものに限る。
+    すべての記録はスロークエリログ (JSONL) にある。
+    """
+    return slow_query_log.summaries(sort=sort, limit=limit)
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+def clear_slow_queries(
+    current_user: Principal = Depends(get_current_teacher),
+) -> None:
+    """
+    このワーカーのスロークエリの集計を消去する (教員のみ)
+    """
+    slow_query_log.clear()
+
+
+@router.get("/profiles", response_model=List[ProfileArtifact])
+def read_profiles(
+    current_user: Principal = Depends(get_current_teacher),
+) -> Any:
+    """
+    保存されたプロファイルの一覧を新しい順に返す (教員のみ)
+    """
+    return profile_store.list()
+
+
+@router.get("/profiles/{profile_id}")
+def download_profile(
+    profile_id: str,
+    current_user: Principal = Depends(get_current_teacher),
+) -> Any:
+    """
+    プロファイルをダウンロードする (教員のみ)
+
+    ``.speedscope.json`` は https://www.speedscope.app で、
+    ``.prof`` は snakeviz や pstats で開く。
+    """
+    path = profile_store.find(profile_id)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found",
+        )
+    return FileResponse(path, filename=path.name, media_type="application/octet-stream")
+
+
+@router.get("/memory", response_model=MemoryStatus)
+def read_memory_status(
+    current_user: Principal = Depends(get_current_teacher),
+) -> Any:
+    """
+    このワーカーの tracemalloc の状態を返す (教員のみ)
+    """
+    return memory_tracker.status()
+
+
+@router.post("/memory/snapshot", response_model=MemoryStatus)
+def take_memory_snapshot(
+    current_user: Principal = Depends(get_current_teacher),
+) -> Any:
+    """
+    このワーカーのメモリの割り当てのスナップショットを取り、比較の基準にする (教員のみ)
+
+    追跡していなければここで tracemalloc を開始する。追跡中は割り当てが遅くなる。
+    """
+    return memory_tracker.snapshot()
+
+
+@router.get("/memory/diff", response_model=List[MemoryGrowth])
+def read_memory_diff(
+    key_type: Literal["lineno", "filename", "traceback"] = "lineno",
+    limit: int = Query(20, ge=1, le=200),
+    current_user: Principal = Depends(get_current_teacher),
+) -> Any:
+    """
+    基準のスナップショットから増えた割り当てを大きい順に返す (教員のみ)
+
+    スナップショットはワーカーごとに保持するため、複数ワーカーでは同じワーカーに
+    届いたときだけ比較できる。
+    """
+    growth = memory_tracker.diff(limit=limit, key_type=key_type)
+    if growth is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No memory snapshot has been taken in this worker",
+        )
+    return growth
+
+
+@router.delete("/memory", status_code=status.HTTP_204_NO_CONTENT)
+def stop_memory_tracking(
+    current_user: Principal = Depends(get_current_teacher),
+) -> None:
+    """
+    このワーカーの tracemalloc を止め、基準のスナップショットを破棄する (教員のみ)
+    """
+    memory_tracker.stop()
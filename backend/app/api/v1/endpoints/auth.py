@@ -1,62 +1,93 @@
-from datetime import timedelta
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.config import settings
-from app.db.base import get_db
+from app.db.base import get_async_db
 from app.models.user import User
-from app.schemas.token import Token
+from app.schemas.token import Token, TokenRefresh
 from app.schemas.user import UserCreate, UserResponse
-from app.services.auth import authenticate_user, create_access_token, get_current_active_user
+from app.services.auth import (
+    Principal,
+    authenticate_user_async,
+    decode_token,
+    get_current_active_user,
+    get_current_user_model,
+    oauth2_scheme,
+    password_hasher,
+)
+from app.services.token import InvalidRefreshToken, issue_tokens, logout, rotate_refresh_token
 from app.services.user import create_user, get_user_by_email
 
 router = APIRouter()
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_in: UserCreate, db: Session = Depends(get_db)) -> Any:
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)) -> Any:
     """
     ユーザー登録エンドポイント
     """
-    user = get_user_by_email(db, email=user_in.email)
+    user = await db.run_sync(get_user_by_email, user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system.",
         )
-    user = create_user(db, user_create=user_in)
+    password_hash = await password_hasher.hash_async(user_in.password)
+    user = await db.run_sync(create_user, user_in, password_hash)
     return user
 
 
 @router.post("/login", response_model=Token)
-def login_access_token(
-    db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
+async def login_access_token(
+    db: AsyncSession = Depends(get_async_db), form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2互換のトークンログインエンドポイント
     """
-    user = authenticate_user(db, email=form_data.username, password=form_data.password)
+    user = await authenticate_user_async(db, email=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    return {
-        "access_token": create_access_token(
-            data={"sub": str(user.id), "role": user.role}, expires_delta=access_token_expires
-        ),
-        "token_type": "bearer",
-    }
+    return await db.run_sync(issue_tokens, user)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    token_in: TokenRefresh, db: AsyncSession = Depends(get_async_db)
+) -> Any:
+    """
+    リフレッシュトークンをローテーションし、新しいトークンを発行する
+    """
+    try:
+        return await db.run_sync(rotate_refresh_token, token_in.refresh_token)
+    except InvalidRefreshToken as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_user(
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme),
+    current_user: Principal = Depends(get_current_active_user),
+) -> None:
+    """
+    現在のアクセストークンとそのログインのリフレッシュトークンを失効させる
+    """
+    await db.run_sync(logout, decode_token(token))
 
 
 @router.post("/test-token", response_model=UserResponse)
-def test_token(current_user: User = Depends(get_current_active_user)) -> Any:
+async def test_token(current_user: User = Depends(get_current_user_model)) -> Any:
     """
     トークンのテスト用エンドポイント
     """
-    return current_user
\ No newline at end of file
+    return current_user
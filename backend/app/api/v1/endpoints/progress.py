@@ -1,14 +1,27 @@
-from typing import Any, Dict, List
+from typing import Annotated, Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.base import get_db
-from app.models.user import User
-from app.schemas.user_progress import UserAnswerCreate, UserAnswerResponse, UserProgressResponse
-from app.services.auth import get_current_active_user
+from app.db.base import get_async_db
+from app.schemas.user_progress import (
+    ReviewQueueItem,
+    UserAnswerCreate,
+    UserAnswerResponse,
+    UserProgressResponse,
+)
+from app.services.auth import Principal, get_current_active_user, get_read_db
+from app.services.idempotency import (
+    IdempotencyKeyConflict,
+    IdempotencyKeyReused,
+    find_response,
+    request_fingerprint,
+)
 from app.services.problem import get_problem_by_id
 from app.services.user_progress import (
+    encode_answer_cursor,
+    get_review_queue,
     get_user_answers,
     get_user_progress,
     get_user_stats,
@@ -19,67 +32,145 @@ router = APIRouter()
 
 
 @router.post("/submit", response_model=UserAnswerResponse)
-def submit_problem_answer(
+async def submit_problem_answer(
     answer_in: UserAnswerCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user),
+    idempotency_key: Annotated[Optional[str], Header(alias="Idempotency-Key", max_length=255)] = None,
+    response: Response = None,
 ) -> Any:
     """
     問題への回答を提出する
+
+    Idempotency-Key ヘッダー付きの再送には、新たに記録せず最初の結果を返す。
     """
-    problem = get_problem_by_id(db, answer_in.problem_id)
-    if not problem:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Problem not found",
-        )
-    
-    try:
-        user_answer = submit_answer(
-            db, current_user, answer_in.problem_id, answer_in.selected_choice
-        )
-        return user_answer
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e),
-        )
+    def replay(db: Session) -> Optional[UserAnswerResponse]:
+        fingerprint = request_fingerprint(answer_in.problem_id, answer_in.selected_choice)
+        try:
+            stored = find_response(db, current_user.id, idempotency_key, fingerprint)
+        except IdempotencyKeyReused as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e),
+            )
+        if stored is None:
+            return None
+        if response is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+        return UserAnswerResponse(**stored)
+
+    def submit(db: Session) -> Any:
+        if idempotency_key:
+            replayed = replay(db)
+            if replayed is not None:
+                return replayed
+
+        problem = get_problem_by_id(db, answer_in.problem_id)
+        if not problem:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Problem not found",
+            )
+        
+        try:
+            user_answer = submit_answer(
+                db, current_user, answer_in.problem_id, answer_in.selected_choice,
+                idempotency_key=idempotency_key,
+            )
+            return user_answer
+        except IdempotencyKeyConflict as e:
+            # 並行した再送が先に確定したので、その結果を返す
+            replayed = replay(db)
+            if replayed is None:
+                # 先に確定した結果を読めない場合は、再送を促す
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=str(e),
+                )
+            return replayed
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e),
+            )
+
+    return await db.run_sync(submit)
 
 
 @router.get("/answers", response_model=List[UserAnswerResponse])
-def read_user_answer_history(
+async def read_user_answer_history(
     problem_id: str = None,
-    limit: int = 10,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
+    before: Optional[str] = None,
+    tag: Optional[str] = None,
+    is_correct: Optional[bool] = None,
+    response: Response = None,
 ) -> Any:
     """
     ユーザーの回答履歴を取得する
+
+    続きがある場合は次ページのカーソルを X-Next-Cursor ヘッダーで返す。
     """
-    user_answers = get_user_answers(db, current_user, problem_id, limit)
+    try:
+        user_answers = await db.run_sync(
+            get_user_answers, current_user, problem_id, limit,
+            before=before, tag=tag, is_correct=is_correct,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    if response is not None and user_answers and len(user_answers) == limit:
+        response.headers["X-Next-Cursor"] = encode_answer_cursor(user_answers[-1])
     return user_answers
 
 
 @router.get("/progress", response_model=List[UserProgressResponse])
-def read_user_progress(
+async def read_user_progress(
     problem_id: str = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """
     ユーザーの学習進捗を取得する
     """
-    progress = get_user_progress(db, current_user, problem_id)
+    progress = await db.run_sync(get_user_progress, current_user, problem_id)
     return progress
 
 
+@router.get("/review-queue", response_model=List[ReviewQueueItem])
+async def read_review_queue(
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
+) -> Any:
+    """
+    復習期限を迎えた問題を取得する
+    """
+    due_progress = await db.run_sync(get_review_queue, current_user, limit=limit)
+    return [
+        ReviewQueueItem(
+            problem_id=progress.problem_id,
+            due_at=progress.due_at.isoformat(),
+            stability=progress.stability,
+            ease_factor=progress.ease_factor,
+            attempts=progress.attempts,
+            mastery_level=progress.mastery_level,
+        )
+        for progress in due_progress
+    ]
+
+
 @router.get("/stats", response_model=Dict)
-def read_user_statistics(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+async def read_user_statistics(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """
     ユーザーの統計情報を取得する
     """
-    stats = get_user_stats(db, current_user)
+    stats = await db.run_sync(get_user_stats, current_user)
     return stats
\ No newline at end of file
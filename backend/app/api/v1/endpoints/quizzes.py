@@ -0,0 +1,224 @@
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.base import get_async_db
+from app.models.quiz import QuizSet
+from app.schemas.quiz import (
+    QuizAnswerSubmit,
+    QuizChoice,
+    QuizProblem,
+    QuizSessionStartResponse,
+    QuizSessionStatus,
+    QuizSetCreate,
+    QuizSetResponse,
+)
+from app.services.auth import Principal, get_current_active_user, get_current_teacher, get_read_db
+from app.services.quiz import (
+    QuizSessionClosed,
+    QuizSessionState,
+    create_quiz_set,
+    finalize_session,
+    get_quiz_paper,
+    get_quiz_set_by_id,
+    get_session_state,
+    record_answer,
+    start_session,
+)
+
+router = APIRouter()
+
+
+def _session_status(state: QuizSessionState, score: int = None) -> QuizSessionStatus:
+    return QuizSessionStatus(
+        session_id=state.session_id,
+        status=state.status,
+        answered=state.answered,
+        total=state.total,
+        remaining_seconds=state.remaining_seconds() if state.status == "active" else 0,
+        score=score,
+    )
+
+
+def _quiz_set_response(quiz_set: QuizSet) -> QuizSetResponse:
+    return QuizSetResponse(
+        id=quiz_set.id,
+        title=quiz_set.title,
+        description=quiz_set.description,
+        time_limit_seconds=quiz_set.time_limit_seconds,
+        shuffle_choices=quiz_set.shuffle_choices,
+        created_by=quiz_set.created_by,
+        problem_ids=[entry.problem_id for entry in quiz_set.problems],
+    )
+
+
+async def _get_own_session(
+    db: AsyncSession,
+    session_id: str,
+    current_user: Principal
+) -> QuizSessionState:
+    state = await db.run_sync(get_session_state, session_id)
+    if not state or state.user_id != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Quiz session not found",
+        )
+    return state
+
+
+@router.post("", response_model=QuizSetResponse, status_code=status.HTTP_201_CREATED)
+async def create_new_quiz_set(
+    quiz_in: QuizSetCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_teacher),
+) -> Any:
+    """
+    小テストを作成する (教員のみ)
+    """
+    def create(db: Session) -> QuizSetResponse:
+        try:
+            quiz_set = create_quiz_set(db, quiz_in, current_user)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e),
+            )
+        return _quiz_set_response(quiz_set)
+
+    return await db.run_sync(create)
+
+
+@router.get("/{quiz_set_id}", response_model=QuizSetResponse)
+async def read_quiz_set(
+    quiz_set_id: str,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_teacher),
+) -> Any:
+    """
+    小テストの詳細情報を取得する (教員のみ)
+    """
+    def load(db: Session) -> QuizSetResponse:
+        quiz_set = get_quiz_set_by_id(db, quiz_set_id)
+        if not quiz_set:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Quiz not found",
+            )
+        return _quiz_set_response(quiz_set)
+
+    return await db.run_sync(load)
+
+
+@router.post("/{quiz_set_id}/sessions", response_model=QuizSessionStartResponse)
+async def start_quiz_session(
+    quiz_set_id: UUID,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user),
+) -> Any:
+    """
+    小テストの受験を開始する（受験中であれば再開する）
+    """
+    paper = await db.run_sync(get_quiz_paper, quiz_set_id)
+    if not paper:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Quiz not found",
+        )
+
+    try:
+        state = await db.run_sync(start_session, current_user, paper)
+    except QuizSessionClosed as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+        )
+
+    # シャッフル済みの選択肢で問題用紙を組み立てる（正誤は含めない）
+    problems = []
+    for problem, order in zip(paper.problems, paper.choice_order(state.seed)):
+        problems.append(QuizProblem(
+            id=problem.id,
+            title=problem.title,
+            problem_text=problem.problem_text,
+            choices=[
+                QuizChoice(id=problem.choices[i].id, text=problem.choices[i].text)
+                for i in order
+            ],
+        ))
+
+    return QuizSessionStartResponse(
+        session_id=state.session_id,
+        quiz_set_id=paper.quiz_set_id,
+        title=paper.title,
+        expires_at=datetime.utcfromtimestamp(state.expires_at).isoformat(),
+        remaining_seconds=state.remaining_seconds(),
+        problems=problems,
+    )
+
+
+@router.get("/sessions/{session_id}", response_model=QuizSessionStatus)
+async def read_quiz_session(
+    session_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user),
+) -> Any:
+    """
+    受験セッションの状態を取得する
+    """
+    state = await _get_own_session(db, session_id, current_user)
+    return _session_status(state)
+
+
+@router.put("/sessions/{session_id}/answers", response_model=QuizSessionStatus)
+async def answer_quiz_problem(
+    session_id: str,
+    answer_in: QuizAnswerSubmit,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user),
+) -> Any:
+    """
+    受験中の問題に回答する（提出までは何度でも変更可能）
+    """
+    state = await _get_own_session(db, session_id, current_user)
+    try:
+        await db.run_sync(record_answer, state, answer_in.problem_id, answer_in.choice_id)
+    except QuizSessionClosed as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    return _session_status(state)
+
+
+@router.post("/sessions/{session_id}/submit", response_model=QuizSessionStatus)
+async def submit_quiz_session(
+    session_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user),
+) -> Any:
+    """
+    受験セッションを提出して採点する
+    """
+    state = await _get_own_session(db, session_id, current_user)
+    if state.status != "active":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This quiz session is already closed",
+        )
+
+    row = await db.run_sync(finalize_session, state, status="submitted")
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Quiz session not found",
+        )
+    return _session_status(state, score=row.score)
@@ -1,130 +1,144 @@
-from typing import Any, List
+from typing import Any, List, Literal
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.base import get_db
+from app.db.base import get_async_db
 from app.models.problem import Tag
-from app.models.user import User
-from app.schemas.tag import TagCreate, TagResponse, TagUpdate
-from app.services.auth import get_current_active_user, get_current_teacher
+from app.schemas.tag import TagCreate, TagResponse, TagUpdate, TagWithCounts
+from app.services.auth import Principal, get_current_active_user, get_current_teacher, get_read_db
+from app.services.invalidation import notify
+from app.services.tag import cached_tags, load_tags
 
 router = APIRouter()
 
 
-@router.get("", response_model=List[TagResponse])
-def read_tags(
+def _get_tag_or_404(db: Session, tag_id: str) -> Tag:
+    tag = db.query(Tag).filter(Tag.id == tag_id).first()
+    if not tag:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tag not found",
+        )
+    return tag
+
+
+@router.get("", response_model=List[TagWithCounts])
+async def read_tags(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
+    sort: Literal["name", "popularity"] = "name",
 ) -> Any:
     """
-    タグ一覧を取得する
+    タグ一覧を問題数と難易度別の内訳つきで取得する
+
+    sort=name は名前順、sort=popularity は問題数の多い順
     """
-    tags = db.query(Tag).offset(skip).limit(limit).all()
-    return tags
+    # キャッシュか共有カタログにあればデータベースを読まない
+    tags = cached_tags(sort)
+    if tags is None:
+        tags = await db.run_sync(load_tags, sort)
+    return tags[skip:skip + limit]
 
 
 @router.post("", response_model=TagResponse, status_code=status.HTTP_201_CREATED)
-def create_tag(
+async def create_tag(
     tag_in: TagCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_teacher),
 ) -> Any:
     """
     新しいタグを作成する (教員のみ)
     """
-    # 既存のタグがあるか確認
-    tag = db.query(Tag).filter(Tag.name == tag_in.name).first()
-    if tag:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="The tag with this name already exists",
+    def create(db: Session) -> Tag:
+        # 既存のタグがあるか確認
+        tag = db.query(Tag).filter(Tag.name == tag_in.name).first()
+        if tag:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="The tag with this name already exists",
+            )
+        
+        # 新しいタグを作成
+        tag = Tag(
+            name=tag_in.name,
+            description=tag_in.description,
+            created_by=current_user.id,
         )
-    
-    # 新しいタグを作成
-    tag = Tag(
-        name=tag_in.name,
-        description=tag_in.description,
-        created_by=current_user.id,
-    )
-    db.add(tag)
-    db.commit()
-    db.refresh(tag)
-    return tag
+        db.add(tag)
+        db.flush()
+        notify(db, "tag", tag.id)
+        db.commit()
+        db.refresh(tag)
+        return tag
+
+    return await db.run_sync(create)
 
 
 @router.get("/{tag_id}", response_model=TagResponse)
-def read_tag(
+async def read_tag(
     tag_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """
     タグの詳細情報を取得する
     """
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
-    if not tag:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Tag not found",
-        )
-    return tag
+    return await db.run_sync(_get_tag_or_404, tag_id)
 
 
 @router.put("/{tag_id}", response_model=TagResponse)
-def update_tag(
+async def update_tag(
     tag_id: str,
     tag_in: TagUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_teacher),
 ) -> Any:
     """
     タグを更新する (教員のみ)
     """
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
-    if not tag:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Tag not found",
-        )
-    
-    # 同名の別タグがあるか確認
-    if tag_in.name and tag_in.name != tag.name:
-        existing_tag = db.query(Tag).filter(Tag.name == tag_in.name).first()
-        if existing_tag:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="The tag with this name already exists",
-            )
-    
-    # タグの更新
-    update_data = tag_in.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(tag, key, value)
-    
-    db.add(tag)
-    db.commit()
-    db.refresh(tag)
-    return tag
+    def update(db: Session) -> Tag:
+        tag = _get_tag_or_404(db, tag_id)
+        
+        # 同名の別タグがあるか確認
+        if tag_in.name and tag_in.name != tag.name:
+            existing_tag = db.query(Tag).filter(Tag.name == tag_in.name).first()
+            if existing_tag:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="The tag with this name already exists",
+                )
+        
+        # タグの更新
+        update_data = tag_in.dict(exclude_unset=True)
+        for key, value in update_data.items():
+            setattr(tag, key, value)
+        
+        db.add(tag)
+        notify(db, "tag", tag.id)
+        db.commit()
+        db.refresh(tag)
+        return tag
+
+    return await db.run_sync(update)
 
 
 @router.delete("/{tag_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_tag(
+async def delete_tag(
     tag_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_teacher),
 ) -> None:
     """
     タグを削除する (教員のみ)
     """
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
-    if not tag:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Tag not found",
-        )
-    
-    db.delete(tag)
-    db.commit()
\ No newline at end of file
+    def delete(db: Session) -> None:
+        tag = _get_tag_or_404(db, tag_id)
+        db.delete(tag)
+        notify(db, "tag", tag.id)
+        db.commit()
+
+    await db.run_sync(delete)
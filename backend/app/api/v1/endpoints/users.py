@@ -1,20 +1,44 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.base import get_db
+from app.db.base import get_async_db
 from app.models.user import User
 from app.schemas.user import UserResponse, UserUpdate
-from app.services.auth import get_current_active_user, get_current_teacher
+from app.services.auth import (
+    Principal,
+    get_current_teacher,
+    get_current_user_model,
+    get_read_db,
+    password_hasher,
+)
 from app.services.user import get_user_by_id, get_users, update_user, delete_user
 
 router = APIRouter()
 
 
+def _get_user_or_404(db: Session, user_id: str) -> User:
+    user = get_user_by_id(db, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    return user
+
+
+async def _password_hash(user_in: UserUpdate) -> Optional[str]:
+    # ハッシュ計算はイベントループを止めないよう、セッションの外で待つ
+    if not user_in.password:
+        return None
+    return await password_hasher.hash_async(user_in.password)
+
+
 @router.get("/me", response_model=UserResponse)
-def read_user_me(
-    current_user: User = Depends(get_current_active_user),
+async def read_user_me(
+    current_user: User = Depends(get_current_user_model),
 ) -> Any:
     """
     現在のユーザー情報を取得する
@@ -23,83 +47,69 @@ def read_user_me(
 
 
 @router.put("/me", response_model=UserResponse)
-def update_user_me(
+async def update_user_me(
     user_in: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_model),
 ) -> Any:
     """
     自分のユーザー情報を更新する
     """
-    user = update_user(db, current_user, user_in)
+    password_hash = await _password_hash(user_in)
+    user = await db.run_sync(update_user, current_user, user_in, password_hash)
     return user
 
 
 @router.get("", response_model=List[UserResponse])
-def read_users(
+async def read_users(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_teacher),
 ) -> Any:
     """
     ユーザー一覧を取得する (教員のみ)
     """
-    users = get_users(db, skip=skip, limit=limit)
+    users = await db.run_sync(get_users, skip, limit)
     return users
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-def read_user_by_id(
+async def read_user_by_id(
     user_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_teacher),
 ) -> Any:
     """
     ユーザー情報を取得する (教員のみ)
     """
-    user = get_user_by_id(db, user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
-        )
-    return user
+    return await db.run_sync(_get_user_or_404, user_id)
 
 
 @router.put("/{user_id}", response_model=UserResponse)
-def update_user_by_id(
+async def update_user_by_id(
     user_id: str,
     user_in: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_teacher),
 ) -> Any:
     """
     ユーザー情報を更新する (教員のみ)
     """
-    user = get_user_by_id(db, user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
-        )
-    user = update_user(db, user, user_in)
+    user = await db.run_sync(_get_user_or_404, user_id)
+    password_hash = await _password_hash(user_in)
+    user = await db.run_sync(update_user, user, user_in, password_hash)
     return user
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_by_id(
+async def delete_user_by_id(
     user_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_teacher),
 ) -> None:
     """
     ユーザーを削除する (教員のみ)
     """
-    user = get_user_by_id(db, user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
-        )
-    delete_user(db, user)
\ No newline at end of file
+    user = await db.run_sync(_get_user_or_404, user_id)
+    await db.run_sync(delete_user, user)
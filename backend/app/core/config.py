@@ -1,20 +1,153 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: str
+    # 未指定の場合は DATABASE_URL のドライバを非同期のものに置き換えて使う
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800  # 秒。フェイルオーバー後の古い接続を入れ替える (-1 で無効)
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WARMUP: int = 5  # 起動時に開いておく接続数 (プールサイズが上限)
+    # PgBouncer のトランザクションプーリング経由ではサーバー側のプリペアドステートメントを使わない
+    DB_PGBOUNCER_MODE: bool = False
+    # APIのトランザクションに設定する statement_timeout (ミリ秒、0 で無効)
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    DB_STATEMENT_TIMEOUT_BY_ROLE: Dict[str, int] = {}  # 例: {"student": 5000, "teacher": 30000}
+    # 読み取りレプリカ (空ならすべてプライマリを読む)
+    DATABASE_REPLICA_URLS: List[str] = []
+    DB_REPLICA_STRATEGY: str = "round_robin"  # "round_robin" or "least_connections"
+    DB_REPLICA_HEALTH_CHECK_SECONDS: int = 5
+    DB_REPLICA_HEALTH_CHECK_TIMEOUT: float = 2.0
+    DB_REPLICA_MAX_LAG_SECONDS: float = 10.0
+    # 自分で書き込んだユーザーがプライマリを読み続ける秒数
+    DB_READ_YOUR_WRITES_SECONDS: int = 10
 
     # Security settings
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    TOKEN_REVOCATION_SYNC_SECONDS: int = 5
+    TOKEN_REVOCATION_REBUILD_SECONDS: int = 3600
+    TOKEN_REVOCATION_BLOOM_CAPACITY: int = 100000
+    TOKEN_REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2  # 0 で呼び出し元のスレッドで計算する
+    PASSWORD_HASH_MAX_PENDING: int = 16
+
+    # Rate limit settings ("METHOD /path" -> "回数/秒"。パス末尾の * は前方一致)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: Dict[str, str] = {
+        "GET /api/v1/problems": "60/60",
+        "POST /api/v1/progress/submit": "30/60",
+        "POST /api/v1/auth/login": "10/60",
+        # 学内の NAT からまとめて登録されるため IP あたりを多めにする
+        "POST /api/v1/auth/register": "30/60",
+    }
+    # 未認証のリクエストを IP と username の組で数えるルート -> IP ごとの上限
+    # (username を変えながらの試行を抑える。NAT の内側の利用者が分け合う)
+    RATE_LIMIT_BY_USERNAME: Dict[str, str] = {"POST /api/v1/auth/login": "60/60"}
+    RATE_LIMIT_STORAGE_URL: Optional[str] = None  # 例: redis://localhost:6379/0
+
+    # Response settings
+    FAST_JSON_RESPONSE: bool = True  # orjson でレスポンスをシリアライズする
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # バイト。これより小さいレスポンスは圧縮しない
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4  # brotli パッケージがある場合のみ使う
+
+    # Metrics settings (/metrics は Prometheus のテキスト形式)
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING_ENABLED: bool = False  # DB時間とクエリ数を Server-Timing ヘッダーで返す (デバッグ用)
+    # 1リクエストで同じSQL文がこの回数以上実行されたら N+1 クエリの疑いとして記録する (0 で無効)
+    QUERY_REPEAT_THRESHOLD: int = 3
+
+    # Slow query log settings (JSONL。教員は /api/v1/admin/slow-queries で集計を参照できる)
+    SLOW_QUERY_THRESHOLD_MS: float = 500  # この時間以上かかったクエリを記録する (0 で無効)
+    SLOW_QUERY_LOG_PATH: str = "./logs/slow_queries.jsonl"
+    SLOW_QUERY_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS: int = 5
+    # 同じフィンガープリントの EXPLAIN (ANALYZE, BUFFERS) を取る間隔 (PostgreSQL のみ。負の値で無効)
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS: float = 300
+
+    # Profiling settings (教員が X-Profile ヘッダーか ?profile= で要求したリクエストを計測する)
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 1.0  # 要求されたリクエストのうち実際に計測する割合
+    PROFILING_INTERVAL_MS: float = 1.0  # sample モードでスタックを採取する間隔
+    PROFILING_OUTPUT_DIR: str = "./logs/profiles"
+    PROFILING_MAX_ARTIFACTS: int = 50
+    TRACEMALLOC_FRAMES: int = 10  # メモリの割り当て元として記録するスタックの深さ
+
+    # Tracing settings (traceparent を受け取ったリクエストは親のサンプリングの判定に従う)
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 0.01  # 親のないリクエストをサンプリングする割合
+    TRACING_EXPORTER: str = "file"  # "file" (JSONL) or "otlp" (OTLP/HTTP JSON)
+    TRACING_FILE_PATH: str = "./logs/traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318"
+    TRACING_SERVICE_NAME: str = "math-lms-api"
+
+    # Startup settings (ウォームアップが終わるまで /health/ready は 503 を返す)
+    WARMUP_ENABLED: bool = True
+    WARMUP_PREFILL_CACHES: bool = True  # 失効トークンのフィルタと受験中の問題セットを読み込んでおく
+
+    # Shared catalog settings (タグ・問題数・選択肢の正誤をワーカー間の共有メモリに置く)
+    SHARED_CACHE_ENABLED: bool = False  # gunicorn.conf.py では有効にする
+    SHARED_CACHE_NAME: str = "math-lms-catalog"
+    SHARED_CACHE_SIZE_MB: int = 16
+    SHARED_CACHE_REFRESH_SECONDS: float = 1.0  # 無効化されてから作り直すまでの確認間隔
+    SHARED_CACHE_MAX_AGE_SECONDS: int = 3600  # 無効化を取りこぼしても、この秒数で作り直す
+
+    # Tag list settings (問題数つきのタグ一覧をワーカーごとにキャッシュする)
+    TAG_LIST_CACHE_TTL_SECONDS: int = 300  # タグ・問題の変更では通知で破棄する
+
+    # Cache invalidation settings (LISTEN/NOTIFY でワーカー間のキャッシュを無効化する。PostgreSQL のみ)
+    INVALIDATION_ENABLED: bool = True
+    INVALIDATION_CHANNEL: str = "math_lms_invalidation"
+    INVALIDATION_LISTEN_URL: Optional[str] = None  # PgBouncer を使う場合はデータベースへの直接の接続先
+    INVALIDATION_DEBOUNCE_MS: int = 50  # 続けて届く通知をまとめる時間
+    INVALIDATION_KEEPALIVE_SECONDS: float = 30.0
+    INVALIDATION_RECONNECT_SECONDS: float = 5.0
 
     # App settings
     DEBUG: bool = False
     ALLOWED_HOSTS: List[str] = ["localhost", "127.0.0.1"]
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://127.0.0.1:3000"]
 
+    # Quiz session settings
+    QUIZ_SESSION_STORE: str = "memory"  # "memory" or "sqlite"
+    QUIZ_SESSION_STORE_PATH: str = "./quiz_sessions.sqlite3"
+    QUIZ_PAPER_CACHE_TTL_SECONDS: int = 600
+    QUIZ_DEADLINE_GRACE_SECONDS: int = 5
+    QUIZ_SWEEP_INTERVAL_SECONDS: int = 30
+    # 回答の控えをセッション行へ書き戻す間隔 (ストアから消えたときの復元元)
+    QUIZ_ANSWER_FLUSH_SECONDS: float = 5.0
+    QUIZ_ORPHAN_GRACE_SECONDS: int = 600
+
+    # Answer history partitioning settings
+    ANSWER_PARTITION_MONTHS_AHEAD: int = 3
+    ANSWER_RETENTION_MONTHS: int = 24
+    ANSWER_ARCHIVE_DIR: str = "./archive"
+
+    # Idempotency key settings
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 24 * 60 * 60
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: int = 300
+    IDEMPOTENCY_PURGE_BATCH_SIZE: int = 1000
+
+    # Adaptive practice settings
+    ADAPTIVE_K_FACTOR: float = 32.0
+    ADAPTIVE_TARGET_SUCCESS: float = 0.7
+    ADAPTIVE_RECENT_WINDOW_HOURS: int = 24
+    RATING_INDEX_REBUILD_SECONDS: int = 300
+    # 索引が要再構築になっていないかを確かめる間隔
+    RATING_INDEX_CHECK_SECONDS: int = 5
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,110 @@
+"""
+パスワードハッシュ専用のプロセスプール
+
+bcrypt の計算はCPUを占有するため、リクエスト処理のスレッドではなく
+専用のプロセスプールで実行する。プールに投入できる件数には上限を設け、
+あふれた要求は待たせずに ``PasswordHasherBusy`` で拒否する（503として返す）。
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Optional, Tuple, TypeVar
+
+from passlib.context import CryptContext
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """ハッシュ計算の待ち行列が満杯"""
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    # rounds が設定と異なるハッシュはログイン時に再計算させる
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+# 以下はワーカープロセスで実行されるため、モジュールのトップレベルに置く
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed)
+
+
+class PasswordHasher:
+    """上限付きの待ち行列を持つパスワードハッシュ実行器
+
+    ``workers`` が 0 の場合は呼び出し元のスレッドで計算する（テスト用）。
+    プールは最初の利用時に作成する。
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                # スレッドを持つプロセスからの fork を避けるため spawn で起動する
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _run(self, fn: Callable[..., T], *args) -> T:
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy("Too many concurrent password operations")
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    async def _run_async(self, fn: Callable[..., T], *args) -> T:
+        """イベントループを止めずにプールの計算結果を待つ"""
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy("Too many concurrent password operations")
+        try:
+            if self.workers <= 0:
+                return await asyncio.to_thread(fn, *args)
+            return await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self.verify_and_update(password, hashed)[0]
+
+    def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """照合結果と、パラメータが古い場合は再計算したハッシュを返す"""
+        return self._run(_verify_and_update, password, hashed, self.rounds)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run_async(_hash, password, self.rounds)
+
+    async def verify_and_update_async(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return await self._run_async(_verify_and_update, password, hashed, self.rounds)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,276 @@
+"""
+Prometheus 形式のメトリクス
+
+ルートごとのレイテンシのヒストグラム、ステータス別のリクエスト数、
+リクエストあたりのSQLクエリ数とDB時間、N+1 クエリの疑いを集計し、
+``/metrics`` でテキスト形式 (text/plain; version=0.0.4) で返す。
+値はワーカープロセスごとに保持するため、すべてのサンプルにプロセスIDの
+``worker`` ラベルを付ける。複数ワーカーでは1回のスクレイプがいずれかの
+ワーカーの系列を返すので、``rate()`` などはワーカーごとに計算してから
+``sum without (worker)`` で集約する。
+
+ルートのラベルには実際のパスではなくルートのテンプレート
+（``/api/v1/problems/{problem_id}``）を使い、系列数が増えないようにする。
+"""
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+from app.db import query_stats
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# (ラベル, 値) の組。コレクターが返すサンプル
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _labels(self, values: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def render(self, const_labels: Optional[Dict[str, str]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._render_samples(const_labels or {}))
+        return lines
+
+    def _render_samples(self, const_labels: Dict[str, str]) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: Tuple[str, ...] = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _render_samples(self, const_labels: Dict[str, str]) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels({**const_labels, **self._labels(k)})} {_format_value(v)}"
+            for k, v in items
+        ]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベル -> [バケットごとの件数..., 合計, 件数]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()) -> None:
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def count(self, labels: Tuple[str, ...] = ()) -> float:
+        entry = self._values.get(labels)
+        return entry[-1] if entry else 0.0
+
+    def _bucket_line(self, labels: Dict[str, str], le: str, count: float) -> str:
+        return f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {_format_value(count)}"
+
+    def _render_samples(self, const_labels: Dict[str, str]) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, entry in items:
+            labels = {**const_labels, **self._labels(key)}
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, entry):
+                cumulative += n
+                lines.append(self._bucket_line(labels, _format_value(bound), cumulative))
+            lines.append(self._bucket_line(labels, "+Inf", entry[-1]))
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {_format_value(entry[-1])}")
+        return lines
+
+
+class Registry:
+    """メトリクスと、スクレイプ時に値を集めるコレクターの登録先
+
+    ``worker_label`` を有効にすると、すべてのサンプルに ``worker`` ラベル
+    (プロセスID) を付ける。preload したアプリはフォーク後にプロセスIDが
+    変わるため、スクレイプのたびに求める。
+    """
+
+    def __init__(self, worker_label: bool = False):
+        self.worker_label = worker_label
+        self._metrics: List[_Metric] = []
+        # () -> [(名前, 型, 説明, サンプル)]
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        const_labels = {"worker": str(os.getpid())} if self.worker_label else {}
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(const_labels))
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception:
+                logger.exception("Metrics collector failed")
+                continue
+            for name, type_name, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_name}")
+                lines.extend(
+                    f"{name}{_format_labels({**const_labels, **labels})} {_format_value(value)}"
+                    for labels, value in samples
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(worker_label=True)
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"),
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route"),
+))
+db_queries = registry.register(Counter(
+    "db_queries_total", "SQL statements executed while handling requests", ("method", "route"),
+))
+db_query_seconds = registry.register(Counter(
+    "db_query_seconds_total", "Time spent executing SQL statements while handling requests", ("method", "route"),
+))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements per request", ("method", "route"), buckets=QUERY_COUNT_BUCKETS,
+))
+db_repeated_queries = registry.register(Counter(
+    "db_repeated_query_requests_total",
+    "Requests that repeated the same SQL statement (suspected N+1 queries)", ("method", "route"),
+))
+
+
+def route_label(scope) -> str:
+    """ルーティング後のスコープからルートのテンプレートを返す"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def server_timing(stats: query_stats.QueryStats, elapsed: float) -> str:
+    return (
+        f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", '
+        f"app;dur={elapsed * 1000:.1f}"
+    )
+
+
+class MetricsMiddleware:
+    """リクエストのレイテンシとクエリ数を記録する ASGI ミドルウェア
+
+    ``server_timing`` を有効にすると、DB時間とクエリ数を Server-Timing ヘッダーで返す
+    （ブラウザの開発者ツールで確認できる）。
+    """
+
+    def __init__(self, app, server_timing: bool = False, repeat_threshold: int = 3):
+        self.app = app
+        self.server_timing = server_timing
+        self.repeat_threshold = repeat_threshold
+        # 同じルートと SQL 文の N+1 の警告はワーカーごとに1回だけログに出す
+        self._warned = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = query_stats.start_request(scope)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_metrics(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", server_timing(stats, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            query_stats.end_request(token)
+            self._record(scope, status_code, time.perf_counter() - start, stats)
+
+    def _record(self, scope, status_code: int, elapsed: float, stats: query_stats.QueryStats) -> None:
+        labels = (scope["method"], route_label(scope))
+        http_requests.inc(labels + (str(status_code),))
+        http_request_duration.observe(elapsed, labels)
+        db_queries_per_request.observe(stats.count, labels)
+        if stats.count:
+            db_queries.inc(labels, stats.count)
+            db_query_seconds.inc(labels, stats.duration)
+
+        repeated = stats.repeated(self.repeat_threshold)
+        if repeated:
+            db_repeated_queries.inc(labels)
+            for statement, n in repeated:
+                key = (labels, statement)
+                if key not in self._warned:
+                    self._warned.add(key)
+                    logger.warning(
+                        "Suspected N+1 queries on %s %s: executed %d times: %s",
+                        labels[0], labels[1], n, " ".join(statement.split())[:500],
+                    )
@@ -0,0 +1,346 @@
+"""
+リクエスト単位のプロファイリングとメモリの追跡
+
+``X-Profile`` ヘッダーまたは ``?profile=`` クエリを付けた教員のリクエストを
+``PROFILING_SAMPLE_RATE`` の割合でプロファイラの下で実行し、結果をファイルに
+保存して ``X-Profile-Url`` ヘッダーでダウンロード先を返す。
+
+- ``sample``: イベントループのスレッドのスタックを一定間隔で採取し、
+  speedscope (https://www.speedscope.app) で開けるフレームグラフにする
+- ``cprofile``: cProfile の統計 (pstats 形式。snakeviz などで開く)
+
+どちらもイベントループのスレッドを対象にするため、同時に処理されている
+ほかのリクエストの処理も混ざる。負荷の低いワーカーで使うこと。
+プロファイルはワーカーごとに同時に1件だけ取る。
+
+``MemoryTracker`` は tracemalloc のスナップショットを基準として保持し、
+その後に増えた割り当てを比較する（長時間動くワーカーのメモリの増加を調べる）。
+"""
+import cProfile
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("sample", "cprofile")
+_ARTIFACT_SUFFIXES = {"sample": ".speedscope.json", "cprofile": ".prof"}
+_ARTIFACT_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+
+
+class ProfileStore:
+    """プロファイルの成果物をディレクトリに保存する (同じホストのワーカー間で共有できる)"""
+
+    def __init__(self, directory: str, max_artifacts: int = 50):
+        self.directory = Path(directory)
+        self.max_artifacts = max_artifacts
+
+    def new_id(self) -> str:
+        return f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+    def path_for(self, artifact_id: str, mode: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self.directory / f"{artifact_id}{_ARTIFACT_SUFFIXES[mode]}"
+
+    def find(self, artifact_id: str) -> Optional[Path]:
+        if not _ARTIFACT_ID.match(artifact_id):
+            return None
+        for suffix in _ARTIFACT_SUFFIXES.values():
+            path = self.directory / f"{artifact_id}{suffix}"
+            if path.is_file():
+                return path
+        return None
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not self.directory.is_dir():
+            return []
+        artifacts = []
+        for path in self.directory.iterdir():
+            artifact_id, _, suffix = path.name.partition(".")
+            if not _ARTIFACT_ID.match(artifact_id):
+                continue
+            stat = path.stat()
+            mode = "sample" if suffix == "speedscope.json" else "cprofile"
+            artifacts.append({
+                "id": artifact_id,
+                "mode": mode,
+                "filename": path.name,
+                "size": stat.st_size,
+                "created_at": datetime.utcfromtimestamp(stat.st_mtime),
+            })
+        artifacts.sort(key=lambda artifact: artifact["created_at"], reverse=True)
+        return artifacts
+
+    def prune(self) -> None:
+        """古いものから削除して ``max_artifacts`` 件に収める"""
+        for artifact in self.list()[self.max_artifacts:]:
+            (self.directory / artifact["filename"]).unlink(missing_ok=True)
+
+
+class SamplingProfiler:
+    """スレッドのスタックを一定間隔で採取するプロファイラ
+
+    別スレッドから ``sys._current_frames`` で対象スレッドのスタックを読むため、
+    対象のコードには手を加えず、オーバーヘッドも間隔に応じて小さい。
+    """
+
+    def __init__(self, interval: float = 0.001, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        # フレーム (関数名, ファイル, 行) -> speedscope のフレーム番号
+        self._frames: Dict[Tuple[str, str, int], int] = {}
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+        self.elapsed = 0.0
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self.samples.append(self._stack(frame))
+                self.weights.append((now - last) * 1000)
+            last = now
+
+    def _stack(self, frame) -> List[int]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+            index = self._frames.get(key)
+            if index is None:
+                index = self._frames[key] = len(self._frames)
+            stack.append(index)
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """speedscope のファイル形式 (sampled プロファイル)"""
+        frames = [{"name": n, "file": f, "line": line} for n, f, line in self._frames]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(self.weights),
+                "samples": self.samples,
+                "weights": self.weights,
+            }],
+            "name": name,
+            "exporter": "math-lms",
+        }
+
+
+def requested_mode(scope) -> Optional[str]:
+    """ヘッダーまたはクエリで要求されたプロファイルの種類 (要求がなければ None)"""
+    value = None
+    for name, raw in scope.get("headers", []):
+        if name == b"x-profile":
+            value = raw.decode("latin-1")
+            break
+    if value is None:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if "profile" not in query:
+            return None
+        value = query["profile"][0]
+    value = value.strip().lower()
+    if value in PROFILE_MODES:
+        return value
+    return "sample" if value in ("", "1", "true", "yes") else None
+
+
+def is_teacher_request(scope) -> bool:
+    """Bearer トークンのロールが教員か (署名と有効期限だけを確認する)"""
+    from app.services.auth import decode_token
+
+    for name, raw in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = raw.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return False
+            try:
+                payload = decode_token(token)
+            except Exception:
+                return False
+            return payload.get("role") == "teacher" and payload.get("typ") != "refresh"
+    return False
+
+
+class ProfilingMiddleware:
+    """要求されたリクエストをプロファイラの下で実行する ASGI ミドルウェア
+
+    プロファイルはレスポンスの開始 (ヘッダーの送信) までを対象にする。
+    """
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        download_path: str = "/api/v1/admin/profiles/{id}",
+        sample_rate: float = 1.0,
+        interval: float = 0.001,
+        authorize: Callable[[Dict[str, Any]], bool] = is_teacher_request,
+    ):
+        self.app = app
+        self.store = store
+        self.download_path = download_path
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.authorize = authorize
+        self._active = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active:
+            await self.app(scope, receive, send)
+            return
+        mode = requested_mode(scope)
+        if mode is None or random.random() >= self.sample_rate or not self.authorize(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        artifact_id = self.store.new_id()
+        name = f"{scope['method']} {scope['path']}"
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = SamplingProfiler(self.interval)
+            profiler.start()
+        finished = False
+
+        def finish() -> bool:
+            nonlocal finished
+            if finished:
+                return False
+            finished = True
+            self._active = False
+            try:
+                path = self.store.path_for(artifact_id, mode)
+                if mode == "cprofile":
+                    profiler.disable()
+                    profiler.dump_stats(str(path))
+                else:
+                    profiler.stop()
+                    path.write_text(json.dumps(profiler.speedscope(name)))
+                self.store.prune()
+                return True
+            except Exception:
+                logger.exception("Could not save the profile of %s", name)
+                return False
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start" and finish():
+                headers = MutableHeaders(scope=message)
+                headers["X-Profile-Id"] = artifact_id
+                headers["X-Profile-Url"] = self.download_path.format(id=artifact_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            finish()
+
+
+class MemoryTracker:
+    """tracemalloc のスナップショットの差分でメモリの増加を調べる (ワーカーごと)"""
+
+    # 追跡自体やインポート機構の割り当ては除く
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, frames: int = 10):
+        self.frames = frames
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+
+    def status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": self.is_tracing,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "baseline_at": self._baseline_at,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """基準のスナップショットを取り直す (追跡していなければ開始する)"""
+        with self._lock:
+            if not self.is_tracing:
+                # 開始前の割り当ては追跡されないため、最初の基準はここからの増加を見る
+                tracemalloc.start(self.frames)
+            self._baseline = self._take()
+            self._baseline_at = datetime.utcnow()
+        return self.status()
+
+    def diff(self, limit: int = 20, key_type: str = "lineno") -> Optional[List[Dict[str, Any]]]:
+        """基準からの増加の大きい順の割り当て元 (基準がなければ None)"""
+        with self._lock:
+            if self._baseline is None or not self.is_tracing:
+                return None
+            stats = self._take().compare_to(self._baseline, key_type)
+        return [
+            {
+                "traceback": stat.traceback.format(),
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            for stat in stats[:limit]
+        ]
+
+    def stop(self) -> None:
+        with self._lock:
+            self._baseline = None
+            self._baseline_at = None
+            tracemalloc.stop()
+
+
+profile_store = ProfileStore(settings.PROFILING_OUTPUT_DIR, settings.PROFILING_MAX_ARTIFACTS)
+memory_tracker = MemoryTracker(frames=settings.TRACEMALLOC_FRAMES)
@@ -0,0 +1,299 @@
+"""
+トークンバケットによるレート制限
+
+ルートごとに「バケットの容量 / 満杯に戻るまでの秒数」を設定し、認証済みなら
+ユーザーID、未認証ならクライアントのIPごとにバケットを持つ。ログインのように
+``RATE_LIMIT_BY_USERNAME`` に挙げたルートでは、NAT の内側の利用者どうしが
+バケットを分け合わないよう、IP とフォームの username の組ごとに持つ。
+username を変えながらの試行を防ぐため、同じルートには IP ごとの緩い
+バケットも持ち、どちらかが空なら拒否する。
+プロキシの内側で動かす場合は、クライアントの IP を X-Forwarded-For から
+取るよう ``FORWARDED_ALLOW_IPS`` にプロキシのアドレスを指定する。バケットは
+既定ではワーカー内に保持し、``RATE_LIMIT_STORAGE_URL`` を指定すると
+Redis 互換のストアで全ワーカー共有にする（redis パッケージが必要）。
+ストアに接続できない間はワーカー内のバケットで判定を続ける。
+
+ミドルウェアは素の ASGI として実装し、リクエストごとの処理を辞書の参照と
+数回の算術に抑えている。
+"""
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from jose import JWTError, jwt
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """``method`` と ``path`` に一致するリクエストに適用する制限"""
+    method: str
+    path: str
+    capacity: int
+    period: float
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.path}"
+
+    @property
+    def rate(self) -> float:
+        """1秒あたりに補充するトークン数"""
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, route: str, spec: str) -> "RateLimitRule":
+        """``"GET /api/v1/problems"`` と ``"60/60"`` (60回 / 60秒) から作る"""
+        method, _, path = route.strip().partition(" ")
+        capacity, _, period = spec.partition("/")
+        if not path or int(capacity) <= 0 or float(period or 1) <= 0:
+            raise ValueError(f"Invalid rate limit: {route!r}: {spec!r}")
+        return cls(method.upper(), path.strip(), int(capacity), float(period or 1))
+
+
+class MemoryBucketStore:
+    """ワーカー内のバケット
+
+    満杯まで補充されたバケットは初期状態と同じなので、補充に要する時間で失効させる。
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self._buckets = TTLCache(maxsize=maxsize)
+
+    async def take(self, key: str, rule: RateLimitRule) -> Tuple[bool, float]:
+        """トークンを1つ取り出す。(許可するか, 再試行までの秒数) を返す"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key) or (rule.capacity, now)
+        tokens = min(rule.capacity, tokens + (now - updated_at) * rule.rate)
+        if tokens >= 1:
+            self._buckets.set(key, (tokens - 1, now), ttl=rule.period)
+            return True, 0.0
+        self._buckets.set(key, (tokens, now), ttl=rule.period)
+        return False, (1 - tokens) / rule.rate
+
+
+# バケットの補充と取り出しをサーバー上で不可分に行う (時刻もサーバーのものを使う)
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBucketStore:
+    """Redis 互換のストアで全ワーカーが共有するバケット"""
+
+    # ストアの障害時にワーカー内の判定へ切り替え、再接続を試みるまでの秒数
+    RETRY_SECONDS = 5.0
+
+    def __init__(self, url: str, fallback: MemoryBucketStore, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_STORAGE_URL requires the redis package") from e
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_TAKE_SCRIPT)
+        self._fallback = fallback
+        self._prefix = prefix
+        self._down_until = 0.0
+
+    async def take(self, key: str, rule: RateLimitRule) -> Tuple[bool, float]:
+        if time.monotonic() < self._down_until:
+            return await self._fallback.take(key, rule)
+        try:
+            allowed, retry_after = await self._script(
+                keys=[self._prefix + key], args=[rule.capacity, rule.rate]
+            )
+        except Exception:
+            logger.warning("Rate limit store is unavailable; using per-worker buckets", exc_info=True)
+            self._down_until = time.monotonic() + self.RETRY_SECONDS
+            return await self._fallback.take(key, rule)
+        return bool(int(allowed)), float(retry_after)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class RateLimiter:
+    """リクエストに一致するルールを引き、バケットからトークンを取り出す"""
+
+    def __init__(self, rules: List[RateLimitRule], store, username_routes: Optional[Dict[str, str]] = None):
+        self.store = store
+        # 未認証のリクエストを IP と username の組で数えるルール名 -> IP ごとのルール
+        self.username_routes: Dict[str, RateLimitRule] = {}
+        for route, spec in (username_routes or {}).items():
+            ip_rule = RateLimitRule.parse(route, spec)
+            self.username_routes[ip_rule.name] = ip_rule
+        # 完全一致は辞書で、末尾が * のルールは前方一致で引く
+        self._exact: Dict[Tuple[str, str], RateLimitRule] = {}
+        self._prefix: List[RateLimitRule] = []
+        for rule in rules:
+            if rule.path.endswith("*"):
+                self._prefix.append(rule)
+            else:
+                self._exact[(rule.method, rule.path)] = rule
+        # 長いプレフィックスを優先する
+        self._prefix.sort(key=lambda rule: len(rule.path), reverse=True)
+
+    def match(self, method: str, path: str) -> Optional[RateLimitRule]:
+        rule = self._exact.get((method, path)) or self._exact.get(("*", path))
+        if rule is not None:
+            return rule
+        for rule in self._prefix:
+            if rule.method in (method, "*") and path.startswith(rule.path[:-1]):
+                return rule
+        return None
+
+    async def hit(self, rule: RateLimitRule, identity: str) -> Tuple[bool, float]:
+        return await self.store.take(f"{rule.name}|{identity}", rule)
+
+
+# 検証済みのアクセストークン -> ユーザーID (署名の検証をリクエストごとに繰り返さない)
+_token_subjects = TTLCache(maxsize=10000, ttl=60)
+
+
+def _token_subject(token: str) -> str:
+    """アクセストークンのユーザーID。使えないトークンなら空文字列"""
+    from app.services.auth import revocation_list
+
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except JWTError:
+        _token_subjects.set(token, "")
+        return ""
+    subject = payload.get("sub") or ""
+    if payload.get("typ") == "refresh" or revocation_list.may_be_revoked(payload.get("jti"), payload.get("fam")):
+        subject = ""
+    # 期限を過ぎたトークンをユーザーとして数え続けない
+    ttl = _token_subjects.ttl
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        _token_subjects.set(token, subject, ttl=ttl)
+    return subject
+
+
+def _identity(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                subject = _token_subjects.get(token)
+                if subject is None:
+                    subject = _token_subject(token)
+                if subject:
+                    return f"user:{subject}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+# username を探すフォームの大きさの上限 (これより大きければ IP だけで数える)
+_MAX_FORM_BYTES = 16 * 1024
+
+
+async def _read_username(scope, receive):
+    """フォームの username と、読んだ本文をアプリに渡し直す receive を返す"""
+    content_type = b""
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            content_type = value
+            break
+    if not content_type.startswith(b"application/x-www-form-urlencoded"):
+        return None, receive
+
+    messages = []
+    body = b""
+    while len(body) <= _MAX_FORM_BYTES:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            break
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+
+    if len(body) > _MAX_FORM_BYTES:
+        return None, replay
+    values = parse_qs(body.decode("latin-1")).get("username")
+    return (values[0].strip().lower() if values else None), replay
+
+
+class RateLimitMiddleware:
+    """制限を超えたリクエストに 429 と Retry-After を返す ASGI ミドルウェア"""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = self.limiter.match(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        identity = _identity(scope)
+        ip_rule = self.limiter.username_routes.get(rule.name)
+        if ip_rule is not None and identity.startswith("ip:"):
+            # IP ごとのバケットが空なら username を読まずに拒否する
+            allowed, retry_after = await self.limiter.hit(ip_rule, identity)
+            if allowed:
+                username, receive = await _read_username(scope, receive)
+                # username がなければ IP ごとのバケットだけで数える
+                if username:
+                    allowed, retry_after = await self.limiter.hit(rule, f"{identity}|username:{username}")
+        else:
+            allowed, retry_after = await self.limiter.hit(rule, identity)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        body = b'{"detail":"Too many requests"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_rate_limiter() -> RateLimiter:
+    """設定からルールとストアを組み立てる"""
+    rules = [RateLimitRule.parse(route, spec) for route, spec in settings.RATE_LIMITS.items()]
+    store = MemoryBucketStore()
+    if settings.RATE_LIMIT_STORAGE_URL:
+        store = RedisBucketStore(settings.RATE_LIMIT_STORAGE_URL, fallback=store)
+    return RateLimiter(rules, store, settings.RATE_LIMIT_BY_USERNAME)
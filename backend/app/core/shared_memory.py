@@ -0,0 +1,254 @@
+"""
+同じホストのワーカープロセス間で共有するメモリ領域
+
+読み取りが大半のデータ（タグ、選択肢の正誤など）のスナップショットを
+POSIX 共有メモリ（``multiprocessing.shared_memory``）に1つだけ置き、各ワーカーは
+コピーを持たずにその場で読む。領域の先頭のヘッダーと、名前付きのセクション
+（バイト列）からなる。
+
+- 書き込みはファイルロック（flock）で1プロセスに限る。書き込み中はシーケンス番号を
+  奇数にし、読み取り側は前後で番号が変わっていれば読み直す（seqlock）。
+- ``mark_stale`` で無効にすると、すべてのワーカーの読み取りが直ちに None を返し
+  （呼び出し側はデータベースを読む）、いずれかのワーカーが作り直して公開する。
+  作り直しの間に無効化されたスナップショットは無効のまま公開する。
+"""
+import bisect
+import fcntl
+import os
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+MAGIC = b"MLSC"
+EMPTY, VALID, STALE = 0, 1, 2
+
+# magic, state, seq, generation, invalidations, published_at, created_at, nsections
+_HEADER = struct.Struct("<4sIQQQddI")
+_STATE, _SEQ, _GENERATION, _INVALIDATIONS, _PUBLISHED_AT = 4, 8, 16, 24, 32
+_SECTION = struct.Struct("<16sQQ")  # 名前, オフセット, 長さ
+MAX_SECTIONS = 8
+_DATA_START = 64 + _SECTION.size * MAX_SECTIONS
+
+# 読み取り中に書き込みと重なった場合に読み直す回数
+_READ_RETRIES = 3
+
+
+class SharedRegionFull(ValueError):
+    """公開するスナップショットが領域に収まらない"""
+
+
+class SharedRegion:
+    """名前付きセクションのスナップショットを保持する共有メモリ領域"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, created: bool):
+        self._shm = shm
+        self.name = shm.name
+        self.created = created
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{shm.name}.lock")
+        if created:
+            self._shm.buf[:_DATA_START] = bytes(_DATA_START)
+            _HEADER.pack_into(self._shm.buf, 0, MAGIC, EMPTY, 0, 0, 0, 0.0, time.time(), 0)
+
+    @classmethod
+    def open(cls, name: str, size: int) -> "SharedRegion":
+        """既存の領域に接続し、なければ作る"""
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            created = True
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name=name)
+            created = False
+        # 接続しただけのプロセスの終了時に resource_tracker が領域を削除しないようにする
+        # (削除は unlink を呼んだプロセスだけが行う)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        region = cls(shm, created)
+        if not created and bytes(shm.buf[:4]) != MAGIC:
+            region._reset()
+        return region
+
+    def _reset(self) -> None:
+        with self.lock():
+            self._shm.buf[:_DATA_START] = bytes(_DATA_START)
+            _HEADER.pack_into(self._shm.buf, 0, MAGIC, EMPTY, 0, 0, 0, 0.0, time.time(), 0)
+
+    @property
+    def size(self) -> int:
+        return self._shm.size
+
+    def _read_u64(self, offset: int) -> int:
+        return struct.unpack_from("<Q", self._shm.buf, offset)[0]
+
+    def _write_u64(self, offset: int, value: int) -> None:
+        struct.pack_into("<Q", self._shm.buf, offset, value)
+
+    @property
+    def state(self) -> int:
+        return struct.unpack_from("<I", self._shm.buf, _STATE)[0]
+
+    @property
+    def invalidations(self) -> int:
+        return self._read_u64(_INVALIDATIONS)
+
+    def status(self) -> Dict:
+        _, state, _, generation, invalidations, published_at, created_at, nsections = _HEADER.unpack_from(
+            self._shm.buf, 0
+        )
+        return {
+            "name": self.name,
+            "state": {EMPTY: "empty", VALID: "valid", STALE: "stale"}[state],
+            "generation": generation,
+            "invalidations": invalidations,
+            "published_at": published_at or None,
+            "created_at": created_at,
+            "sections": nsections,
+            "size": self.size,
+        }
+
+    @property
+    def published_at(self) -> float:
+        return struct.unpack_from("<d", self._shm.buf, _PUBLISHED_AT)[0]
+
+    def mark_stale(self) -> None:
+        """スナップショットを無効にする (ロック不要。作り直しは別に行う)"""
+        self._write_u64(_INVALIDATIONS, self.invalidations + 1)
+        struct.pack_into("<I", self._shm.buf, _STATE, STALE)
+
+    @contextmanager
+    def lock(self, blocking: bool = True) -> Iterator[bool]:
+        """書き込み用のプロセス間ロック。``blocking=False`` で取れなければ False"""
+        with open(self._lock_path, "a") as f:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(f, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def publish(self, sections: Dict[str, bytes], invalidations: Optional[int] = None) -> bool:
+        """セクションを書き込んで公開する (``lock`` を取った状態で呼ぶ)
+
+        ``invalidations`` には作り直しを始めた時点の ``invalidations`` を渡す。
+        それ以降に無効化されていれば無効のまま公開し、False を返す。
+        """
+        if len(sections) > MAX_SECTIONS:
+            raise ValueError(f"At most {MAX_SECTIONS} sections can be published")
+        needed = _DATA_START + sum(len(data) for data in sections.values())
+        if needed > self.size:
+            raise SharedRegionFull(f"Snapshot needs {needed} bytes but the region has {self.size}")
+
+        buf = self._shm.buf
+        seq = self._read_u64(_SEQ)
+        self._write_u64(_SEQ, seq + 1)
+        offset = _DATA_START
+        for i, (name, data) in enumerate(sections.items()):
+            buf[offset:offset + len(data)] = data
+            _SECTION.pack_into(buf, 64 + i * _SECTION.size, name.encode(), offset, len(data))
+            offset += len(data)
+        struct.pack_into("<I", buf, 48, len(sections))
+        self._write_u64(_GENERATION, self._read_u64(_GENERATION) + 1)
+        struct.pack_into("<d", buf, _PUBLISHED_AT, time.time())
+        valid = invalidations is None or invalidations == self.invalidations
+        struct.pack_into("<I", buf, _STATE, VALID if valid else STALE)
+        if valid and invalidations is not None and invalidations != self.invalidations:
+            # 状態を書く直前に無効化された (mark_stale は回数を増やしてから状態を書く)
+            struct.pack_into("<I", buf, _STATE, STALE)
+            valid = False
+        self._write_u64(_SEQ, seq + 2)
+        return valid
+
+    def _sections(self) -> Dict[str, memoryview]:
+        buf = self._shm.buf
+        nsections = struct.unpack_from("<I", buf, 48)[0]
+        sections = {}
+        for i in range(min(nsections, MAX_SECTIONS)):
+            name, offset, length = _SECTION.unpack_from(buf, 64 + i * _SECTION.size)
+            sections[name.rstrip(b"\0").decode()] = buf[offset:offset + length]
+        return sections
+
+    def read(self, reader: Callable[[Dict[str, memoryview]], T]) -> Optional[T]:
+        """有効なスナップショットを ``reader`` で読む (無効なら None)
+
+        ``reader`` はセクションの memoryview を受け取る。返り値に memoryview を
+        含めてはならない（読み取り後に書き換わりうる）。
+        """
+        for _ in range(_READ_RETRIES):
+            seq = self._read_u64(_SEQ)
+            if seq % 2:
+                continue
+            if self.state != VALID:
+                return None
+            sections = self._sections()
+            try:
+                result = reader(sections)
+            except Exception:
+                # 書き込みと重なって壊れた値を読んだ可能性がある
+                result = None
+                if self._read_u64(_SEQ) == seq:
+                    raise
+            finally:
+                for view in sections.values():
+                    view.release()
+            if self._read_u64(_SEQ) == seq and self.state == VALID:
+                return result
+        return None
+
+    def close(self) -> None:
+        self._shm.close()
+
+    def unlink(self) -> None:
+        # SharedMemory.unlink は登録の解除も行うため、open で外した登録を戻しておく
+        resource_tracker.register(self._shm._name, "shared_memory")
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            os.unlink(self._lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def pack_table(records: Iterable[Tuple[bytes, bytes]], record: struct.Struct, key_size: int) -> bytes:
+    """(キー, 値) の組をキーの順に並べた固定長レコードの表にする"""
+    rows = sorted(records)
+    data = bytearray(record.size * len(rows))
+    for i, (key, value) in enumerate(rows):
+        if len(key) != key_size:
+            raise ValueError("Every key must be key_size bytes")
+        data[i * record.size:(i + 1) * record.size] = key + value
+    return bytes(data)
+
+
+class _Keys:
+    """表のキーの列をコピーせずに二分探索するためのビュー"""
+
+    def __init__(self, view: memoryview, record_size: int, key_size: int):
+        self.view = view
+        self.record_size = record_size
+        self.key_size = key_size
+
+    def __len__(self) -> int:
+        return len(self.view) // self.record_size
+
+    def __getitem__(self, i: int) -> bytes:
+        start = i * self.record_size
+        return bytes(self.view[start:start + self.key_size])
+
+
+def find_record(view: memoryview, record: struct.Struct, key: bytes) -> Optional[tuple]:
+    """``pack_table`` で作った表からキーのレコードを二分探索で探す"""
+    keys = _Keys(view, record.size, len(key))
+    i = bisect.bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        return record.unpack_from(view, i * record.size)
+    return None
+
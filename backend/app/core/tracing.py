@@ -0,0 +1,464 @@
+"""
+分散トレーシング
+
+リクエストごとのルートのスパンの下に、依存関係（``get_current_user``・
+``get_async_db`` など）、``@traced`` を付けたサービス関数、SQL文ごとのスパンを
+記録する。W3C Trace Context の ``traceparent`` ヘッダーを受け取った場合は
+そのトレースに連なり、サンプリングの判定も親に従う。親がなければ
+``TRACING_SAMPLE_RATE`` の割合でサンプリングする。
+レスポンスには ``traceresponse`` ヘッダーでトレースIDを返す。
+
+現在のスパンは contextvars で受け渡す（run_sync のグリーンレットや
+スレッドプールにも引き継がれる）。サンプリングされないリクエストでは現在の
+スパンが None のままなので、``@traced`` や SQL のイベントは ContextVar を
+1回読むだけで何もしない。
+
+終了したスパンはバックグラウンドのスレッドでまとめてエクスポートする
+（JSONL ファイル、または OTLP/HTTP の JSON を受け付けるコレクター）。
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+# SQL文の属性に残す最大の長さ
+MAX_STATEMENT_LENGTH = 2000
+
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=_new_span_id)
+    parent_id: Optional[str] = None
+    kind: str = "internal"
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "unset"  # "unset" / "ok" / "error"
+    status_message: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "status_message": self.status_message,
+        }
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """``traceparent`` ヘッダーから (トレースID, 親スパンID, サンプリング済みか) を返す"""
+    if not value:
+        return None
+    match = _TRACEPARENT.match(value.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 0x01)
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool = True) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+class FileExporter:
+    """スパンを JSONL で追記する"""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in spans)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+_OTLP_STATUS = {"unset": 0, "ok": 1, "error": 2}
+
+
+def otlp_payload(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """OTLP/HTTP の JSON (ExportTraceServiceRequest)"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": service_name}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [
+                    {
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        "parentSpanId": span.parent_id or "",
+                        "name": span.name,
+                        "kind": _OTLP_KINDS.get(span.kind, 1),
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": [
+                            {"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()
+                        ],
+                        "status": {
+                            "code": _OTLP_STATUS[span.status],
+                            **({"message": span.status_message} if span.status_message else {}),
+                        },
+                    }
+                    for span in spans
+                ],
+            }],
+        }],
+    }
+
+
+class OTLPExporter:
+    """OTLP/HTTP (JSON) でコレクターに送る"""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0, client=None):
+        import httpx
+
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self._client = client or httpx.Client(timeout=timeout)
+
+    def export(self, spans: List[Span]) -> None:
+        response = self._client.post(self.url, json=otlp_payload(spans, self.service_name))
+        response.raise_for_status()
+
+    def shutdown(self) -> None:
+        self._client.close()
+
+
+class BatchSpanProcessor:
+    """終了したスパンをキューに溜め、バックグラウンドのスレッドでまとめてエクスポートする
+
+    キューが一杯のときはスパンを捨てる（リクエストを待たせない）。
+    スレッドは最初のスパンで起動する（fork したワーカーでは起動し直す）。
+    """
+
+    def __init__(self, exporter, max_queue_size: int = 2048, batch_size: int = 256, interval: float = 2.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(max_queue_size)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid() or self._stop.is_set():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        if self._pid != os.getpid():
+            self._ensure_started()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> List[Span]:
+        spans = []
+        while len(spans) < self.batch_size:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def flush(self) -> None:
+        while True:
+            spans = self._drain()
+            if not spans:
+                return
+            try:
+                self.exporter.export(spans)
+            except Exception:
+                logger.warning("Could not export %d spans", len(spans), exc_info=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self.flush()
+        self.exporter.shutdown()
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, processor: Optional[BatchSpanProcessor] = None):
+        self.sample_rate = sample_rate
+        self.processor = processor
+
+    def should_sample(self, parent: Optional[Tuple[str, str, bool]]) -> bool:
+        if self.processor is None:
+            return False
+        if parent is not None:
+            return parent[2]
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **kwargs) -> Span:
+        parent = parent or _current_span.get()
+        return Span(name=name, trace_id=parent.trace_id, parent_id=parent.span_id, **kwargs)
+
+    def end_span(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if self.processor is not None:
+            self.processor.on_end(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """現在のスパンの子スパンを現在のスパンにして実行する (サンプリング外なら何もしない)"""
+        if _current_span.get() is None:
+            yield None
+            return
+        span = self.start_span(name, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    @contextmanager
+    def detached_span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """現在のスパンの子スパンを記録するが、現在のスパンにはしない
+
+        yield を使う依存関係は yield の前後で呼び出し元と同じコンテキストを
+        共有するため、ここで現在のスパンを切り替えるとエンドポイント側の
+        スパンの親が変わってしまう。
+        """
+        if _current_span.get() is None:
+            yield None
+            return
+        span = self.start_span(name, attributes=attributes)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            self.end_span(span)
+
+    def shutdown(self) -> None:
+        if self.processor is not None:
+            self.processor.shutdown()
+            self.processor = None
+
+
+def create_tracer() -> Tracer:
+    """設定に基づくトレーサー (無効ならエクスポートもサンプリングもしない)"""
+    if not settings.TRACING_ENABLED:
+        return Tracer()
+    if settings.TRACING_EXPORTER == "otlp":
+        exporter = OTLPExporter(settings.TRACING_OTLP_ENDPOINT, settings.TRACING_SERVICE_NAME)
+    else:
+        exporter = FileExporter(settings.TRACING_FILE_PATH)
+    return Tracer(sample_rate=settings.TRACING_SAMPLE_RATE, processor=BatchSpanProcessor(exporter))
+
+
+tracer = create_tracer()
+
+
+def _span_name(func: Callable) -> str:
+    return f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+
+def traced(func: Optional[Callable] = None, *, name: Optional[str] = None):
+    """関数の呼び出しをスパンとして記録するデコレーター
+
+    yield を使う依存関係には使わず、中で ``tracer.detached_span`` を使う。
+    """
+    def decorate(func: Callable) -> Callable:
+        span_name = name or _span_name(func)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_span(conn, cursor, statement, parameters, context, executemany):
+    if _current_span.get() is None or context is None:
+        return
+    context._trace_span = tracer.start_span(
+        "db.query",
+        kind="client",
+        attributes={
+            "db.system": conn.dialect.name,
+            "db.statement": statement[:MAX_STATEMENT_LENGTH],
+            "db.executemany": executemany,
+        },
+    )
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query_span(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        context._trace_span = None
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute("db.rowcount", cursor.rowcount)
+        tracer.end_span(span)
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_query_span(exception_context):
+    context = exception_context.execution_context
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        context._trace_span = None
+        span.record_exception(exception_context.original_exception)
+        tracer.end_span(span)
+
+
+class TracingMiddleware:
+    """リクエストごとのルートのスパンを作る ASGI ミドルウェア"""
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+        if not self.tracer.should_sample(parent):
+            await self.app(scope, receive, send)
+            return
+
+        span = Span(
+            name=scope["method"],
+            trace_id=parent[0] if parent else _new_trace_id(),
+            parent_id=parent[1] if parent else None,
+            kind="server",
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        )
+        token = _current_span.set(span)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.status = "error"
+                headers = MutableHeaders(scope=message)
+                headers["traceresponse"] = format_traceparent(span.trace_id, span.span_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                span.name = f"{scope['method']} {route}"
+                span.set_attribute("http.route", route)
+            self.tracer.end_span(span)
@@ -0,0 +1,114 @@
+"""
+ワーカー起動時のウォームアップ
+
+最初のリクエストで払うことになる初期化をトラフィックを受ける前に済ませる。
+
+- SQLAlchemy のマッパーの構成（リレーションシップの解決）
+- 接続プールを ``DB_POOL_WARMUP`` 本まで開く
+- レスポンスの JSON シリアライザと OpenAPI スキーマの構築
+- ``WARMUP_PREFILL_CACHES`` が有効なら、失効トークンのフィルタと受験中の
+  問題セットのキャッシュを読み込む
+- ``SHARED_CACHE_ENABLED`` が有効なら、共有カタログを（ほかのワーカーが
+  まだ作っていなければ）作る
+
+各段階の所要時間は ``app.state.warmup`` に残す。ウォームアップが終わるまで
+``/health/ready`` は 503 を返す。
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Dict
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def configure_mappers() -> None:
+    """すべてのモデルを読み込み、マッパーを構成する"""
+    from sqlalchemy.orm import configure_mappers
+
+    import app.models  # noqa: F401
+    configure_mappers()
+
+
+async def warm_up_pool() -> int:
+    from app.db.base import async_engine
+    from app.db.pool import warm_up
+    pool_size = getattr(async_engine.pool, "size", lambda: 0)()
+    return await warm_up(async_engine, min(settings.DB_POOL_WARMUP, pool_size))
+
+
+def prebuild_schemas(app: FastAPI) -> int:
+    """OpenAPI スキーマと、レスポンスモデルの検証器・シリアライザを構築する"""
+    from pydantic import TypeAdapter
+
+    app.openapi()
+    built = 0
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.response_field is not None:
+            # 前方参照などで構築が遅延しているモデルもここで完成させる
+            TypeAdapter(route.response_field.type_)
+            built += 1
+    return built
+
+
+def prefill_caches() -> Dict[str, int]:
+    """ワーカー内のキャッシュを読み込む"""
+    from app.db.base import SessionLocal
+    from app.models.quiz import QuizSession
+    from app.services.auth import revocation_list
+    from app.services.quiz import get_quiz_paper
+
+    db = SessionLocal()
+    try:
+        revocation_list.rebuild(db)
+        quiz_set_ids = [
+            quiz_set_id for (quiz_set_id,) in db.query(QuizSession.quiz_set_id)
+            .filter(QuizSession.status == "active", QuizSession.expires_at > datetime.utcnow())
+            .distinct()
+        ]
+        for quiz_set_id in quiz_set_ids:
+            get_quiz_paper(db, quiz_set_id)
+        return {"quiz_papers": len(quiz_set_ids)}
+    finally:
+        db.close()
+
+
+async def warm_up_app(app: FastAPI) -> Dict[str, float]:
+    """ウォームアップの各段階を実行し、段階ごとの秒数を返す"""
+    timings: Dict[str, float] = {}
+
+    async def step(name: str, fn, *args, threadpool: bool = False) -> None:
+        start = time.perf_counter()
+        try:
+            if threadpool:
+                await run_in_threadpool(fn, *args)
+            else:
+                result = fn(*args)
+                if hasattr(result, "__await__"):
+                    await result
+        except Exception:
+            # ウォームアップに失敗しても、最初のリクエストで同じ初期化が行われるだけなので起動は続ける
+            logger.exception("Warm-up step %s failed", name)
+        timings[name] = time.perf_counter() - start
+
+    await step("configure_mappers", configure_mappers)
+    await step("connection_pool", warm_up_pool)
+    await step("schemas", prebuild_schemas, app)
+    if settings.WARMUP_PREFILL_CACHES:
+        await step("caches", prefill_caches, threadpool=True)
+    if settings.SHARED_CACHE_ENABLED:
+        from app.services.catalog import refresh_catalog
+        await step("shared_catalog", refresh_catalog, threadpool=True)
+
+    logger.info(
+        "Warm-up finished in %.3fs (%s)",
+        sum(timings.values()),
+        ", ".join(f"{name}={seconds:.3f}s" for name, seconds in timings.items()),
+    )
+    return timings
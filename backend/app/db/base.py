@@ -1,19 +1,109 @@
-from sqlalchemy import create_engine
+import uuid
+from typing import Dict, Optional
+
+from fastapi import Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
+from app.core.tracing import tracer
+from app.db.pool import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool
+
+# 同期ドライバと非同期ドライバの対応
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """同期ドライバのデータベースURLを非同期ドライバのURLに変換する"""
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
 
-engine = create_engine(settings.DATABASE_URL)
+def engine_options(url: str, is_async: bool = False) -> Dict:
+    """設定に基づく接続プールのオプション (SQLite はドライバ既定のプールを使う)"""
+    if url.startswith("sqlite"):
+        return {}
+    options = {
+        "poolclass": InstrumentedAsyncAdaptedQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if settings.DB_PGBOUNCER_MODE and is_async:
+        # asyncpg はプリペアドステートメントをキャッシュするため、トランザクションごとに
+        # 別のサーバー接続に割り当てられると名前が衝突する (psycopg2 は使わない)
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return options
+
+
+# スクリプトやバックグラウンドタスク用の同期エンジン
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+class APISession(Session):
+    """APIリクエスト用のセッション。トランザクションの開始時に statement_timeout を設定する"""
+
+
+@event.listens_for(APISession, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout = session.info.get("statement_timeout_ms")
+    if timeout and connection.dialect.name == "postgresql":
+        # SET LOCAL はトランザクションの終了で戻るため、PgBouncer 経由でも他のクライアントに漏れない
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+def set_statement_timeout(db: AsyncSession, role: Optional[str]) -> None:
+    """以降のトランザクションにロールに応じた statement_timeout を適用する"""
+    db.info["statement_timeout_ms"] = settings.DB_STATEMENT_TIMEOUT_BY_ROLE.get(
+        role, settings.DB_STATEMENT_TIMEOUT_MS
+    )
+
+
+# APIエンドポイント用の非同期エンジン
+_async_url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(_async_url, **engine_options(_async_url, is_async=True))
+# レスポンスの組み立て時に遅延読み込みが起きないよう、コミット後も属性を保持する
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    sync_session_class=APISession,
+    autoflush=False,
+    expire_on_commit=False,
+    info={"statement_timeout_ms": settings.DB_STATEMENT_TIMEOUT_MS},
+)
+
 Base = declarative_base()
 
 
 # Dependency to get DB session
 def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+    with tracer.detached_span("get_db"):
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+# Dependency to get async DB session
+# サービス層は同期の Session を受け取るため、エンドポイントでは
+# ``await db.run_sync(fn)`` でこのセッションの同期ビューを渡して呼び出す
+async def get_async_db(response: Response):
+    with tracer.detached_span("get_async_db"):
+        async with AsyncSessionLocal() as db:
+            # 書き込みをコミットしたら read-your-writes の印をレスポンスに付ける (app.db.replicas)
+            db.info["response"] = response
+            yield db
@@ -0,0 +1,155 @@
+"""
+user_answers の月次レンジパーティションの管理
+
+パーティション名は ``user_answers_pYYYY_MM``、範囲は月初から翌月初まで。
+DEFAULT パーティションがあると DETACH ... CONCURRENTLY が使えないため作成せず、
+代わりに今後数か月分のパーティションを先行して作成しておく。
+"""
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = "user_answers"
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+_PARTITION_NAME_RE = re.compile(rf"^{PARTITIONED_TABLE}_p\d{{4}}_\d{{2}}$")
+# パーティションの作成確認の間隔（1日）
+MAINTENANCE_INTERVAL_SECONDS = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: date
+    end: date
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(start: date) -> str:
+    return f"{PARTITIONED_TABLE}_p{start.year:04d}_{start.month:02d}"
+
+
+def is_partition_table(name: str) -> bool:
+    """マイグレーションの自動生成で無視する子テーブル名かどうか"""
+    return bool(_PARTITION_NAME_RE.match(name))
+
+
+def create_partition_sql(start: date) -> str:
+    end = add_months(start, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} "
+        f"PARTITION OF {PARTITIONED_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def list_partitions(conn: Connection) -> List[Partition]:
+    """アタッチされているパーティションを範囲の昇順で返す"""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent"
+    ), {"parent": PARTITIONED_TABLE}).all()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound or "")
+        if match:
+            start = datetime.fromisoformat(match.group(1)).date()
+            end = datetime.fromisoformat(match.group(2)).date()
+            partitions.append(Partition(name, start, end))
+    return sorted(partitions, key=lambda p: p.start)
+
+
+def ensure_partitions(
+    conn: Connection,
+    months_ahead: int,
+    since: Optional[date] = None,
+    today: Optional[date] = None
+) -> List[str]:
+    """``since`` の月から ``months_ahead`` か月先までのパーティションを作成する
+
+    既存のパーティションは作り直さず、作成したパーティション名を返す。
+    親テーブルのロックを避けるため、存在確認をしてから不足分だけを作成する。
+    """
+    current = month_start(today or date.today())
+    start = month_start(since) if since else current
+    existing = {p.name for p in list_partitions(conn)}
+
+    created = []
+    month = start
+    while month <= add_months(current, months_ahead):
+        name = partition_name(month)
+        if name not in existing:
+            conn.execute(text(create_partition_sql(month)))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def closed_partitions(
+    conn: Connection,
+    retention_months: int,
+    today: Optional[date] = None
+) -> List[Partition]:
+    """保持期間を過ぎ、新しい行が入ることのないパーティションを返す"""
+    cutoff = add_months(month_start(today or date.today()), -retention_months)
+    return [
+        p for p in list_partitions(conn)
+        if p.end <= cutoff
+    ]
+
+
+def detach_partition(conn: Connection, name: str) -> None:
+    """パーティションを親テーブルから切り離す
+
+    CONCURRENTLY はトランザクション外で実行する必要があるため、
+    ``conn`` は AUTOCOMMIT で開いておくこと。
+    """
+    conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name} CONCURRENTLY"))
+
+
+async def run_partition_maintenance() -> None:
+    """今後の月のパーティションを先行して作成し続けるバックグラウンドタスク
+
+    PostgreSQL 以外（テスト用の SQLite など）では何もしない。
+    """
+    from starlette.concurrency import run_in_threadpool
+
+    from app.db.base import engine
+
+    if engine.dialect.name != "postgresql":
+        return
+
+    def ensure() -> List[str]:
+        with engine.begin() as conn:
+            return ensure_partitions(conn, settings.ANSWER_PARTITION_MONTHS_AHEAD)
+
+    while True:
+        try:
+            created = await run_in_threadpool(ensure)
+            if created:
+                logger.info("Created user_answers partitions: %s", ", ".join(created))
+        except Exception:
+            logger.exception("user_answers partition maintenance failed")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
@@ -0,0 +1,140 @@
+"""
+接続プールの計測とウォームアップ
+
+チェックアウトにかかった時間（新規接続の確立を含む）はプールの ``_do_get`` を包んで計測する。
+チェックアウト中・オーバーフローの接続数はプールの現在値をそのまま返す。
+"""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+
+@dataclass
+class PoolWaitStats:
+    """チェックアウト待ちの累計"""
+    checkouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    timeouts: int = 0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+
+class _InstrumentedPoolMixin:
+    # dispose() で作り直されたプールにも同じ累計を引き継ぐ
+    wait_stats: PoolWaitStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return conn
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+
+def pool_status(pool: Pool) -> Dict:
+    """プールの現在の接続数とチェックアウト待ちの累計を返す"""
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    status = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+    }
+    stats = getattr(pool, "wait_stats", None)
+    if stats is not None:
+        status.update(
+            checkouts=stats.checkouts,
+            timeouts=stats.timeouts,
+            wait_avg_ms=round(stats.total_wait / max(1, stats.checkouts + stats.timeouts) * 1000, 3),
+            wait_max_ms=round(stats.max_wait * 1000, 3),
+        )
+    return status
+
+
+async def warm_up(engine: AsyncEngine, connections: int) -> int:
+    """起動時に接続を同時に開いてプールに戻し、最初のリクエストでの接続待ちを防ぐ"""
+    if connections <= 0:
+        return 0
+
+    # すべての接続を同時に保持しないと、同じ接続が使い回されてしまう
+    barrier = asyncio.Event()
+    opened = 0
+
+    async def hold() -> None:
+        nonlocal opened
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            opened += 1
+            if opened == connections:
+                barrier.set()
+            await barrier.wait()
+
+    await asyncio.wait_for(asyncio.gather(*(hold() for _ in range(connections))), timeout=30)
+    return opened
+
+
+def pool_metrics(pools: Dict[str, Pool]) -> List[Tuple[str, str, str, List]]:
+    """プールの状態を Prometheus のメトリクス (app.core.metrics のコレクターの形式) で返す"""
+    families = {
+        "db_pool_size": ("gauge", "Connections kept in the pool", []),
+        "db_pool_checked_out": ("gauge", "Connections currently checked out", []),
+        "db_pool_overflow": ("gauge", "Connections opened beyond the pool size", []),
+        "db_pool_checkouts_total": ("counter", "Connection checkouts", []),
+        "db_pool_timeouts_total": ("counter", "Checkouts that timed out waiting for a connection", []),
+        "db_pool_wait_seconds_total": ("counter", "Time spent waiting for connections", []),
+        "db_pool_wait_seconds_max": ("gauge", "Longest wait for a connection", []),
+    }
+    for name, pool in pools.items():
+        if not isinstance(pool, QueuePool):
+            continue
+        labels = {"pool": name}
+        families["db_pool_size"][2].append((labels, pool.size()))
+        families["db_pool_checked_out"][2].append((labels, pool.checkedout()))
+        families["db_pool_overflow"][2].append((labels, max(0, pool.overflow())))
+        stats = getattr(pool, "wait_stats", None)
+        if stats is not None:
+            families["db_pool_checkouts_total"][2].append((labels, stats.checkouts))
+            families["db_pool_timeouts_total"][2].append((labels, stats.timeouts))
+            families["db_pool_wait_seconds_total"][2].append((labels, stats.total_wait))
+            families["db_pool_wait_seconds_max"][2].append((labels, stats.max_wait))
+    return [(name, type_name, doc, samples) for name, (type_name, doc, samples) in families.items()]
@@ -0,0 +1,80 @@
+"""
+リクエストごとのSQLクエリの計測
+
+すべてのエンジン（API用の非同期エンジン、バックグラウンド用の同期エンジン、
+レプリカ）のカーソル実行を SQLAlchemy のイベントで捕まえ、実行中のリクエストの
+``QueryStats`` に件数と所要時間を加算する。リクエストとの対応付けには
+contextvars を使う（run_sync のグリーンレットやスレッドプールにも引き継がれる）。
+リクエストの外で実行されたクエリは数えない。
+各クエリの開始時刻は実行コンテキストに記録するので、ほかのイベント
+（スロークエリの記録など）からも所要時間を求められる。
+
+同じSQL文がリクエスト内で何度も実行されていれば N+1 クエリの疑いとみなす。
+"""
+import time
+from collections import Counter
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@dataclass
+class QueryStats:
+    """1リクエスト分のクエリの件数と所要時間"""
+    count: int = 0
+    duration: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+    # リクエストの ASGI スコープ (ルーティング後はルートを引ける)
+    scope: Optional[Dict[str, Any]] = field(default=None, repr=False)
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """``threshold`` 回以上実行された同じSQL文と回数 (N+1 クエリの疑い)"""
+        if threshold <= 0 or self.count < threshold:
+            return []
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def start_request(scope: Optional[Dict[str, Any]] = None) -> Tuple[QueryStats, Token]:
+    """このコンテキスト (リクエスト) でのクエリの計測を始める"""
+    stats = QueryStats(scope=scope)
+    return stats, _current.set(stats)
+
+
+def end_request(token: Token) -> None:
+    _current.reset(token)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def query_duration(context) -> Optional[float]:
+    """after_cursor_execute の時点でのクエリの所要時間 (秒)"""
+    started_at = getattr(context, "_query_started_at", None)
+    return None if started_at is None else time.perf_counter() - started_at
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # 開始時刻はリクエストの外でも記録する (スロークエリの検出に使う)
+    if context is not None:
+        context._query_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    duration = query_duration(context)
+    if stats is not None and duration is not None:
+        stats.record(statement, duration)
@@ -0,0 +1,235 @@
+"""
+読み取りレプリカへの振り分け
+
+読み取り専用のエンドポイントは ``get_read_db`` でレプリカのセッションを受け取る。
+レプリカは設定の戦略（ラウンドロビンまたは最小接続数）で選び、定期的な
+ヘルスチェックで応答しないものや遅延が大きいものを外す。利用できるレプリカが
+ない場合と、直近に自分で書き込んだユーザー（read-your-writes）の場合は
+プライマリを読む。書き込みの記録はワーカー内に保持するほか、署名した
+Cookie でクライアントに持たせ、ほかのワーカーやホストでも判定できるようにする。
+"""
+import asyncio
+import hashlib
+import hmac
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, Union
+from uuid import UUID
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.base import (
+    APISession,
+    AsyncSessionLocal,
+    async_database_url,
+    engine_options,
+    set_statement_timeout,
+)
+
+logger = logging.getLogger(__name__)
+
+# レプリカの再生遅延 (秒)。プライマリでは行を返さない
+LAG_QUERY = text(
+    "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " WHERE pg_is_in_recovery()"
+)
+
+
+@dataclass
+class Replica:
+    url: str
+    engine: AsyncEngine
+    sessionmaker: async_sessionmaker = field(repr=False)
+    healthy: bool = True
+    lag_seconds: float = 0.0
+
+    @property
+    def checked_out(self) -> int:
+        checkedout = getattr(self.engine.pool, "checkedout", None)
+        return checkedout() if checkedout else 0
+
+
+class ReplicaRouter:
+    """レプリカの選択とヘルスチェック"""
+
+    def __init__(self, urls: List[str], strategy: str = "round_robin"):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.strategy = strategy
+        self.replicas: List[Replica] = []
+        for url in urls:
+            async_url = async_database_url(url)
+            replica_engine = create_async_engine(async_url, **engine_options(async_url, is_async=True))
+            self.replicas.append(Replica(
+                url=url,
+                engine=replica_engine,
+                sessionmaker=async_sessionmaker(
+                    replica_engine,
+                    class_=AsyncSession,
+                    sync_session_class=APISession,
+                    autoflush=False,
+                    expire_on_commit=False,
+                    info={"statement_timeout_ms": settings.DB_STATEMENT_TIMEOUT_MS},
+                ),
+            ))
+        self._counter = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        """利用可能なレプリカを選ぶ。なければ None (プライマリを使う)"""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.strategy == "least_connections":
+            return min(healthy, key=lambda replica: replica.checked_out)
+        return healthy[next(self._counter) % len(healthy)]
+
+    def mark_unhealthy(self, replica: Replica) -> None:
+        if replica.healthy:
+            logger.warning("Read replica %s is unavailable; falling back", replica.engine.url)
+        replica.healthy = False
+
+    async def check(self, replica: Replica) -> bool:
+        try:
+            async with replica.engine.connect() as conn:
+                lag = await asyncio.wait_for(
+                    conn.scalar(LAG_QUERY), timeout=settings.DB_REPLICA_HEALTH_CHECK_TIMEOUT
+                )
+        except Exception:
+            self.mark_unhealthy(replica)
+            return False
+        replica.lag_seconds = float(lag or 0.0)
+        healthy = replica.lag_seconds <= settings.DB_REPLICA_MAX_LAG_SECONDS
+        if healthy and not replica.healthy:
+            logger.info("Read replica %s is available again", replica.engine.url)
+        elif not healthy:
+            logger.warning(
+                "Read replica %s is %.1fs behind; excluding", replica.engine.url, replica.lag_seconds
+            )
+        replica.healthy = healthy
+        return healthy
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+replica_router = ReplicaRouter(settings.DATABASE_REPLICA_URLS, settings.DB_REPLICA_STRATEGY)
+
+# 直近に書き込んだユーザー。この間はレプリカの遅延に関係なくプライマリを読む
+recent_writers = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.DB_READ_YOUR_WRITES_SECONDS)
+
+# プライマリを読む期限 ("<期限のUNIX時刻>.<署名>") を持たせる Cookie
+WRITE_MARKER_COOKIE = "last_write"
+
+
+def _sign_marker(user_id: str, until: int) -> str:
+    message = f"{user_id}.{until}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def write_marker(user_id: Union[UUID, str]) -> str:
+    until = int(time.time()) + settings.DB_READ_YOUR_WRITES_SECONDS
+    return f"{until}.{_sign_marker(str(user_id), until)}"
+
+
+def has_valid_write_marker(user_id: Union[UUID, str], marker: Optional[str]) -> bool:
+    """``marker`` がこのユーザーのもので、期限内か"""
+    if not marker:
+        return False
+    until, _, signature = marker.partition(".")
+    if not until.isdigit() or int(until) < time.time():
+        return False
+    return hmac.compare_digest(signature, _sign_marker(str(user_id), int(until)))
+
+
+def recently_wrote(user_id: Union[UUID, str], marker: Optional[str] = None) -> bool:
+    return str(user_id) in recent_writers or has_valid_write_marker(user_id, marker)
+
+
+def note_write(user_id: Union[UUID, str]) -> None:
+    recent_writers.set(str(user_id), True)
+
+
+@event.listens_for(APISession, "after_commit")
+def _note_write_on_commit(session):
+    # 書き込みのないコミットは除く (読み取りだけのトランザクションでも commit は呼ばれる)
+    if session.info.pop("wrote", False) and session.info.get("user_id"):
+        user_id = session.info["user_id"]
+        note_write(user_id)
+        response = session.info.get("response")
+        if response is not None:
+            response.set_cookie(
+                WRITE_MARKER_COOKIE,
+                write_marker(user_id),
+                max_age=settings.DB_READ_YOUR_WRITES_SECONDS,
+                httponly=True,
+                samesite="lax",
+            )
+
+
+@event.listens_for(APISession, "after_flush")
+def _mark_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(APISession, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    # query().update() / delete() はフラッシュを経由しない
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@asynccontextmanager
+async def read_session(
+    user_id: Optional[Union[UUID, str]] = None,
+    role: Optional[str] = None,
+    marker: Optional[str] = None
+) -> AsyncIterator[AsyncSession]:
+    """読み取り用のセッションを開く。レプリカに接続できなければプライマリを使う
+
+    ``marker`` はクライアントが送ってきた書き込みの印 (Cookie の値)。
+    """
+    replica = None
+    if user_id is None or not recently_wrote(user_id, marker):
+        replica = replica_router.choose()
+
+    if replica is not None:
+        db = replica.sessionmaker()
+        set_statement_timeout(db, role)
+        try:
+            # 接続を先に確保し、失敗したらこのリクエストからプライマリに切り替える
+            await db.connection()
+        except Exception:
+            await db.close()
+            replica_router.mark_unhealthy(replica)
+            replica = None
+        else:
+            async with db:
+                yield db
+            return
+
+    async with AsyncSessionLocal() as db:
+        set_statement_timeout(db, role)
+        db.info["user_id"] = user_id
+        yield db
+
+
+async def run_replica_health_checks() -> None:
+    """レプリカの死活と遅延を定期的に確認するバックグラウンドタスク"""
+    if not replica_router.replicas:
+        return
+    while True:
+        try:
+            await replica_router.check_all()
+        except Exception:
+            logger.exception("Read replica health check failed")
+        await asyncio.sleep(settings.DB_REPLICA_HEALTH_CHECK_SECONDS)
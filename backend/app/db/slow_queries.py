@@ -0,0 +1,313 @@
+"""
+スロークエリの記録
+
+``SLOW_QUERY_THRESHOLD_MS`` 以上かかったクエリの文、パラメータ（値は型と長さ
+だけに伏せる）、所要時間、リクエストのルートを JSONL のログファイル
+（サイズでローテーション）に書き、ワーカー内で SQL 文のフィンガープリント
+（リテラルとプレースホルダを ? にまとめた文のハッシュ）ごとに集計する。
+
+PostgreSQL では、フィンガープリントごとに ``SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS``
+に1回だけ、同じ接続・同じパラメータで実行計画を取得して記録に添える。
+SELECT は ``EXPLAIN (ANALYZE, BUFFERS)`` で実際に実行し、それ以外の文は
+書き込みを繰り返さないよう ``EXPLAIN`` だけにする。EXPLAIN はセーブポイントの
+中で実行して必ずロールバックするため、失敗してもリクエストのトランザクションには
+影響しない。
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.db import query_stats
+
+logger = logging.getLogger(__name__)
+
+# 集計に残す所要時間のサンプル数 (フィンガープリントごと)
+MAX_SAMPLES = 1000
+# 集計するフィンガープリントの上限 (超えたら最も古く発生したものから捨てる)
+MAX_FINGERPRINTS = 500
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|\?")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """リテラルとプレースホルダを ? に、IN などの値のリストを (...) にまとめる"""
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _VALUE_LIST.sub("(...)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:16]
+
+
+def redact_value(value: Any) -> Any:
+    """数値・真偽値・日時は残し、文字列や ID などは型と長さだけにする"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return "<uuid>"
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    if isinstance(value, (list, tuple)):
+        return [redact_value(v) for v in value]
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters: Any) -> Any:
+    if isinstance(parameters, dict):
+        return {key: redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(p) if isinstance(p, (dict, list, tuple)) else redact_value(p) for p in parameters]
+    return redact_value(parameters)
+
+
+@dataclass
+class SlowQueryGroup:
+    """同じフィンガープリントのスロークエリの集計"""
+    fingerprint: str
+    statement: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    durations: Deque[float] = field(default_factory=lambda: deque(maxlen=MAX_SAMPLES))
+    routes: Counter = field(default_factory=Counter)
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+    last_parameters: Any = None
+    plan: Any = None
+    plan_captured_at: Optional[datetime] = None
+    # 最後に実行計画を取得した時刻 (time.monotonic)
+    explained_at: float = field(default=-float("inf"), repr=False)
+
+    def summary(self) -> Dict[str, Any]:
+        p50, p95, p99 = np.percentile(np.fromiter(self.durations, dtype=float), [50, 95, 99])
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 1),
+            "mean_ms": round(self.total / self.count * 1000, 1),
+            "p50_ms": round(p50 * 1000, 1),
+            "p95_ms": round(p95 * 1000, 1),
+            "p99_ms": round(p99 * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+            "routes": dict(self.routes.most_common()),
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "last_parameters": self.last_parameters,
+            "plan": self.plan,
+            "plan_captured_at": self.plan_captured_at,
+        }
+
+
+class SlowQueryLog:
+    """スロークエリの JSONL ログとフィンガープリントごとの集計"""
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        path: Optional[str] = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        explain_interval: float = 300,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.explain_interval = explain_interval
+        self._groups: Dict[str, SlowQueryGroup] = {}
+        self._lock = threading.Lock()
+        self._file_logger: Optional[logging.Logger] = None
+        if path:
+            self._file_logger = self._open_log(path, max_bytes, backup_count)
+
+    @staticmethod
+    def _open_log(path: str, max_bytes: int, backup_count: int) -> logging.Logger:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        file_logger = logging.getLogger(f"{__name__}.file")
+        file_logger.propagate = False
+        file_logger.setLevel(logging.INFO)
+        for handler in list(file_logger.handlers):
+            file_logger.removeHandler(handler)
+            handler.close()
+        handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True,
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        file_logger.addHandler(handler)
+        return file_logger
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def _group(self, key: str, statement: str, now: datetime) -> SlowQueryGroup:
+        """フィンガープリントの集計を返す。なければ作る (ロックを取って呼ぶ)"""
+        group = self._groups.get(key)
+        if group is None:
+            if len(self._groups) >= MAX_FINGERPRINTS:
+                oldest = min(self._groups.values(), key=lambda g: g.last_seen or g.first_seen)
+                del self._groups[oldest.fingerprint]
+            group = self._groups[key] = SlowQueryGroup(
+                fingerprint=key, statement=normalize_statement(statement), first_seen=now,
+            )
+        return group
+
+    def should_explain(self, statement: str) -> bool:
+        """この文の実行計画を今取得するか
+
+        取得する場合は、並行して同じ文が遅くなってもほかのスレッドが重ねて
+        EXPLAIN しないよう、初めての文でも集計を作って時刻を予約する。
+        """
+        if self.explain_interval < 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            group = self._group(fingerprint(statement), statement, datetime.utcnow())
+            if now - group.explained_at < self.explain_interval:
+                return False
+            group.explained_at = now
+            return True
+
+    def record(
+        self,
+        statement: str,
+        parameters: Any,
+        duration: float,
+        route: Optional[str] = None,
+        plan: Any = None,
+    ) -> Dict[str, Any]:
+        key = fingerprint(statement)
+        now = datetime.utcnow()
+        redacted = redact_parameters(parameters)
+        with self._lock:
+            group = self._group(key, statement, now)
+            if plan is not None and group.explained_at == -float("inf"):
+                # should_explain を通さずに取得した実行計画
+                group.explained_at = time.monotonic()
+            group.count += 1
+            group.total += duration
+            group.max = max(group.max, duration)
+            group.durations.append(duration)
+            group.routes[route or "-"] += 1
+            group.last_seen = now
+            group.last_parameters = redacted
+            if plan is not None:
+                group.plan = plan
+                group.plan_captured_at = now
+
+        entry = {
+            "time": now.isoformat(),
+            "fingerprint": key,
+            "duration_ms": round(duration * 1000, 3),
+            "route": route,
+            "statement": " ".join(statement.split()),
+            "parameters": redacted,
+            "plan": plan,
+        }
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+        return entry
+
+    def summaries(self, sort: str = "total_ms", limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            # should_explain が予約しただけでまだ記録のない集計は除く
+            summaries = [group.summary() for group in self._groups.values() if group.count]
+        summaries.sort(key=lambda s: s[sort], reverse=True)
+        return summaries[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._groups.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    path=settings.SLOW_QUERY_LOG_PATH if settings.SLOW_QUERY_THRESHOLD_MS > 0 else None,
+    max_bytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+    backup_count=settings.SLOW_QUERY_LOG_BACKUPS,
+    explain_interval=settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+)
+
+# EXPLAIN の実行中 (そのクエリ自体は記録しない)
+_explaining: ContextVar[bool] = ContextVar("slow_query_explaining", default=False)
+
+_SAVEPOINT = "slow_query_explain"
+
+
+def explain(conn, statement: str, parameters: Any) -> Any:
+    """同じ接続で実行計画を取得する。失敗した場合は None"""
+    is_select = statement.lstrip().lower().startswith("select")
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if is_select else "FORMAT JSON"
+    in_transaction = conn.in_transaction()
+    if not in_transaction and not is_select:
+        return None
+    token = _explaining.set(True)
+    try:
+        if in_transaction:
+            conn.exec_driver_sql(f"SAVEPOINT {_SAVEPOINT}")
+        try:
+            plan = conn.exec_driver_sql(f"EXPLAIN ({options}) {statement}", parameters).scalar()
+        except Exception:
+            logger.warning("Could not capture the plan of a slow query", exc_info=True)
+            plan = None
+        if in_transaction:
+            conn.exec_driver_sql(f"ROLLBACK TO SAVEPOINT {_SAVEPOINT}")
+        return json.loads(plan) if isinstance(plan, str) else plan
+    except Exception:
+        logger.warning("Could not capture the plan of a slow query", exc_info=True)
+        return None
+    finally:
+        _explaining.reset(token)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_slow_query(conn, cursor, statement, parameters, context, executemany):
+    if not slow_query_log.enabled or _explaining.get():
+        return
+    duration = query_stats.query_duration(context)
+    if duration is None or duration < slow_query_log.threshold:
+        return
+
+    plan = None
+    if (
+        not executemany
+        and conn.dialect.name == "postgresql"
+        and slow_query_log.should_explain(statement)
+    ):
+        plan = explain(conn, statement, parameters)
+
+    route = None
+    stats = query_stats.current_stats()
+    if stats is not None and stats.scope is not None:
+        from app.core.metrics import route_label
+        route = route_label(stats.scope)
+    try:
+        slow_query_log.record(statement, parameters, duration, route=route, plan=plan)
+    except Exception:
+        logger.exception("Could not record a slow query")
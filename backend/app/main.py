@@ -1,27 +1,226 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from app.core.config import settings
+from app.core.hashing import PasswordHasherBusy
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
+
+logger = logging.getLogger(__name__)
+
+
+def start_background_tasks(app: FastAPI) -> None:
+    from app.db.partitioning import run_partition_maintenance
+    from app.db.replicas import run_replica_health_checks
+    from app.services.idempotency import run_idempotency_purge
+    from app.services.invalidation import run_invalidation_listener
+    from app.services.quiz import run_answer_flush, run_session_sweeper
+    from app.services.rating import run_rating_index_refresh
+    from app.services.token import run_revocation_sync
+    app.state.background_tasks = [
+        asyncio.create_task(run_session_sweeper()),
+        asyncio.create_task(run_answer_flush()),
+        asyncio.create_task(run_partition_maintenance()),
+        asyncio.create_task(run_idempotency_purge()),
+        asyncio.create_task(run_revocation_sync()),
+        asyncio.create_task(run_replica_health_checks()),
+        asyncio.create_task(run_invalidation_listener()),
+        asyncio.create_task(run_rating_index_refresh()),
+    ]
+    if settings.SHARED_CACHE_ENABLED:
+        from app.services.catalog import run_catalog_refresh
+        app.state.background_tasks.append(asyncio.create_task(run_catalog_refresh()))
+
+
+async def stop_background_tasks(app: FastAPI) -> None:
+    for task in app.state.background_tasks:
+        task.cancel()
+
+    # 書き戻していない回答の控えを残す
+    from starlette.concurrency import run_in_threadpool
+
+    from app.services.quiz import flush_pending_answers
+    try:
+        await run_in_threadpool(flush_pending_answers)
+    except Exception:
+        logger.exception("Quiz answer flush failed")
+
+    from app.core.tracing import tracer
+    from app.services.auth import password_hasher
+    password_hasher.shutdown()
+    # 溜まっているスパンを送り出す
+    tracer.shutdown()
+
+    limiter = getattr(app.state, "rate_limiter", None)
+    if limiter is not None and hasattr(limiter.store, "close"):
+        await limiter.store.close()
+
+    # 接続はイベントループに結び付いているため、ループの終了前に閉じる
+    from app.db.base import async_engine
+    from app.db.replicas import replica_router
+    await async_engine.dispose()
+    await replica_router.dispose()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ウォームアップが終わるまでは /health/ready で 503 を返す
+    app.state.ready = False
+    if settings.WARMUP_ENABLED:
+        from app.core.warmup import warm_up_app
+        app.state.warmup = await warm_up_app(app)
+    start_background_tasks(app)
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        # 停止中はロードバランサーに新しいリクエストを送らせない
+        app.state.ready = False
+        await stop_background_tasks(app)
+
+
+def add_middleware(app: FastAPI) -> None:
+    """有効なミドルウェアを追加する (後に追加したものほど外側になる)
+
+    無効な機能のモジュールは読み込まない。
+    """
+    # Configure rate limiting (429 にも CORS ヘッダーが付くよう CORS の内側に置く)
+    if settings.RATE_LIMIT_ENABLED:
+        from app.core.rate_limit import RateLimitMiddleware, create_rate_limiter
+        app.state.rate_limiter = create_rate_limiter()
+        app.add_middleware(RateLimitMiddleware, limiter=app.state.rate_limiter)
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Configure response compression
+    if settings.COMPRESSION_ENABLED:
+        from app.core.compression import CompressionMiddleware
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+            gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+            brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        )
+
+    # Configure on-demand profiling (教員が要求したリクエストだけを計測する)
+    if settings.PROFILING_ENABLED:
+        from app.core.profiling import ProfilingMiddleware, profile_store
+        app.add_middleware(
+            ProfilingMiddleware,
+            store=profile_store,
+            sample_rate=settings.PROFILING_SAMPLE_RATE,
+            interval=settings.PROFILING_INTERVAL_MS / 1000,
+        )
+
+    # Configure request metrics (圧縮を含めた全体の時間を計測するよう外側に置く)
+    if settings.METRICS_ENABLED:
+        from app.core.metrics import MetricsMiddleware
+        app.add_middleware(
+            MetricsMiddleware,
+            server_timing=settings.SERVER_TIMING_ENABLED,
+            repeat_threshold=settings.QUERY_REPEAT_THRESHOLD,
+        )
+
+    # Configure tracing (ミドルウェアの処理も含めるよう最も外側に置く)
+    if settings.TRACING_ENABLED:
+        from app.core.tracing import TracingMiddleware, tracer
+        app.add_middleware(TracingMiddleware, tracer=tracer)
+
+
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    # ログインが集中した場合は待たせずに再試行を促す
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
 
-app = FastAPI(
-    title="Math LMS API",
-    description="University Mathematics Learning Management System API",
-    version="0.1.0",
-)
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/")
 def read_root():
     return {"message": "Welcome to the Math LMS API"}
 
 
-# Import and include API routers
-from app.api.v1 import api_router
-app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
+def read_readiness(request: Request):
+    """ウォームアップが終わり、リクエストを受けられる状態か (ロードバランサーのヘルスチェック用)"""
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "starting"})
+    return {"status": "ready", "warmup": getattr(request.app.state, "warmup", {})}
+
+
+def read_pool_status():
+    """接続プールとレプリカの状態 (運用者向けのため教員のみ)"""
+    from app.db.base import async_engine, engine
+    from app.db.pool import pool_status
+    from app.db.replicas import replica_router
+    return {
+        "api": pool_status(async_engine.pool),
+        "background": pool_status(engine.pool),
+        "replicas": [
+            {"healthy": replica.healthy, "lag_seconds": replica.lag_seconds, **pool_status(replica.engine.pool)}
+            for replica in replica_router.replicas
+        ],
+    }
+
+
+def read_metrics():
+    """Prometheus のスクレイプ用 (値はワーカーごとで、worker ラベルで区別する)"""
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def _collect_pool_metrics():
+    from app.db.base import async_engine, engine
+    from app.db.pool import pool_metrics
+    from app.db.replicas import replica_router
+    pools = {"api": async_engine.pool, "background": engine.pool}
+    for i, replica in enumerate(replica_router.replicas):
+        pools[f"replica{i}"] = replica.engine.pool
+    return pool_metrics(pools)
+
+
+registry.add_collector(_collect_pool_metrics)
+
+
+def create_app() -> FastAPI:
+    """アプリケーションを組み立てる (``uvicorn --factory app.main:create_app`` でも起動できる)"""
+    app = FastAPI(
+        title="Math LMS API",
+        description="University Mathematics Learning Management System API",
+        version="0.1.0",
+        default_response_class=ORJSONResponse if settings.FAST_JSON_RESPONSE else JSONResponse,
+        lifespan=lifespan,
+    )
+    add_middleware(app)
+    app.add_exception_handler(PasswordHasherBusy, password_hasher_busy_handler)
+
+    app.get("/")(read_root)
+    app.get("/health/ready")(read_readiness)
+    from app.services.auth import get_current_teacher
+    app.get("/health/db", dependencies=[Depends(get_current_teacher)])(read_pool_status)
+    # ルートの一覧やプールの状態を含むため、/health/db と同じく教員のトークンを求める
+    app.get("/metrics", include_in_schema=False, dependencies=[Depends(get_current_teacher)])(read_metrics)
+
+    # Import and include API routers
+    from app.api.v1 import api_router
+    app.include_router(api_router, prefix="/api/v1")
+    return app
+
+
+
+def __getattr__(name: str):
+    # import しただけではアプリを組み立てない (``app.main:app`` を参照したときに作る)。
+    # テストなどは create_app() で個別のアプリを作る
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
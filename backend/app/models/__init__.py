@@ -1,7 +1,10 @@
 from app.models.base_model import BaseModel
 from app.models.user import User, UserProfile
 from app.models.problem import Problem, Choice, Tag, ProblemTag
-from app.models.user_progress import UserAnswer, UserProgress
+from app.models.user_progress import UserAnswer, UserProgress, UserRating
+from app.models.quiz import QuizSet, QuizSetProblem, QuizSession
+from app.models.idempotency import IdempotencyKey
+from app.models.token import RefreshToken, RevokedToken
 
 # エクスポートするモデルクラスをここに列挙
 __all__ = [
@@ -13,5 +16,12 @@ __all__ = [
     "Tag",
     "ProblemTag",
     "UserAnswer",
-    "UserProgress"
+    "UserProgress",
+    "UserRating",
+    "QuizSet",
+    "QuizSetProblem",
+    "QuizSession",
+    "IdempotencyKey",
+    "RefreshToken",
+    "RevokedToken"
 ]
\ No newline at end of file
@@ -1,27 +1,10 @@
-import uuid
-from datetime import datetime
+"""
+モデルの基底クラス (互換のための別名)
 
-from sqlalchemy import Column, DateTime, String
-from sqlalchemy.dialects.postgresql import UUID
+定義は ``app.models.base_model`` の1か所だけにする。以前はこのファイルにも
+``id`` に重複した索引を張り ``updated_at`` を NOT NULL とする別の定義があり、
+マイグレーションで作られるスキーマと食い違っていた。
+"""
+from app.models.base_model import BaseModel
 
-from app.db.base import Base
-
-
-class BaseModel(Base):
-    """Base model for all tables."""
-
-    __abstract__ = True
-
-    id = Column(
-        UUID(as_uuid=True),
-        primary_key=True,
-        default=uuid.uuid4,
-        index=True,
-    )
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(
-        DateTime,
-        default=datetime.utcnow,
-        onupdate=datetime.utcnow,
-        nullable=False,
-    )
\ No newline at end of file
+__all__ = ["BaseModel"]
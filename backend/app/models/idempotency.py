@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, ForeignKey, DateTime, JSON, Index
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.models.base_model import BaseModel
+
+
+class IdempotencyKey(BaseModel):
+    """冪等キーモデル - 再送されたリクエストに最初の結果を返すために保持する"""
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(255), nullable=False)
+    # 同じキーで異なる内容が送られたことを検出するためのリクエストのハッシュ
+    request_hash = Column(String(64), nullable=False)
+    response = Column(JSON, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    # インデックス
+    __table_args__ = (
+        Index("idx_idempotency_key_user_key", user_id, key, unique=True),
+        Index("idx_idempotency_key_expires", expires_at),
+    )
+
+    def __repr__(self):
+        return f"<IdempotencyKey(user_id={self.user_id}, key={self.key}, expires_at={self.expires_at})>"
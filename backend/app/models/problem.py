@@ -1,10 +1,19 @@
-from sqlalchemy import Column, String, ForeignKey, Boolean, Text, Integer, Index, UniqueConstraint
+from sqlalchemy import Column, String, ForeignKey, Boolean, Text, Integer, Float, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
 from app.models.base_model import BaseModel
 
 
+def initial_rating_for_difficulty(difficulty) -> float:
+    """難易度(1-5)から問題のEloレーティングの初期値を決める"""
+    return 1500.0 + ((difficulty or 3) - 3) * 150.0
+
+
+def _default_problem_rating(context) -> float:
+    return initial_rating_for_difficulty(context.get_current_parameters().get("difficulty"))
+
+
 class Problem(BaseModel):
     """問題モデル - 数学問題を管理"""
     __tablename__ = "problems"
@@ -15,6 +24,10 @@ class Problem(BaseModel):
     difficulty = Column(Integer, default=3)
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
 
+    # 適応出題のためのEloレーティング
+    rating = Column(Float, nullable=False, default=_default_problem_rating)
+    rating_count = Column(Integer, nullable=False, default=0)
+
     # リレーションシップ
     creator = relationship("User", back_populates="created_problems")
     choices = relationship("Choice", back_populates="problem", cascade="all, delete-orphan")
@@ -25,6 +38,8 @@ class Problem(BaseModel):
     # インデックス
     __table_args__ = (
         Index("idx_problem_created_by", created_by),
+        Index("idx_problem_difficulty", difficulty),
+        Index("idx_problem_created_at", "created_at", "id"),
     )
 
     def __repr__(self):
@@ -43,6 +58,11 @@ class Choice(BaseModel):
     problem = relationship("Problem", back_populates="choices")
     user_answers = relationship("UserAnswer", back_populates="choice")
 
+    # インデックス
+    __table_args__ = (
+        Index("idx_choice_problem", problem_id),
+    )
+
     def __repr__(self):
         return f"<Choice(id={self.id}, problem_id={self.problem_id}, is_correct={self.is_correct})>"
 
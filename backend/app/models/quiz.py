@@ -0,0 +1,85 @@
+from sqlalchemy import Column, String, ForeignKey, Boolean, Text, Integer, DateTime, JSON, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+
+from app.models.base_model import BaseModel
+
+
+class QuizSet(BaseModel):
+    """小テストモデル - 教員が定義する制限時間付きの問題セットを管理"""
+    __tablename__ = "quiz_sets"
+
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    time_limit_seconds = Column(Integer, nullable=False)
+    shuffle_choices = Column(Boolean, nullable=False, default=True)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+
+    # リレーションシップ
+    creator = relationship("User")
+    problems = relationship(
+        "QuizSetProblem",
+        back_populates="quiz_set",
+        cascade="all, delete-orphan",
+        order_by="QuizSetProblem.position",
+    )
+    sessions = relationship("QuizSession", back_populates="quiz_set", cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<QuizSet(id={self.id}, title={self.title}, time_limit_seconds={self.time_limit_seconds})>"
+
+
+class QuizSetProblem(BaseModel):
+    """小テスト問題関連モデル - 問題セット内の問題と出題順を管理"""
+    __tablename__ = "quiz_set_problems"
+
+    quiz_set_id = Column(UUID(as_uuid=True), ForeignKey("quiz_sets.id", ondelete="CASCADE"), nullable=False)
+    problem_id = Column(UUID(as_uuid=True), ForeignKey("problems.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+
+    # リレーションシップ
+    quiz_set = relationship("QuizSet", back_populates="problems")
+    problem = relationship("Problem")
+
+    # インデックスと制約
+    __table_args__ = (
+        UniqueConstraint("quiz_set_id", "problem_id", name="uq_quiz_set_problem"),
+        Index("idx_quiz_set_problem_set", quiz_set_id, position),
+    )
+
+    def __repr__(self):
+        return f"<QuizSetProblem(quiz_set_id={self.quiz_set_id}, problem_id={self.problem_id}, position={self.position})>"
+
+
+class QuizSession(BaseModel):
+    """受験セッションモデル - 学生ごとの受験状態を管理
+
+    受験中の回答はサーバーのセッションストアで保持し、このテーブルには
+    開始時のヘッダー情報と確定時の回答スナップショットを書き込む。受験中は
+    ストアから消えたときの復元用に、回答の控えを数秒ごとにまとめて
+    ``answers`` へ書き戻す。
+    """
+    __tablename__ = "quiz_sessions"
+
+    quiz_set_id = Column(UUID(as_uuid=True), ForeignKey("quiz_sets.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String(20), nullable=False, default="active")
+    seed = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    submitted_at = Column(DateTime, nullable=True)
+    answers = Column(JSON, nullable=True)
+    score = Column(Integer, nullable=True)
+
+    # リレーションシップ
+    quiz_set = relationship("QuizSet", back_populates="sessions")
+    user = relationship("User")
+
+    # インデックス
+    __table_args__ = (
+        Index("idx_quiz_session_user_set", user_id, quiz_set_id),
+        Index("idx_quiz_session_status_expires", status, expires_at),
+    )
+
+    def __repr__(self):
+        return f"<QuizSession(id={self.id}, user_id={self.user_id}, status={self.status})>"
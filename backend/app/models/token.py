@@ -0,0 +1,47 @@
+from sqlalchemy import Column, ForeignKey, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+
+from app.models.base_model import BaseModel
+
+
+class RefreshToken(BaseModel):
+    """リフレッシュトークンモデル - id をトークンの jti として発行・ローテーションを管理"""
+    __tablename__ = "refresh_tokens"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # 同じログインから続くローテーションの系列
+    family_id = Column(UUID(as_uuid=True), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
+
+    # リレーションシップ
+    user = relationship("User")
+
+    # インデックス
+    __table_args__ = (
+        Index("idx_refresh_token_family", family_id),
+        Index("idx_refresh_token_expires", expires_at),
+    )
+
+    def __repr__(self):
+        return f"<RefreshToken(id={self.id}, user_id={self.user_id}, family_id={self.family_id})>"
+
+
+class RevokedToken(BaseModel):
+    """失効トークンモデル - 失効させたトークンの jti または系列IDを有効期限まで保持"""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(UUID(as_uuid=True), nullable=False, unique=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    expires_at = Column(DateTime, nullable=False)
+
+    # インデックス
+    __table_args__ = (
+        Index("idx_revoked_token_created", "created_at"),
+        Index("idx_revoked_token_expires", expires_at),
+    )
+
+    def __repr__(self):
+        return f"<RevokedToken(jti={self.jti}, expires_at={self.expires_at})>"
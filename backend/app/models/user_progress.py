@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from sqlalchemy import Column, ForeignKey, Boolean, Integer, Float, DateTime, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
@@ -13,6 +15,8 @@ class UserAnswer(BaseModel):
     problem_id = Column(UUID(as_uuid=True), ForeignKey("problems.id", ondelete="CASCADE"), nullable=False)
     selected_choice = Column(UUID(as_uuid=True), ForeignKey("choices.id", ondelete="CASCADE"), nullable=False)
     is_correct = Column(Boolean, nullable=False)
+    # created_at による月次パーティションのため主キーに含める
+    created_at = Column(DateTime, primary_key=True, nullable=False, default=datetime.utcnow)
 
     # リレーションシップ
     user = relationship("User", back_populates="answers")
@@ -22,6 +26,10 @@ class UserAnswer(BaseModel):
     # インデックス
     __table_args__ = (
         Index("idx_user_answer_user_problem", user_id, problem_id),
+        Index("idx_user_answer_user_created", user_id, created_at, "id"),
+        Index("idx_user_answer_selected_choice", selected_choice),
+        Index("idx_user_answer_problem", problem_id),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
     def __repr__(self):
@@ -38,6 +46,12 @@ class UserProgress(BaseModel):
     last_attempt_at = Column(DateTime, nullable=True)
     mastery_level = Column(Float, default=0)
 
+    # 間隔反復（SM-2）による復習スケジュール
+    ease_factor = Column(Float, nullable=False, default=2.5)
+    stability = Column(Float, nullable=False, default=0)
+    review_streak = Column(Integer, nullable=False, default=0)
+    due_at = Column(DateTime, nullable=True)
+
     # リレーションシップ
     user = relationship("User", back_populates="progress")
     problem = relationship("Problem", back_populates="user_progress")
@@ -47,7 +61,26 @@ class UserProgress(BaseModel):
         Index("idx_user_progress_user", user_id),
         Index("idx_user_progress_problem", problem_id),
         Index("idx_user_progress_user_problem", user_id, problem_id, unique=True),
+        Index("idx_user_progress_user_due", user_id, due_at),
+    )
+
+    def __repr__(self):
+        return f"<UserProgress(user_id={self.user_id}, problem_id={self.problem_id}, attempts={self.attempts}, mastery_level={self.mastery_level})>"
+
+
+class UserRating(BaseModel):
+    """ユーザーレーティングモデル - タグごとの学習者の能力推定値を管理"""
+    __tablename__ = "user_ratings"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    tag_id = Column(UUID(as_uuid=True), ForeignKey("tags.id", ondelete="CASCADE"), nullable=False)
+    rating = Column(Float, nullable=False, default=1500.0)
+    rating_count = Column(Integer, nullable=False, default=0)
+
+    # インデックス
+    __table_args__ = (
+        Index("idx_user_rating_user_tag", user_id, tag_id, unique=True),
     )
 
     def __repr__(self):
-        return f"<UserProgress(user_id={self.user_id}, problem_id={self.problem_id}, attempts={self.attempts}, mastery_level={self.mastery_level})>"
\ No newline at end of file
+        return f"<UserRating(user_id={self.user_id}, tag_id={self.tag_id}, rating={self.rating})>"
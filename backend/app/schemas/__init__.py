@@ -11,9 +11,17 @@ from app.schemas.tag import TagCreate, TagUpdate, TagResponse
 from app.schemas.user_progress import (
     UserAnswerCreate, 
     UserAnswerResponse, 
-    UserProgressResponse
+    UserProgressResponse,
+    ReviewQueueItem
 )
-from app.schemas.token import Token, TokenPayload
+from app.schemas.quiz import (
+    QuizSetCreate,
+    QuizSetResponse,
+    QuizSessionStartResponse,
+    QuizAnswerSubmit,
+    QuizSessionStatus
+)
+from app.schemas.token import Token, TokenPayload, TokenRefresh
 
 __all__ = [
     "UserCreate",
@@ -32,6 +40,13 @@ __all__ = [
     "UserAnswerCreate",
     "UserAnswerResponse",
     "UserProgressResponse",
+    "ReviewQueueItem",
+    "QuizSetCreate",
+    "QuizSetResponse",
+    "QuizSessionStartResponse",
+    "QuizAnswerSubmit",
+    "QuizSessionStatus",
     "Token",
-    "TokenPayload"
+    "TokenPayload",
+    "TokenRefresh"
 ]
\ No newline at end of file
@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class SlowQuerySummary(BaseModel):
+    """フィンガープリントごとのスロークエリの集計 (時間はミリ秒)"""
+    fingerprint: str
+    statement: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    routes: Dict[str, int]
+    first_seen: datetime
+    last_seen: datetime
+    last_parameters: Any = None
+    plan: Any = None
+    plan_captured_at: Optional[datetime] = None
+
+
+class ProfileArtifact(BaseModel):
+    """保存されたプロファイル (sample は speedscope, cprofile は pstats 形式)"""
+    id: str
+    mode: str
+    filename: str
+    size: int
+    created_at: datetime
+
+
+class MemoryStatus(BaseModel):
+    tracing: bool
+    traced_bytes: int
+    peak_bytes: int
+    baseline_at: Optional[datetime] = None
+
+
+class MemoryGrowth(BaseModel):
+    """基準のスナップショットからの割り当て元ごとの増加"""
+    traceback: List[str]
+    size_diff: int
+    size: int
+    count_diff: int
+    count: int
@@ -0,0 +1,128 @@
+from typing import List, Optional
+from uuid import UUID
+from pydantic import BaseModel, Field
+
+
+class QuizSetCreate(BaseModel):
+    title: str = Field(..., min_length=1, max_length=255)
+    description: Optional[str] = None
+    time_limit_seconds: int = Field(..., ge=30, le=6 * 60 * 60)
+    shuffle_choices: bool = True
+    problem_ids: List[UUID] = Field(..., min_items=1, max_items=200)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "title": "第3回 小テスト（積分）",
+                "description": "不定積分の基本",
+                "time_limit_seconds": 900,
+                "shuffle_choices": True,
+                "problem_ids": [
+                    "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                    "3fa85f64-5717-4562-b3fc-2c963f66afa7"
+                ]
+            }
+        }
+
+
+class QuizSetResponse(BaseModel):
+    id: UUID
+    title: str
+    description: Optional[str] = None
+    time_limit_seconds: int
+    shuffle_choices: bool
+    created_by: UUID
+    problem_ids: List[UUID]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "id": "3fa85f64-5717-4562-b3fc-2c963f66afa1",
+                "title": "第3回 小テスト（積分）",
+                "description": "不定積分の基本",
+                "time_limit_seconds": 900,
+                "shuffle_choices": True,
+                "created_by": "3fa85f64-5717-4562-b3fc-2c963f66afa2",
+                "problem_ids": [
+                    "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                    "3fa85f64-5717-4562-b3fc-2c963f66afa7"
+                ]
+            }
+        }
+
+
+class QuizChoice(BaseModel):
+    id: UUID
+    text: str
+
+
+class QuizProblem(BaseModel):
+    id: UUID
+    title: str
+    problem_text: str
+    choices: List[QuizChoice]
+
+
+class QuizSessionStartResponse(BaseModel):
+    session_id: UUID
+    quiz_set_id: UUID
+    title: str
+    expires_at: str
+    remaining_seconds: int
+    problems: List[QuizProblem]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "session_id": "3fa85f64-5717-4562-b3fc-2c963f66afb0",
+                "quiz_set_id": "3fa85f64-5717-4562-b3fc-2c963f66afa1",
+                "title": "第3回 小テスト（積分）",
+                "expires_at": "2023-01-01T00:15:00",
+                "remaining_seconds": 900,
+                "problems": [
+                    {
+                        "id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                        "title": "積分の基本公式",
+                        "problem_text": "\\int x dx",
+                        "choices": [
+                            {"id": "3fa85f64-5717-4562-b3fc-2c963f66afa9", "text": "x^2 + C"},
+                            {"id": "3fa85f64-5717-4562-b3fc-2c963f66afa8", "text": "\\frac{x^2}{2} + C"}
+                        ]
+                    }
+                ]
+            }
+        }
+
+
+class QuizAnswerSubmit(BaseModel):
+    problem_id: UUID
+    choice_id: UUID
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "problem_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                "choice_id": "3fa85f64-5717-4562-b3fc-2c963f66afa8"
+            }
+        }
+
+
+class QuizSessionStatus(BaseModel):
+    session_id: UUID
+    status: str
+    answered: int
+    total: int
+    remaining_seconds: int
+    score: Optional[int] = None
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "session_id": "3fa85f64-5717-4562-b3fc-2c963f66afb0",
+                "status": "active",
+                "answered": 1,
+                "total": 2,
+                "remaining_seconds": 642,
+                "score": None
+            }
+        }
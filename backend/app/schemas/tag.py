@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, Optional
 from uuid import UUID
 from pydantic import BaseModel, Field
 
@@ -43,4 +43,22 @@ class TagResponse(TagBase):
                 "description": "微分積分学に関連する問題",
                 "created_by": "3fa85f64-5717-4562-b3fc-2c963f66afa7"
             }
-        }
\ No newline at end of file
+        }
+
+
+class TagWithCounts(TagResponse):
+    """タグ一覧の項目 (問題数と難易度別の内訳つき)"""
+    problem_count: int = 0
+    by_difficulty: Dict[int, int] = {}
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                "name": "微分積分学",
+                "description": "微分積分学に関連する問題",
+                "created_by": "3fa85f64-5717-4562-b3fc-2c963f66afa7",
+                "problem_count": 12,
+                "by_difficulty": {"1": 2, "2": 3, "3": 5, "4": 2}
+            }
+        }
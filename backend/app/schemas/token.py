@@ -5,21 +5,30 @@ from pydantic import BaseModel
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
     
     class Config:
         json_schema_extra = {
             "example": {
                 "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
+                "refresh_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
                 "token_type": "bearer"
             }
         }
 
 
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+
 class TokenPayload(BaseModel):
     sub: str
     exp: int
     role: str
+    jti: Optional[str] = None
+    # リフレッシュトークンの系列ID
+    fam: Optional[str] = None
     
     class Config:
         json_schema_extra = {
@@ -1,6 +1,7 @@
+from datetime import datetime
 from typing import Optional
 from uuid import UUID
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 
 class UserAnswerBase(BaseModel):
@@ -23,6 +24,12 @@ class UserAnswerResponse(UserAnswerBase):
     user_id: UUID
     is_correct: bool
     created_at: str
+
+    @field_validator("created_at", mode="before")
+    @classmethod
+    def format_created_at(cls, v):
+        # ORM オブジェクトから変換する場合は ISO 形式の文字列にする
+        return v.isoformat() if isinstance(v, datetime) else v
     
     class Config:
         from_attributes = True
@@ -55,4 +62,25 @@ class UserProgressResponse(BaseModel):
                 "last_attempt_at": "2023-01-01T00:00:00",
                 "mastery_level": 0.8
             }
-        }
\ No newline at end of file
+        }
+
+
+class ReviewQueueItem(BaseModel):
+    problem_id: UUID
+    due_at: str
+    stability: float
+    ease_factor: float
+    attempts: int
+    mastery_level: float
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "problem_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                "due_at": "2023-01-07T00:00:00",
+                "stability": 6.0,
+                "ease_factor": 2.5,
+                "attempts": 2,
+                "mastery_level": 1.0
+            }
+        }
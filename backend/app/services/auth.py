@@ -1,37 +1,219 @@
+import threading
+import time
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import AsyncIterator, Iterable, Optional, Tuple, Union
 from uuid import UUID
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.bloom import BloomFilter
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.db.base import get_db
+from app.core.hashing import PasswordHasher
+from app.core.tracing import traced, tracer
+from app.db.base import get_async_db, set_statement_timeout
+from app.db.replicas import WRITE_MARKER_COOKIE, read_session
+from app.models.token import RevokedToken
 from app.models.user import User
 from app.schemas.token import TokenPayload
+from app.services.invalidation import invalidation_bus
 
-# パスワードハッシュのためのコンテキスト
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# パスワードハッシュの実行器 (専用のプロセスプールで計算する)
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
 # OAuth2認証機能
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+
+@dataclass(frozen=True)
+class Principal:
+    """認証済みユーザーの認可に必要な情報だけを持つ不変オブジェクト"""
+    id: UUID
+    role: str
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, role=user.role)
+
+
+# ユーザーID -> Principal。認証のたびにユーザーを読み込まないよう短時間だけ保持する
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_principal(user_id: Union[UUID, str]) -> None:
+    """ユーザーの更新・削除時にキャッシュを破棄する"""
+    principal_cache.pop(str(user_id))
+
+
+def _invalidate_principals(user_ids) -> None:
+    for user_id in user_ids:
+        invalidate_principal(user_id)
+
+
+# ほかのワーカーでのユーザーの更新・削除も反映する
+invalidation_bus.subscribe("user", _invalidate_principals, principal_cache.clear)
+
+
+# 失効の取り込みで遡る秒数
+SYNC_OVERLAP_SECONDS = 60
+
+
+class RevocationList:
+    """失効させたトークンIDのワーカー内ブルームフィルタ
+
+    認証のたびにデータベースを引かないよう、まずフィルタで判定する。
+    フィルタに含まれない ID は確実に失効していないので、偽陽性の確認に
+    限って revoked_tokens を参照する。他のワーカーでの失効は
+    ``sync`` で定期的に取り込み、期限切れの ID は ``rebuild`` で取り除く。
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._bloom: Optional[BloomFilter] = None
+        self._last_created_at: Optional[datetime] = None
+        self._built_at: Optional[float] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._bloom is not None
+
+    @property
+    def is_stale(self) -> bool:
+        return (
+            self._built_at is None
+            or time.monotonic() - self._built_at > settings.TOKEN_REVOCATION_REBUILD_SECONDS
+        )
+
+    def load(self, rows: Iterable[Tuple[UUID, datetime]]) -> None:
+        """(jti, 作成日時) の列からフィルタを作り直す"""
+        rows = list(rows)
+        bloom = BloomFilter(max(self.capacity, len(rows) * 2), self.error_rate)
+        for jti, _ in rows:
+            bloom.add(str(jti))
+        with self._lock:
+            self._bloom = bloom
+            self._last_created_at = max((created_at for _, created_at in rows), default=None)
+            self._built_at = time.monotonic()
+
+    def rebuild(self, db: Session) -> None:
+        self.load(
+            db.query(RevokedToken.jti, RevokedToken.created_at)
+            .filter(RevokedToken.expires_at > datetime.utcnow())
+            .all()
+        )
+
+    def sync(self, db: Session) -> int:
+        """前回以降に他のワーカーで追加された失効を取り込み、件数を返す"""
+        if not self.is_loaded or self.is_stale:
+            self.rebuild(db)
+            return 0
+        query = db.query(RevokedToken.jti, RevokedToken.created_at)
+        if self._last_created_at is not None:
+            # 作成日時の順にコミットされるとは限らないため、少し遡って取り込む
+            since = self._last_created_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+            query = query.filter(RevokedToken.created_at > since)
+        rows = query.all()
+        for jti, created_at in rows:
+            self.add(jti)
+            if self._last_created_at is None or created_at > self._last_created_at:
+                self._last_created_at = created_at
+        if self._bloom is not None and len(self._bloom) > self._bloom.capacity:
+            # 想定件数を超えると偽陽性率が上がるため、大きさを見直して作り直す
+            self.rebuild(db)
+        return len(rows)
+
+    def add(self, jti: Union[UUID, str]) -> None:
+        if self._bloom is not None:
+            self._bloom.add(str(jti))
+
+    def may_be_revoked(self, *token_ids: Optional[str]) -> bool:
+        """データベースを引かずにフィルタだけで判定する (偽陽性がある)"""
+        bloom = self._bloom
+        return bloom is not None and any(token_id and token_id in bloom for token_id in token_ids)
+
+    def is_revoked(self, db: Session, *token_ids: Optional[str]) -> bool:
+        if not self.is_loaded:
+            self.rebuild(db)
+        candidates = [token_id for token_id in token_ids if token_id and token_id in self._bloom]
+        if not candidates:
+            return False
+        try:
+            candidate_ids = [UUID(token_id) for token_id in candidates]
+        except ValueError:
+            return True
+        return db.query(RevokedToken.id).filter(
+            RevokedToken.jti.in_(candidate_ids),
+            RevokedToken.expires_at > datetime.utcnow(),
+        ).first() is not None
+
+
+revocation_list = RevocationList(
+    capacity=settings.TOKEN_REVOCATION_BLOOM_CAPACITY,
+    error_rate=settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE,
+)
+
+
 # パスワード検証
+@traced
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify(plain_password, hashed_password)
 
 # パスワードのハッシュ化
+@traced
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
+
+def _save_password_hash(db: Session, user: User, password_hash: str) -> None:
+    user.password_hash = password_hash
+    db.commit()
 
 # ユーザー認証
+@traced
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.password_hash):
+    if not user:
+        return None
+    verified, new_hash = password_hasher.verify_and_update(password, user.password_hash)
+    if not verified:
+        return None
+    if new_hash:
+        # ハッシュのパラメータが古い場合はログインの機会に更新する
+        _save_password_hash(db, user, new_hash)
+    return user
+
+def _load_user_for_login(db: Session, email: str) -> Optional[User]:
+    user = db.query(User).filter(User.email == email).first()
+    # ハッシュの照合中に接続を保持しないよう、読み取りのトランザクションを終えて
+    # 接続をプールに返す (ハッシュの更新は新しいトランザクションで書く)
+    db.commit()
+    return user
+
+# ユーザー認証 (非同期セッション用。ハッシュの照合中はイベントループを止めない)
+@traced
+async def authenticate_user_async(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    user = await db.run_sync(_load_user_for_login, email)
+    if not user:
         return None
+    verified, new_hash = await password_hasher.verify_and_update_async(password, user.password_hash)
+    if not verified:
+        return None
+    if new_hash:
+        await db.run_sync(_save_password_hash, user, new_hash)
     return user
 
 # JWTトークン生成
@@ -42,45 +224,105 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    to_encode.setdefault("jti", str(uuid.uuid4()))
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
+# JWTトークンの検証
+def decode_token(token: str) -> dict:
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+
+def _load_principal(db: Session, token_data: TokenPayload) -> Optional[Principal]:
+    """失効していなければトークンのユーザーの Principal を返す"""
+    # トークン自体またはログインの系列が失効していないか
+    if revocation_list.is_revoked(db, token_data.jti, token_data.fam):
+        return None
+    
+    principal = principal_cache.get(token_data.sub)
+    if principal is None:
+        user = db.query(User).filter(User.id == token_data.sub).first()
+        if user is None:
+            return None
+        principal = Principal.from_user(user)
+        principal_cache.set(token_data.sub, principal)
+    # 読み取りを別のセッション (get_read_db) で行うリクエストが接続を2本同時に
+    # 保持しないよう、認証で使った接続をここでプールに返す
+    if db.in_transaction():
+        db.commit()
+    return principal
+
 # 現在のユーザーを取得する依存関係
-def get_current_user(
-    db: Session = Depends(get_db),
+@traced
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(oauth2_scheme),
-) -> User:
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+        payload = decode_token(token)
         user_id: str = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("typ") == "refresh":
             raise credentials_exception
-        token_data = TokenPayload(sub=user_id, exp=payload.get("exp"), role=payload.get("role"))
+        token_data = TokenPayload(
+            sub=user_id,
+            exp=payload.get("exp"),
+            role=payload.get("role"),
+            jti=payload.get("jti"),
+            fam=payload.get("fam"),
+        )
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == token_data.sub).first()
-    if user is None:
+    # 以降のクエリにはロールごとの statement_timeout を適用し、書き込みをユーザーに結び付ける
+    set_statement_timeout(db, token_data.role)
+    db.info["user_id"] = token_data.sub
+    principal = await db.run_sync(_load_principal, token_data)
+    if principal is None:
         raise credentials_exception
-    return user
+    return principal
 
-# アクティブユーザーを取得する依存関係
+# アクティブユーザーを取得する依存関係 (ユーザーに有効・無効の区別はないため、認証済みのユーザーを返す)
 def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
-    if not current_user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     return current_user
 
+# 現在のユーザーのモデルを取得する依存関係 (プロフィールの参照・更新用)
+@traced
+async def get_current_user_model(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user),
+) -> User:
+    user = await db.run_sync(
+        lambda session: session.query(User).filter(User.id == current_user.id).first()
+    )
+    if user is None:
+        invalidate_principal(current_user.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+# 読み取り専用のセッションを取得する依存関係 (レプリカを読む)
+async def get_read_db(
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user),
+) -> AsyncIterator[AsyncSession]:
+    with tracer.detached_span("get_read_db"):
+        marker = request.cookies.get(WRITE_MARKER_COOKIE)
+        async with read_session(current_user.id, current_user.role, marker) as db:
+            yield db
+
 # 教員ロールを確認する依存関係
 def get_current_teacher(
-    current_user: User = Depends(get_current_active_user),
-) -> User:
+    current_user: Principal = Depends(get_current_active_user),
+) -> Principal:
     if current_user.role != "teacher":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
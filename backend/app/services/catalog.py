@@ -0,0 +1,192 @@
+"""
+ワーカー間で共有するカタログのスナップショット
+
+タグの一覧（問題数つき）、問題数（全体・タグ別・難易度別）、選択肢の正誤の表を共有メモリの
+1つの領域に置き、すべてのワーカーがコピーを持たずに読む
+（``app.core.shared_memory``）。選択肢の表は固定長レコードの二分探索で引く。
+
+問題・選択肢・タグの変更は ``app.services.invalidation`` の通知で ``invalidate`` を
+呼ぶ（ほかのホストでの変更も届く）。無効化は共有メモリ上の状態なので
+同じホストの全ワーカーに直ちに伝わり、作り直されるまでは
+各関数が None を返して呼び出し側がデータベースを読む。作り直しは
+``run_catalog_refresh`` を実行しているワーカーのうちロックを取れた1つが行う。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.shared_memory import VALID, SharedRegion, find_record, pack_table
+from app.models.problem import Choice, Problem
+from app.services.invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+# 選択肢ID, 問題ID, 正解か
+GRADING_RECORD = struct.Struct("<16s16s?")
+
+# このプロセスが起動した時刻 (preload したワーカーでは fork 前の読み込み時刻)
+_started_at = time.time()
+
+
+def region_name() -> str:
+    """データベースごとに別の領域にする (同じホストで別の環境を動かしても混ざらない)"""
+    digest = hashlib.sha1(settings.DATABASE_URL.encode()).hexdigest()[:10]
+    return f"{settings.SHARED_CACHE_NAME}-{digest}"
+
+
+def build_sections(db: Session) -> Dict[str, bytes]:
+    """データベースからスナップショットのセクションを作る"""
+    # app.services.tag はこのモジュールを読み込むので、ここで読み込む
+    from app.services.tag import load_tag_summaries
+
+    # タグ一覧 (問題数・難易度別の内訳つき)
+    tags = load_tag_summaries(db)
+    by_tag = {tag["name"]: tag["problem_count"] for tag in tags if tag["problem_count"]}
+    by_difficulty = {
+        str(difficulty): count
+        for difficulty, count in db.query(Problem.difficulty, func.count(Problem.id)).group_by(Problem.difficulty)
+    }
+    counts = {
+        "problems": sum(by_difficulty.values()),
+        "by_tag": by_tag,
+        "by_difficulty": by_difficulty,
+    }
+    grading = pack_table(
+        (
+            (choice_id.bytes, problem_id.bytes + bytes([is_correct]))
+            for choice_id, problem_id, is_correct in db.query(Choice.id, Choice.problem_id, Choice.is_correct)
+        ),
+        GRADING_RECORD,
+        key_size=16,
+    )
+    return {
+        "tags": json.dumps(tags, ensure_ascii=False).encode(),
+        "counts": json.dumps(counts, ensure_ascii=False).encode(),
+        "grading": grading,
+    }
+
+
+class SharedCatalog:
+    def __init__(self, enabled: bool, size: int):
+        self.enabled = enabled
+        self.size = size
+        self._region: Optional[SharedRegion] = None
+
+    @property
+    def region(self) -> Optional[SharedRegion]:
+        """共有メモリの領域 (最初に使うときに接続し、なければ作る)"""
+        if self._region is None and self.enabled:
+            try:
+                self._region = SharedRegion.open(region_name(), self.size)
+            except OSError:
+                logger.exception("Could not open the shared catalog; reading from the database instead")
+                self.enabled = False
+        return self._region
+
+    def _read(self, reader):
+        region = self.region
+        return region.read(reader) if region is not None else None
+
+    def grade_choice(self, choice_id: UUID) -> Optional[Tuple[UUID, bool]]:
+        """選択肢の (問題ID, 正解か)。スナップショットが無効か、表になければ None"""
+        def reader(sections):
+            record = find_record(sections["grading"], GRADING_RECORD, choice_id.bytes)
+            return None if record is None else (UUID(bytes=record[1]), record[2])
+        return self._read(reader)
+
+    def tags(self) -> Optional[List[Dict]]:
+        return self._read(lambda sections: json.loads(bytes(sections["tags"])))
+
+    def problem_count(self, tag: Optional[str] = None, difficulty: Optional[int] = None) -> Optional[int]:
+        """全体・タグ別・難易度別の問題数 (両方の条件での件数は持たないので None)"""
+        if tag and difficulty:
+            return None
+        counts = self._read(lambda sections: json.loads(bytes(sections["counts"])))
+        if counts is None:
+            return None
+        if tag:
+            return counts["by_tag"].get(tag, 0)
+        if difficulty:
+            return counts["by_difficulty"].get(str(difficulty), 0)
+        return counts["problems"]
+
+    def invalidate(self) -> None:
+        """同じホストの全ワーカーのスナップショットを無効にする"""
+        region = self.region
+        if region is not None:
+            region.mark_stale()
+
+    def needs_refresh(self) -> bool:
+        region = self.region
+        if region is None:
+            return False
+        return (
+            region.state != VALID
+            or region.published_at < _started_at
+            or time.time() - region.published_at > settings.SHARED_CACHE_MAX_AGE_SECONDS
+        )
+
+    def refresh(self, db: Session) -> bool:
+        """ほかのワーカーが作り直していなければ作り直して公開する"""
+        region = self.region
+        if region is None:
+            return False
+        with region.lock(blocking=False) as locked:
+            if not locked or not self.needs_refresh():
+                return False
+            invalidations = region.invalidations
+            sections = build_sections(db)
+            db.rollback()
+            return region.publish(sections, invalidations=invalidations)
+
+    def status(self) -> Optional[Dict]:
+        region = self.region
+        return region.status() if region is not None else None
+
+    def close(self, unlink: bool = False) -> None:
+        if self._region is not None:
+            if unlink:
+                self._region.unlink()
+            self._region.close()
+            self._region = None
+
+
+catalog = SharedCatalog(
+    enabled=settings.SHARED_CACHE_ENABLED,
+    size=settings.SHARED_CACHE_SIZE_MB * 1024 * 1024,
+)
+# 共有メモリはホストごとなので、同じホストのワーカーからの通知では無効化しない
+for _kind in ("problem", "tag"):
+    invalidation_bus.subscribe(_kind, lambda _keys: catalog.invalidate(), catalog.invalidate, per_host=True)
+
+
+def refresh_catalog() -> bool:
+    from app.db.base import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return catalog.refresh(db)
+    finally:
+        db.close()
+
+
+async def run_catalog_refresh() -> None:
+    """無効になった (または古くなった) スナップショットを作り直すバックグラウンドタスク"""
+    from starlette.concurrency import run_in_threadpool
+
+    while catalog.enabled:
+        try:
+            if catalog.needs_refresh():
+                await run_in_threadpool(refresh_catalog)
+        except Exception:
+            logger.exception("Shared catalog refresh failed")
+        await asyncio.sleep(settings.SHARED_CACHE_REFRESH_SECONDS)
@@ -0,0 +1,167 @@
+"""
+冪等キーによる再送リクエストの重複排除
+
+クライアントが ``Idempotency-Key`` ヘッダーを付けて送ったリクエストの結果を
+有効期限付きで保持し、同じキーでの再送には書き込みを行わず最初の結果を返す。
+データベースの一意インデックスでワーカー間の重複を防ぎ、直近のキーは
+ワーカー内のキャッシュから引く (キャッシュへはコミットされた結果だけを入れる)。
+期限切れの行は定期的に少しずつ削除する。
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.tracing import traced
+from app.models.idempotency import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# ワーカー間の重複を防ぐ一意インデックス
+KEY_INDEX = "idx_idempotency_key_user_key"
+# コミット待ちの結果 ((ユーザーID, キー) -> (ハッシュ, 結果)) を置く Session.info のキー
+_PENDING = "pending_idempotency_keys"
+
+recent_keys = TTLCache(
+    maxsize=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl=settings.IDEMPOTENCY_KEY_TTL_SECONDS,
+)
+
+
+class IdempotencyKeyReused(ValueError):
+    """同じ冪等キーで内容の異なるリクエストが送られた"""
+
+
+class IdempotencyKeyConflict(ValueError):
+    """同じ冪等キーのリクエストが並行して処理され、先に確定した"""
+
+
+def request_fingerprint(*parts: Any) -> str:
+    return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+@traced
+def find_response(
+    db: Session,
+    user_id: UUID,
+    key: str,
+    fingerprint: str
+) -> Optional[Dict]:
+    """保持している最初の結果を返す。未処理のキーなら None"""
+    cached = recent_keys.get((user_id, key))
+    if cached is None:
+        row = db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+        ).first()
+        if row is None:
+            return None
+        if row.expires_at <= datetime.utcnow():
+            # 一意インデックスを空けるため、期限切れの行は新しい結果と同じトランザクションで消す
+            db.delete(row)
+            return None
+        cached = (row.request_hash, row.response)
+        recent_keys.set((user_id, key), cached)
+
+    request_hash, response = cached
+    if request_hash != fingerprint:
+        raise IdempotencyKeyReused("Idempotency-Key was already used for a different request")
+    return response
+
+
+def remember_response(
+    db: Session,
+    user_id: UUID,
+    key: str,
+    fingerprint: str,
+    response: Dict
+) -> None:
+    """結果を記録する。呼び出し側のトランザクション内で追加し、コミットは行わない
+
+    キャッシュにはコミットされたときに入れる。
+    """
+    db.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_hash=fingerprint,
+        response=response,
+        expires_at=datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+    ))
+    db.info.setdefault(_PENDING, {})[(user_id, key)] = (fingerprint, response)
+
+
+def is_key_conflict(error: IntegrityError) -> bool:
+    """一意制約違反が冪等キーのインデックスによるものか"""
+    orig = error.orig
+    # psycopg2 は diag に、asyncpg は元の例外に制約名を持つ
+    for source in (getattr(orig, "diag", None), getattr(orig, "__cause__", None)):
+        constraint_name = getattr(source, "constraint_name", None)
+        if constraint_name:
+            return constraint_name == KEY_INDEX
+    # SQLite はメッセージに列名だけを含める
+    message = str(orig)
+    return KEY_INDEX in message or "idempotency_keys.user_id, idempotency_keys.key" in message
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_pending(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        for cache_key, cached in pending.items():
+            recent_keys.set(cache_key, cached)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+@traced
+def purge_expired_keys(db: Session, batch_size: Optional[int] = None) -> int:
+    """期限切れのキーを小さなバッチに分けて削除し、削除件数を返す"""
+    batch_size = batch_size or settings.IDEMPOTENCY_PURGE_BATCH_SIZE
+    now = datetime.utcnow()
+    total = 0
+    while True:
+        batch = (
+            select(IdempotencyKey.id)
+            .where(IdempotencyKey.expires_at <= now)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        deleted = db.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(batch))).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+async def run_idempotency_purge() -> None:
+    """期限切れの冪等キーを定期的に削除するバックグラウンドタスク"""
+    from starlette.concurrency import run_in_threadpool
+
+    from app.db.base import SessionLocal
+
+    def purge() -> int:
+        db = SessionLocal()
+        try:
+            return purge_expired_keys(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS)
+        try:
+            purged = await run_in_threadpool(purge)
+            if purged:
+                logger.info("Purged %d expired idempotency keys", purged)
+        except Exception:
+            logger.exception("Idempotency key purge failed")
@@ -0,0 +1,254 @@
+"""
+ワーカー間のキャッシュ無効化 (PostgreSQL の LISTEN/NOTIFY)
+
+ワーカー内のキャッシュ（認証の Principal、受験用の問題セット）や
+ホスト内の共有カタログは、別のワーカー・別のホストでの更新を知らないと
+古いまま残る。
+
+- 書き込み側は ``notify(db, kind, key)`` で無効化する対象をセッションに記録する。
+  コミットの直前に1件の ``pg_notify`` にまとめて送る。NOTIFY はトランザクションの
+  一部なので、コミットされた変更の通知だけが届く。
+- コミット後には同じワーカーのキャッシュに直ちに反映する（ロールバックしたら破棄）。
+- 各ワーカーの ``run_invalidation_listener`` は専用の接続で LISTEN し、届いた通知を
+  ``INVALIDATION_DEBOUNCE_MS`` だけ待ってからまとめて反映する。
+- 切断中の通知は届かないため、再接続したら全キャッシュを破棄する（全体の再同期）。
+  通知の本文が上限を超える場合も、対象を列挙せずに全体の再同期を求める。
+
+キャッシュを持つモジュールは ``invalidation_bus.subscribe`` で種類ごとの処理を登録する。
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Union
+from uuid import UUID
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+# セッションの info に記録する、コミット時に送る無効化の対象
+_PENDING = "pending_invalidations"
+
+# NOTIFY の本文の上限 (8000 バイト) より少し小さくする
+MAX_PAYLOAD_BYTES = 7900
+
+HOST = socket.gethostname()
+
+invalidation_messages = registry.register(Counter(
+    "cache_invalidation_messages_total", "Cache invalidation messages by direction", ("direction",),
+))
+invalidation_resyncs = registry.register(Counter(
+    "cache_invalidation_resyncs_total", "Full cache resyncs after missed invalidation messages",
+))
+
+
+def origin() -> str:
+    """通知の送信元 (fork 後のワーカーごとに異なる)"""
+    return f"{HOST}:{os.getpid()}"
+
+
+class _Subscription:
+    def __init__(self, apply: Callable[[Set[str]], None], resync: Callable[[], None], per_host: bool):
+        self.apply = apply
+        self.resync = resync
+        self.per_host = per_host
+
+
+class InvalidationBus:
+    """無効化の種類ごとの処理を保持し、通知を組み立て・反映する"""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self._subscriptions: Dict[str, List[_Subscription]] = defaultdict(list)
+
+    def subscribe(
+        self,
+        kind: str,
+        apply: Callable[[Set[str]], None],
+        resync: Callable[[], None],
+        per_host: bool = False,
+    ) -> None:
+        """``kind`` の無効化で ``apply(keys)`` を、再同期で ``resync()`` を呼ぶ
+
+        ``per_host`` はホスト内で共有している状態 (共有メモリ) の処理で、
+        同じホストのほかのワーカーからの通知では呼ばない (送信元が反映済み)。
+        """
+        self._subscriptions[kind].append(_Subscription(apply, resync, per_host))
+
+    def payload(self, pending: Dict[str, Set[str]]) -> str:
+        body = json.dumps(
+            {"o": origin(), "m": {kind: sorted(keys) for kind, keys in pending.items()}},
+            separators=(",", ":"),
+        )
+        if len(body.encode()) > MAX_PAYLOAD_BYTES:
+            body = json.dumps({"o": origin(), "r": 1}, separators=(",", ":"))
+        return body
+
+    def apply(self, pending: Dict[str, Set[str]], same_host: bool = True) -> None:
+        for kind, keys in pending.items():
+            for subscription in self._subscriptions.get(kind, ()):
+                if subscription.per_host and same_host:
+                    continue
+                try:
+                    subscription.apply(keys)
+                except Exception:
+                    logger.exception("Applying %s invalidation failed", kind)
+
+    def apply_local(self, pending: Dict[str, Set[str]]) -> None:
+        """このワーカーでコミットした変更を反映する (ホスト内の共有状態も含む)"""
+        self.apply(pending, same_host=False)
+
+    def resync(self) -> None:
+        """通知を取りこぼした可能性があるので、すべてのキャッシュを破棄する"""
+        invalidation_resyncs.inc()
+        done = set()
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                if subscription.resync in done:
+                    continue
+                done.add(subscription.resync)
+                try:
+                    subscription.resync()
+                except Exception:
+                    logger.exception("Cache resync failed")
+
+    def receive(self, payloads: Iterable[str]) -> None:
+        """受け取った通知をまとめて反映する (自分の送った通知は反映済みなので除く)"""
+        me = origin()
+        merged: Dict[bool, Dict[str, Set[str]]] = {True: defaultdict(set), False: defaultdict(set)}
+        resync = False
+        for payload in payloads:
+            invalidation_messages.inc(("received",))
+            try:
+                message = json.loads(payload)
+                sender = message["o"]
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Ignoring malformed invalidation message: %.200s", payload)
+                continue
+            if sender == me:
+                continue
+            if message.get("r"):
+                resync = True
+                continue
+            same_host = sender.rpartition(":")[0] == HOST
+            for kind, keys in message.get("m", {}).items():
+                merged[same_host][kind].update(keys)
+        if resync:
+            self.resync()
+            return
+        for same_host, pending in merged.items():
+            if pending:
+                self.apply(pending, same_host=same_host)
+
+
+invalidation_bus = InvalidationBus(settings.INVALIDATION_CHANNEL)
+
+
+def notify(db: Session, kind: str, key: Union[UUID, str]) -> None:
+    """コミット時に ``kind`` の ``key`` を全ワーカーで無効化する (コミット前に呼ぶ)"""
+    db.info.setdefault(_PENDING, defaultdict(set))[kind].add(str(key))
+
+
+@event.listens_for(Session, "before_commit")
+def _send_pending(session):
+    pending = session.info.get(_PENDING)
+    if not pending or not settings.INVALIDATION_ENABLED:
+        return
+    connection = session.connection()
+    if connection.dialect.name != "postgresql":
+        return
+    connection.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": invalidation_bus.channel, "payload": invalidation_bus.payload(pending)},
+    )
+    invalidation_messages.inc(("sent",))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        invalidation_bus.apply_local(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+def listen_dsn() -> Optional[str]:
+    """LISTEN に使う接続先 (PostgreSQL でなければ None)
+
+    PgBouncer のトランザクションプーリングでは LISTEN を使えないため、
+    ``INVALIDATION_LISTEN_URL`` にデータベースへの直接の接続先を指定する。
+    """
+    url = settings.INVALIDATION_LISTEN_URL or settings.DATABASE_URL
+    scheme, sep, rest = url.partition("://")
+    if scheme.split("+")[0] not in ("postgresql", "postgres"):
+        return None
+    return f"postgresql{sep}{rest}"
+
+
+async def _listen(dsn: str, on_connect: Callable[[], None]) -> None:
+    import asyncpg
+
+    queue: "asyncio.Queue[str]" = asyncio.Queue()
+    connection = await asyncpg.connect(dsn)
+    try:
+        await connection.add_listener(
+            invalidation_bus.channel, lambda _conn, _pid, _channel, payload: queue.put_nowait(payload)
+        )
+        # 切断をキープアライブを待たずに知る
+        connection.add_termination_listener(lambda _conn: queue.put_nowait(None))
+        on_connect()
+        debounce = settings.INVALIDATION_DEBOUNCE_MS / 1000
+        while True:
+            try:
+                first = await asyncio.wait_for(queue.get(), timeout=settings.INVALIDATION_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # 通知がない間も接続が生きているか確かめる (切れていれば例外で再接続)
+                await connection.execute("SELECT 1")
+                continue
+            if first is None:
+                raise ConnectionError("connection is closed")
+            # 続けて届く通知をまとめて反映する
+            await asyncio.sleep(debounce)
+            batch = [first]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            invalidation_bus.receive(payload for payload in batch if payload is not None)
+            if None in batch:
+                raise ConnectionError("connection is closed")
+    finally:
+        await connection.close(timeout=5)
+
+
+async def run_invalidation_listener() -> None:
+    """ほかのワーカーからの無効化を受け取るバックグラウンドタスク"""
+    dsn = listen_dsn()
+    if not settings.INVALIDATION_ENABLED or dsn is None:
+        return
+    connected_before = False
+
+    def on_connect() -> None:
+        nonlocal connected_before
+        if connected_before:
+            # 切断中に送られた通知は届かない
+            invalidation_bus.resync()
+        connected_before = True
+
+    while True:
+        try:
+            await _listen(dsn, on_connect)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("Invalidation listener disconnected (%s); reconnecting", exc)
+        await asyncio.sleep(settings.INVALIDATION_RECONNECT_SECONDS)
@@ -4,15 +4,20 @@ from uuid import UUID
 from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
 
+from app.core.tracing import traced
 from app.models.problem import Problem, Choice, Tag, ProblemTag
 from app.models.user import User
+from app.services.catalog import catalog
+from app.services.invalidation import notify
 from app.schemas.problem import ProblemCreate, ProblemUpdate
 
 
+@traced
 def get_problem_by_id(db: Session, problem_id: UUID) -> Optional[Problem]:
     return db.query(Problem).filter(Problem.id == problem_id).first()
 
 
+@traced
 def get_problems(
     db: Session, 
     skip: int = 0, 
@@ -38,18 +43,22 @@ def get_problems(
             Problem.title.ilike(search_term) | Problem.description.ilike(search_term)
         )
     
-    # 合計数を取得
-    total = query.count()
+    # 合計数を取得 (検索がなければ共有カタログの件数を使う)
+    total = None if search else catalog.problem_count(tag=tag, difficulty=difficulty)
+    if total is None:
+        total = query.count()
     
     # 選択肢とタグを事前にロード
     query = query.options(joinedload(Problem.choices), joinedload(Problem.tags).joinedload(ProblemTag.tag))
     
-    # ページネーション
+    # ページネーション (新しい順。idx_problem_created_at を使う)
+    query = query.order_by(Problem.created_at.desc(), Problem.id.desc())
     problems = query.offset(skip).limit(limit).all()
     
     return problems, total
 
 
+@traced
 def create_problem(
     db: Session, 
     problem_create: ProblemCreate, 
@@ -97,11 +106,13 @@ def create_problem(
             )
             db.add(db_problem_tag)
     
+    notify(db, "problem", db_problem.id)
     db.commit()
     db.refresh(db_problem)
     return db_problem
 
 
+@traced
 def update_problem(
     db: Session, 
     problem: Problem, 
@@ -113,17 +124,21 @@ def update_problem(
         setattr(problem, key, value)
     
     db.add(problem)
+    notify(db, "problem", problem.id)
     db.commit()
     db.refresh(problem)
     return problem
 
 
+@traced
 def delete_problem(db: Session, problem: Problem) -> bool:
     db.delete(problem)
+    notify(db, "problem", problem.id)
     db.commit()
     return True
 
 
+@traced
 def add_choice_to_problem(
     db: Session, 
     problem: Problem, 
@@ -136,11 +151,13 @@ def add_choice_to_problem(
         is_correct=is_correct,
     )
     db.add(db_choice)
+    notify(db, "problem", problem.id)
     db.commit()
     db.refresh(db_choice)
     return db_choice
 
 
+@traced
 def update_choice(
     db: Session, 
     choice: Choice, 
@@ -154,17 +171,21 @@ def update_choice(
         choice.is_correct = is_correct
     
     db.add(choice)
+    notify(db, "problem", choice.problem_id)
     db.commit()
     db.refresh(choice)
     return choice
 
 
+@traced
 def delete_choice(db: Session, choice: Choice) -> bool:
     db.delete(choice)
+    notify(db, "problem", choice.problem_id)
     db.commit()
     return True
 
 
+@traced
 def get_problem_stats(db: Session, problem_id: UUID) -> Dict[str, Any]:
     """問題の統計情報を取得する"""
     from app.models.user_progress import UserAnswer
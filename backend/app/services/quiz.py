@@ -0,0 +1,659 @@
+"""
+小テスト（制限時間付き受験セッション）のサービス
+
+受験中のリクエストがデータベースに触れないよう、問題セットは開始時に
+ワーカー内へ一括で読み込んでキャッシュし、回答はセッションストア上の
+コンパクトな状態として保持する。データベースへの書き込みは開始時の
+セッション行の作成と、提出・時間切れ時の一括確定のほかは、回答の控えを
+数秒ごとにまとめてセッション行へ書き戻す (write-behind) だけで、
+ストアから消えたセッションはこの控えから復元する。
+
+回答は問題セット内の位置で持つため、セッションは開始時の問題セットの版
+(``QuizPaper.version``) に固定する。受験中に問題が変更されても、古い版は
+``pinned_papers`` に残して引き続き使う。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import bindparam, insert
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.tracing import traced
+from app.models.problem import Problem
+from app.models.quiz import QuizSession, QuizSet, QuizSetProblem
+from app.models.user import User
+from app.models.user_progress import UserAnswer, UserProgress
+from app.schemas.quiz import QuizSetCreate
+from app.services.invalidation import invalidation_bus
+from app.services.rating import update_ratings
+from app.services.user_progress import apply_answer_to_progress
+
+logger = logging.getLogger(__name__)
+
+
+class QuizSessionClosed(ValueError):
+    """提出済み、または制限時間を過ぎたセッションへの操作"""
+
+
+@dataclass(frozen=True)
+class PaperChoice:
+    id: UUID
+    text: str
+    is_correct: bool
+
+
+@dataclass(frozen=True)
+class PaperProblem:
+    id: UUID
+    title: str
+    problem_text: str
+    choices: Tuple[PaperChoice, ...]
+
+
+@dataclass(frozen=True)
+class QuizPaper:
+    """受験中に参照する問題セットの読み取り専用スナップショット"""
+    quiz_set_id: UUID
+    title: str
+    time_limit_seconds: int
+    shuffle_choices: bool
+    problems: Tuple[PaperProblem, ...]
+    # 選択肢ID -> (問題の位置, 選択肢の位置)
+    choice_index: Dict[UUID, Tuple[int, int]] = field(repr=False)
+    # 問題と選択肢の並びから求めた版 (位置の意味が変わると変わる)
+    version: str = ""
+
+    def choice_order(self, seed: int) -> List[Tuple[int, ...]]:
+        """セッションのシードから各問題の選択肢の提示順を復元する"""
+        rng = random.Random(seed)
+        orders = []
+        for problem in self.problems:
+            order = list(range(len(problem.choices)))
+            if self.shuffle_choices:
+                rng.shuffle(order)
+            orders.append(tuple(order))
+        return orders
+
+
+@dataclass
+class QuizSessionState:
+    """受験中セッションの状態
+
+    ``answers`` は問題の位置ごとに1バイトで、0が未回答、kが
+    ``paper.problems[pos].choices[k - 1]`` の選択を表す。位置は
+    ``paper_version`` の版の問題セットでのもの。
+    """
+    session_id: str
+    user_id: str
+    quiz_set_id: str
+    seed: int
+    expires_at: float
+    answers: bytearray
+    paper_version: str = ""
+    status: str = "active"
+
+    @property
+    def answered(self) -> int:
+        return sum(1 for code in self.answers if code)
+
+    @property
+    def total(self) -> int:
+        return len(self.answers)
+
+    def remaining_seconds(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        return max(0, int(self.expires_at - now))
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "u": self.user_id,
+            "q": self.quiz_set_id,
+            "s": self.seed,
+            "e": self.expires_at,
+            "a": self.answers.hex(),
+            "v": self.paper_version,
+            "st": self.status,
+        })
+
+    @classmethod
+    def from_json(cls, session_id: str, data: str) -> "QuizSessionState":
+        raw = json.loads(data)
+        return cls(
+            session_id=session_id,
+            user_id=raw["u"],
+            quiz_set_id=raw["q"],
+            seed=raw["s"],
+            expires_at=raw["e"],
+            answers=bytearray.fromhex(raw["a"]),
+            paper_version=raw["v"],
+            status=raw["st"],
+        )
+
+
+class MemoryQuizSessionStore:
+    """ワーカープロセス内のセッションストア"""
+
+    def __init__(self):
+        self._sessions: Dict[str, QuizSessionState] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[QuizSessionState]:
+        return self._sessions.get(session_id)
+
+    def put(self, state: QuizSessionState) -> None:
+        with self._lock:
+            self._sessions[state.session_id] = state
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def expired(self, before: float) -> Iterator[QuizSessionState]:
+        with self._lock:
+            states = [s for s in self._sessions.values() if s.expires_at < before]
+        return iter(states)
+
+
+class SqliteQuizSessionStore:
+    """同一ホスト上のワーカー間で共有するローカルKVストア（SQLite）
+
+    ワーカーの再起動やリクエストの振り分け先が変わっても回答が失われない。
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS quiz_sessions "
+                "(session_id TEXT PRIMARY KEY, expires_at REAL NOT NULL, data TEXT NOT NULL)"
+            )
+
+    def reopen(self) -> None:
+        """fork したワーカーで接続を開き直す (SQLite の接続はプロセス間で共有できない)"""
+        self._conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[QuizSessionState]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM quiz_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return QuizSessionState.from_json(session_id, row[0]) if row else None
+
+    def put(self, state: QuizSessionState) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO quiz_sessions (session_id, expires_at, data) VALUES (?, ?, ?)",
+                (state.session_id, state.expires_at, state.to_json()),
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM quiz_sessions WHERE session_id = ?", (session_id,))
+
+    def expired(self, before: float) -> Iterator[QuizSessionState]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id, data FROM quiz_sessions WHERE expires_at < ?", (before,)
+            ).fetchall()
+        return (QuizSessionState.from_json(session_id, data) for session_id, data in rows)
+
+
+def create_session_store():
+    if settings.QUIZ_SESSION_STORE == "sqlite":
+        return SqliteQuizSessionStore(settings.QUIZ_SESSION_STORE_PATH)
+    return MemoryQuizSessionStore()
+
+
+session_store = create_session_store()
+paper_cache = TTLCache(maxsize=256, ttl=settings.QUIZ_PAPER_CACHE_TTL_SECONDS)
+# 版 -> 問題セット。問題の変更で paper_cache から外れた版も、受験中のセッションのために残す
+pinned_papers = TTLCache(maxsize=1024, ttl=settings.QUIZ_PAPER_CACHE_TTL_SECONDS)
+
+# 回答を記録してまだセッション行へ書き戻していないセッションID
+_unflushed: Set[str] = set()
+_unflushed_lock = threading.Lock()
+
+
+@traced
+def create_quiz_set(db: Session, quiz_create: QuizSetCreate, creator: User) -> QuizSet:
+    problem_ids = list(dict.fromkeys(quiz_create.problem_ids))
+    found = {
+        row.id for row in db.query(Problem.id).filter(Problem.id.in_(problem_ids)).all()
+    }
+    missing = [str(pid) for pid in problem_ids if pid not in found]
+    if missing:
+        raise ValueError(f"Problems not found: {', '.join(missing)}")
+
+    db_quiz = QuizSet(
+        title=quiz_create.title,
+        description=quiz_create.description,
+        time_limit_seconds=quiz_create.time_limit_seconds,
+        shuffle_choices=quiz_create.shuffle_choices,
+        created_by=creator.id,
+    )
+    db.add(db_quiz)
+    db.flush()  # IDを生成するためにフラッシュ
+
+    for position, problem_id in enumerate(problem_ids):
+        db.add(QuizSetProblem(quiz_set_id=db_quiz.id, problem_id=problem_id, position=position))
+
+    db.commit()
+    db.refresh(db_quiz)
+    return db_quiz
+
+
+@traced
+def get_quiz_set_by_id(db: Session, quiz_set_id: UUID) -> Optional[QuizSet]:
+    return db.query(QuizSet).filter(QuizSet.id == quiz_set_id).first()
+
+
+def _load_paper(db: Session, quiz_set_id: UUID) -> Optional[QuizPaper]:
+    quiz_set = (
+        db.query(QuizSet)
+        .options(
+            joinedload(QuizSet.problems)
+            .joinedload(QuizSetProblem.problem)
+            .joinedload(Problem.choices)
+        )
+        .filter(QuizSet.id == quiz_set_id)
+        .first()
+    )
+    if not quiz_set:
+        return None
+
+    problems = []
+    choice_index = {}
+    version = hashlib.sha1()
+    for position, entry in enumerate(quiz_set.problems):
+        problem = entry.problem
+        choices = sorted(problem.choices, key=lambda c: (c.created_at, str(c.id)))
+        version.update(problem.id.bytes)
+        for choice_position, choice in enumerate(choices):
+            choice_index[choice.id] = (position, choice_position)
+            version.update(choice.id.bytes)
+        problems.append(PaperProblem(
+            id=problem.id,
+            title=problem.title,
+            problem_text=problem.problem_text,
+            choices=tuple(PaperChoice(c.id, c.text, c.is_correct) for c in choices),
+        ))
+
+    return QuizPaper(
+        quiz_set_id=quiz_set.id,
+        title=quiz_set.title,
+        time_limit_seconds=quiz_set.time_limit_seconds,
+        shuffle_choices=quiz_set.shuffle_choices,
+        problems=tuple(problems),
+        choice_index=choice_index,
+        version=version.hexdigest()[:16],
+    )
+
+
+@traced
+def get_quiz_paper(db: Session, quiz_set_id: UUID) -> Optional[QuizPaper]:
+    """問題セットをキャッシュから取得する（なければ一括で読み込む）"""
+    key = str(quiz_set_id)
+    paper = paper_cache.get(key)
+    if paper is None:
+        paper = _load_paper(db, quiz_set_id)
+        if paper is not None:
+            # 受験中にキャッシュが失効しないよう制限時間より長く保持する
+            ttl = max(
+                settings.QUIZ_PAPER_CACHE_TTL_SECONDS,
+                paper.time_limit_seconds + settings.QUIZ_DEADLINE_GRACE_SECONDS,
+            )
+            paper_cache.set(key, paper, ttl=ttl)
+            pinned_papers.set(paper.version, paper, ttl=ttl)
+    return paper
+
+
+def invalidate_quiz_paper(quiz_set_id: UUID) -> None:
+    paper_cache.pop(str(quiz_set_id))
+
+
+def _invalidate_papers_with_problems(problem_ids) -> None:
+    """問題・選択肢を変更したら、その問題を含む問題セットのキャッシュを破棄する"""
+    for key, paper in paper_cache.snapshot().items():
+        if any(str(problem.id) in problem_ids for problem in paper.problems):
+            paper_cache.pop(key)
+
+
+invalidation_bus.subscribe("problem", _invalidate_papers_with_problems, paper_cache.clear)
+
+
+def _answer_codes(paper: QuizPaper, answers: Optional[Dict[str, str]]) -> bytearray:
+    """問題ID -> 選択肢ID の控えを、問題セット内の位置の状態に直す"""
+    codes = bytearray(len(paper.problems))
+    for problem_id, choice_id in (answers or {}).items():
+        position = paper.choice_index.get(UUID(choice_id))
+        if position and str(paper.problems[position[0]].id) == problem_id:
+            codes[position[0]] = position[1] + 1
+    return codes
+
+
+def _answer_choice_ids(paper: QuizPaper, codes: bytearray) -> Dict[str, str]:
+    return {
+        str(paper.problems[position].id): str(paper.problems[position].choices[code - 1].id)
+        for position, code in enumerate(codes)
+        if code
+    }
+
+
+def _state_from_row(row: QuizSession, paper: QuizPaper) -> QuizSessionState:
+    return QuizSessionState(
+        session_id=str(row.id),
+        user_id=str(row.user_id),
+        quiz_set_id=str(row.quiz_set_id),
+        seed=row.seed,
+        expires_at=(row.expires_at - datetime(1970, 1, 1)).total_seconds(),
+        answers=_answer_codes(paper, row.answers),
+        paper_version=paper.version,
+        status=row.status,
+    )
+
+
+def _session_paper(db: Session, state: QuizSessionState) -> Optional[QuizPaper]:
+    """セッションを開始した版の問題セットを返す (問題セットが削除されていれば None)"""
+    paper = pinned_papers.get(state.paper_version)
+    if paper is not None:
+        return paper
+    paper = get_quiz_paper(db, UUID(state.quiz_set_id))
+    if paper is None or paper.version == state.paper_version:
+        return paper
+    # 受験中に問題が変更され、開始時の版がこのワーカーにない。書き戻した
+    # 回答の控えから現在の版の位置に直す (書き戻し前の回答は失われる)
+    logger.warning("Quiz session %s moved to quiz paper version %s", state.session_id, paper.version)
+    answers = db.query(QuizSession.answers).filter(QuizSession.id == state.session_id).scalar()
+    state.answers = _answer_codes(paper, answers)
+    state.paper_version = paper.version
+    return paper
+
+
+def _lock_session_row(db: Session, session_id: str) -> Optional[QuizSession]:
+    return (
+        db.query(QuizSession)
+        .filter(QuizSession.id == session_id)
+        .with_for_update()
+        .first()
+    )
+
+
+def _close_state(state: QuizSessionState, status: str) -> None:
+    """確定・削除したセッションをストアから外す"""
+    state.status = status
+    session_store.delete(state.session_id)
+    with _unflushed_lock:
+        _unflushed.discard(state.session_id)
+
+
+@traced
+def start_session(
+    db: Session,
+    user: User,
+    paper: QuizPaper
+) -> QuizSessionState:
+    """受験を開始する。受験中のセッションがあれば再開する"""
+    existing = db.query(QuizSession).filter(
+        QuizSession.user_id == user.id,
+        QuizSession.quiz_set_id == paper.quiz_set_id,
+    ).first()
+    if existing:
+        if existing.status != "active":
+            raise QuizSessionClosed("This quiz has already been taken")
+        state = session_store.get(str(existing.id)) or _state_from_row(existing, paper)
+        session_store.put(state)
+        return state
+
+    started_at = datetime.utcnow()
+    db_session = QuizSession(
+        id=uuid.uuid4(),
+        quiz_set_id=paper.quiz_set_id,
+        user_id=user.id,
+        status="active",
+        seed=random.getrandbits(31),
+        started_at=started_at,
+        expires_at=started_at + timedelta(seconds=paper.time_limit_seconds),
+    )
+    # コミット後の再読み込みを避けるため、コミット前に状態を組み立てる
+    state = _state_from_row(db_session, paper)
+    db.add(db_session)
+    db.commit()
+
+    session_store.put(state)
+    return state
+
+
+@traced
+def get_session_state(db: Session, session_id: str) -> Optional[QuizSessionState]:
+    """セッション状態をストアから取得し、なければデータベースから復元する"""
+    state = session_store.get(session_id)
+    if state is not None:
+        return state
+
+    row = db.query(QuizSession).filter(QuizSession.id == session_id).first()
+    if not row:
+        return None
+    paper = get_quiz_paper(db, row.quiz_set_id)
+    if paper is None:
+        return None
+    state = _state_from_row(row, paper)
+    if state.status == "active":
+        session_store.put(state)
+    return state
+
+
+@traced
+def record_answer(
+    db: Session,
+    state: QuizSessionState,
+    problem_id: UUID,
+    choice_id: UUID
+) -> QuizSessionState:
+    """回答をセッション状態に記録する（データベースへは後でまとめて書き戻す）"""
+    if state.status != "active":
+        raise QuizSessionClosed("This quiz session is already closed")
+
+    if time.time() > state.expires_at + settings.QUIZ_DEADLINE_GRACE_SECONDS:
+        finalize_session(db, state, status="expired")
+        raise QuizSessionClosed("The time limit for this quiz has passed")
+
+    paper = _session_paper(db, state)
+    if paper is None:
+        _close_state(state, "expired")
+        raise QuizSessionClosed("This quiz no longer exists")
+    position = paper.choice_index.get(choice_id)
+    if not position or paper.problems[position[0]].id != problem_id:
+        raise ValueError("Invalid choice for this problem")
+
+    state.answers[position[0]] = position[1] + 1
+    session_store.put(state)
+    with _unflushed_lock:
+        _unflushed.add(state.session_id)
+    return state
+
+
+@traced
+def finalize_session(
+    db: Session,
+    state: QuizSessionState,
+    status: str = "submitted"
+) -> Optional[QuizSession]:
+    """回答を UserAnswer / UserProgress に一括で書き込みセッションを確定する
+
+    セッション行が削除されていれば (問題セットの削除) None を返す。
+    """
+    row = _lock_session_row(db, state.session_id)
+    if row is None:
+        db.rollback()
+        _close_state(state, "expired")
+        return None
+    if row.status != "active":
+        # 他のワーカーで確定済み
+        db.rollback()
+        _close_state(state, row.status)
+        return row
+
+    paper = _session_paper(db, state)
+    now = datetime.utcnow()
+    user_id = row.user_id
+
+    answer_rows = []
+    snapshot = {}
+    for position, code in enumerate(state.answers if paper is not None else ()):
+        if not code:
+            continue
+        problem = paper.problems[position]
+        choice = problem.choices[code - 1]
+        snapshot[str(problem.id)] = str(choice.id)
+        answer_rows.append({
+            "user_id": user_id,
+            "problem_id": problem.id,
+            "selected_choice": choice.id,
+            "is_correct": choice.is_correct,
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    if answer_rows:
+        db.execute(insert(UserAnswer), answer_rows)
+
+        problem_ids = [r["problem_id"] for r in answer_rows]
+        progress_by_problem = {
+            p.problem_id: p
+            for p in db.query(UserProgress).filter(
+                UserProgress.user_id == user_id,
+                UserProgress.problem_id.in_(problem_ids),
+            ).all()
+        }
+        for answer in answer_rows:
+            progress = progress_by_problem.get(answer["problem_id"])
+            if progress is None:
+                progress = UserProgress(user_id=user_id, problem_id=answer["problem_id"], attempts=0)
+                db.add(progress)
+            apply_answer_to_progress(progress, answer["is_correct"], now)
+
+        update_ratings(db, user_id, [(r["problem_id"], r["is_correct"]) for r in answer_rows])
+
+    row.status = status
+    row.submitted_at = now
+    row.answers = snapshot
+    row.score = sum(1 for r in answer_rows if r["is_correct"])
+    db.commit()
+
+    _close_state(state, status)
+    return row
+
+
+@traced
+def flush_answers(db: Session) -> int:
+    """記録した回答の控えを受験中のセッション行へまとめて書き戻し、件数を返す"""
+    with _unflushed_lock:
+        session_ids = list(_unflushed)
+        _unflushed.clear()
+
+    params = []
+    for session_id in session_ids:
+        # 別のワーカーが同じセッションに記録していても、ストアの最新の状態を書く
+        state = session_store.get(session_id)
+        if state is None or state.status != "active":
+            continue
+        paper = pinned_papers.get(state.paper_version)
+        if paper is None:
+            continue
+        params.append({
+            "session_id": UUID(session_id),
+            "recorded": _answer_choice_ids(paper, state.answers),
+        })
+    if params:
+        table = QuizSession.__table__
+        db.execute(
+            table.update()
+            .where(table.c.id == bindparam("session_id"), table.c.status == "active")
+            .values(answers=bindparam("recorded")),
+            params,
+        )
+        db.commit()
+    return len(params)
+
+
+@traced
+def finalize_expired_sessions(db: Session) -> int:
+    """制限時間を過ぎたセッションを確定し、確定件数を返す"""
+    cutoff = time.time() - settings.QUIZ_DEADLINE_GRACE_SECONDS
+    count = 0
+    for state in session_store.expired(cutoff):
+        if state.status == "active":
+            finalize_session(db, state, status="expired")
+            count += 1
+
+    # どのワーカーのストアにも残っていないセッション（再起動など）を失効させる
+    orphan_cutoff = datetime.utcnow() - timedelta(seconds=settings.QUIZ_ORPHAN_GRACE_SECONDS)
+    count += db.query(QuizSession).filter(
+        QuizSession.status == "active",
+        QuizSession.expires_at < orphan_cutoff,
+    ).update({"status": "expired", "submitted_at": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def flush_pending_answers() -> int:
+    from app.db.base import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return flush_answers(db)
+    finally:
+        db.close()
+
+
+async def run_answer_flush() -> None:
+    """回答の控えを定期的にセッション行へ書き戻すバックグラウンドタスク"""
+    from starlette.concurrency import run_in_threadpool
+
+    while True:
+        await asyncio.sleep(settings.QUIZ_ANSWER_FLUSH_SECONDS)
+        try:
+            await run_in_threadpool(flush_pending_answers)
+        except Exception:
+            logger.exception("Quiz answer flush failed")
+
+
+async def run_session_sweeper() -> None:
+    """制限時間切れのセッションを定期的に確定するバックグラウンドタスク"""
+    from starlette.concurrency import run_in_threadpool
+
+    from app.db.base import SessionLocal
+
+    def sweep() -> int:
+        db = SessionLocal()
+        try:
+            return finalize_expired_sessions(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(settings.QUIZ_SWEEP_INTERVAL_SECONDS)
+        try:
+            finalized = await run_in_threadpool(sweep)
+            if finalized:
+                logger.info("Finalized %d expired quiz sessions", finalized)
+        except Exception:
+            logger.exception("Quiz session sweep failed")
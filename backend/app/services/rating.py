@@ -0,0 +1,359 @@
+"""
+Eloレーティングによる適応出題エンジン
+
+回答のたびに学習者（タグごと）と問題のレーティングをオンラインで更新する。
+出題はワーカー内に保持するタグごとのソート済みNumPy配列から、学習者の
+能力に合った難易度の問題をベクトル演算で探す。索引の作り直しは
+``run_rating_index_refresh`` がリクエストの外で行う。
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.tracing import traced
+from app.models.problem import Problem, ProblemTag, Tag
+from app.models.user import User
+from app.models.user_progress import UserProgress, UserRating
+from app.services.invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+INITIAL_RATING = 1500.0
+# 近傍探索で最初に調べる候補の片側幅
+SEARCH_WINDOW = 64
+# コミット待ちの問題レーティング (問題ID -> レーティング) を置く Session.info のキー
+_PENDING = "pending_problem_ratings"
+
+
+def expected_score(user_rating: float, problem_rating: float) -> float:
+    """学習者が問題に正解する確率のEloモデルによる推定値"""
+    return 1.0 / (1.0 + 10.0 ** ((problem_rating - user_rating) / 400.0))
+
+
+def k_factor(rating_count: int) -> float:
+    """回答数が少ないうちは大きく、増えるにつれて小さくなる更新幅"""
+    return max(settings.ADAPTIVE_K_FACTOR / 4, settings.ADAPTIVE_K_FACTOR * 2 / (1 + rating_count / 20))
+
+
+def target_problem_rating(user_rating: float, success_rate: Optional[float] = None) -> float:
+    """正答率が ``success_rate`` になる問題のレーティング"""
+    p = settings.ADAPTIVE_TARGET_SUCCESS if success_rate is None else success_rate
+    return user_rating - 400.0 * math.log10(p / (1.0 - p))
+
+
+@dataclass
+class TagBank:
+    """タグに属する問題のレーティング（昇順）と問題コードの並列配列"""
+    ratings: np.ndarray
+    codes: np.ndarray
+
+
+class RatingIndex:
+    """タグごとの問題レーティングのインメモリ索引
+
+    レーティングの更新は、コミット後に問題を配列上の新しい位置へ移して
+    昇順を保つ。問題やタグの変更は索引を要再構築にするだけで、作り直しは
+    バックグラウンドタスクが ``RATING_INDEX_REBUILD_SECONDS`` ごと
+    (または要再構築になったとき) にデータベースから行う。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._banks: Dict[str, TagBank] = {}
+        self._problem_ids: List[UUID] = []
+        self._code_of: Dict[UUID, int] = {}
+        # 問題コード -> {タグ名: 配列上の位置}
+        self._positions: Dict[int, Dict[str, int]] = {}
+        self._built_at: Optional[float] = None
+        self._dirty = False
+
+    @property
+    def is_built(self) -> bool:
+        return self._built_at is not None
+
+    @property
+    def is_stale(self) -> bool:
+        return (
+            self._built_at is None
+            or self._dirty
+            or time.monotonic() - self._built_at > settings.RATING_INDEX_REBUILD_SECONDS
+        )
+
+    def load(self, rows: Iterable[Tuple[str, UUID, float]]) -> None:
+        """(タグ名, 問題ID, レーティング) の列から索引を構築する"""
+        problem_ids: List[UUID] = []
+        code_of: Dict[UUID, int] = {}
+        by_tag: Dict[str, Tuple[List[float], List[int]]] = {}
+        for tag_name, problem_id, rating in rows:
+            code = code_of.get(problem_id)
+            if code is None:
+                code = code_of[problem_id] = len(problem_ids)
+                problem_ids.append(problem_id)
+            ratings, codes = by_tag.setdefault(tag_name, ([], []))
+            ratings.append(rating)
+            codes.append(code)
+
+        banks: Dict[str, TagBank] = {}
+        positions: Dict[int, Dict[str, int]] = {}
+        for tag_name, (ratings, codes) in by_tag.items():
+            ratings_arr = np.asarray(ratings, dtype=np.float64)
+            order = np.argsort(ratings_arr, kind="stable")
+            bank = TagBank(ratings=ratings_arr[order], codes=np.asarray(codes, dtype=np.int32)[order])
+            banks[tag_name] = bank
+            for pos, code in enumerate(bank.codes.tolist()):
+                positions.setdefault(code, {})[tag_name] = pos
+
+        with self._lock:
+            self._banks = banks
+            self._problem_ids = problem_ids
+            self._code_of = code_of
+            self._positions = positions
+            self._built_at = time.monotonic()
+
+    def rebuild(self, db: Session) -> None:
+        # 読み込み中に届いた無効化は次の作り直しに回す
+        self._dirty = False
+        rows = (
+            db.query(Tag.name, Problem.id, Problem.rating)
+            .join(ProblemTag, ProblemTag.tag_id == Tag.id)
+            .join(Problem, Problem.id == ProblemTag.problem_id)
+            .all()
+        )
+        self.load(rows)
+
+    def invalidate(self) -> None:
+        self._dirty = True
+
+    def update_rating(self, problem_id: UUID, rating: float) -> None:
+        """問題のレーティングを書き換え、昇順を保つ位置へ移す"""
+        with self._lock:
+            code = self._code_of.get(problem_id)
+            if code is None:
+                return
+            for tag_name, pos in list(self._positions.get(code, {}).items()):
+                bank = self._banks.get(tag_name)
+                if bank is not None and pos < len(bank.ratings):
+                    self._move(tag_name, bank, pos, code, rating)
+
+    def _move(self, tag_name: str, bank: TagBank, pos: int, code: int, rating: float) -> None:
+        ratings, codes = bank.ratings, bank.codes
+        if rating >= ratings[pos]:
+            new = pos + int(np.searchsorted(ratings[pos + 1:], rating, side="left"))
+            ratings[pos:new] = ratings[pos + 1:new + 1]
+            codes[pos:new] = codes[pos + 1:new + 1]
+            shifted = range(pos, new)
+        else:
+            new = int(np.searchsorted(ratings[:pos], rating, side="right"))
+            ratings[new + 1:pos + 1] = ratings[new:pos]
+            codes[new + 1:pos + 1] = codes[new:pos]
+            shifted = range(new + 1, pos + 1)
+        ratings[new] = rating
+        codes[new] = code
+        # 更新幅は小さいので、ずれた問題の位置の付け直しは数件で済む
+        for i in shifted:
+            self._positions[int(codes[i])][tag_name] = i
+        self._positions[code][tag_name] = new
+
+    def codes_for(self, problem_ids: Iterable[UUID]) -> np.ndarray:
+        code_of = self._code_of
+        return np.fromiter(
+            (code_of[pid] for pid in problem_ids if pid in code_of), dtype=np.int32
+        )
+
+    def select(self, tag_name: str, target: float, exclude: Sequence[UUID] = ()) -> Optional[UUID]:
+        """レーティングが ``target`` に最も近い未出題の問題を返す"""
+        with self._lock:
+            bank = self._banks.get(tag_name)
+            if bank is None or len(bank.ratings) == 0:
+                return None
+            excluded = self.codes_for(exclude)
+
+            n = len(bank.ratings)
+            center = int(np.searchsorted(bank.ratings, target))
+            lo, hi = max(0, center - SEARCH_WINDOW), min(n, center + SEARCH_WINDOW)
+            best = self._nearest(bank.ratings[lo:hi], bank.codes[lo:hi], target, excluded)
+            if best is None and (lo > 0 or hi < n):
+                # 近傍がすべて出題済みの場合は全体から探す
+                best = self._nearest(bank.ratings, bank.codes, target, excluded)
+            return None if best is None else self._problem_ids[best]
+
+    @staticmethod
+    def _nearest(
+        ratings: np.ndarray,
+        codes: np.ndarray,
+        target: float,
+        excluded: np.ndarray
+    ) -> Optional[int]:
+        distance = np.abs(ratings - target)
+        if len(excluded):
+            distance = np.where(np.isin(codes, excluded), np.inf, distance)
+        i = int(np.argmin(distance))
+        if not np.isfinite(distance[i]):
+            return None
+        return int(codes[i])
+
+
+rating_index = RatingIndex()
+invalidation_bus.subscribe("problem", lambda keys: rating_index.invalidate(), rating_index.invalidate)
+invalidation_bus.subscribe("tag", lambda keys: rating_index.invalidate(), rating_index.invalidate)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_ratings(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        for problem_id, rating in pending.items():
+            rating_index.update_rating(problem_id, rating)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_ratings(session):
+    session.info.pop(_PENDING, None)
+
+
+@traced
+def update_ratings(
+    db: Session,
+    user_id: UUID,
+    results: Sequence[Tuple[UUID, bool]]
+) -> None:
+    """回答結果 (問題ID, 正誤) に応じて学習者と問題のレーティングを更新する
+
+    呼び出し側のトランザクション内で更新し、コミットは行わない。
+    索引へはコミットされたときに反映する。同じ問題への同時の回答で更新が
+    失われないよう、問題、学習者のレーティングの順に行をロックして読む
+    (どちらも ID 順にロックしてデッドロックを避ける)。
+    """
+    if not results:
+        return
+    problem_ids = sorted({problem_id for problem_id, _ in results})
+
+    problems = {
+        p.id: p
+        for p in db.query(Problem)
+        .filter(Problem.id.in_(problem_ids))
+        .order_by(Problem.id)
+        .with_for_update()
+        .populate_existing()
+        .all()
+    }
+    tags_by_problem: Dict[UUID, List[UUID]] = {}
+    for problem_id, tag_id in (
+        db.query(ProblemTag.problem_id, ProblemTag.tag_id)
+        .filter(ProblemTag.problem_id.in_(problem_ids))
+        .all()
+    ):
+        tags_by_problem.setdefault(problem_id, []).append(tag_id)
+
+    tag_ids = {tag_id for tags in tags_by_problem.values() for tag_id in tags}
+    user_ratings = {}
+    if tag_ids:
+        user_ratings = {
+            r.tag_id: r
+            for r in db.query(UserRating)
+            .filter(
+                UserRating.user_id == user_id,
+                UserRating.tag_id.in_(tag_ids),
+            )
+            .order_by(UserRating.tag_id)
+            .with_for_update()
+            .populate_existing()
+            .all()
+        }
+
+    for problem_id, is_correct in results:
+        problem = problems.get(problem_id)
+        if problem is None:
+            continue
+        tag_ratings = []
+        for tag_id in tags_by_problem.get(problem_id, ()):
+            user_rating = user_ratings.get(tag_id)
+            if user_rating is None:
+                user_rating = UserRating(user_id=user_id, tag_id=tag_id, rating=INITIAL_RATING, rating_count=0)
+                user_ratings[tag_id] = user_rating
+                db.add(user_rating)
+            tag_ratings.append(user_rating)
+
+        ability = (
+            sum(r.rating for r in tag_ratings) / len(tag_ratings) if tag_ratings else INITIAL_RATING
+        )
+        surprise = (1.0 if is_correct else 0.0) - expected_score(ability, problem.rating)
+
+        for user_rating in tag_ratings:
+            user_rating.rating += k_factor(user_rating.rating_count) * surprise
+            user_rating.rating_count += 1
+        problem.rating -= k_factor(problem.rating_count) * surprise
+        problem.rating_count = (problem.rating_count or 0) + 1
+        db.info.setdefault(_PENDING, {})[problem.id] = problem.rating
+
+
+@traced
+def select_next_problem(db: Session, user: User, tag_name: str) -> Optional[Problem]:
+    """タグの中から学習者の現在の能力に合った未出題の問題を選ぶ"""
+    tag_rating = (
+        db.query(UserRating.rating)
+        .join(Tag, Tag.id == UserRating.tag_id)
+        .filter(UserRating.user_id == user.id, Tag.name == tag_name)
+        .scalar()
+    )
+    target = target_problem_rating(INITIAL_RATING if tag_rating is None else tag_rating)
+
+    recent_since = datetime.utcnow() - timedelta(hours=settings.ADAPTIVE_RECENT_WINDOW_HOURS)
+    recent = [
+        problem_id
+        for (problem_id,) in db.query(UserProgress.problem_id).filter(
+            UserProgress.user_id == user.id,
+            UserProgress.last_attempt_at >= recent_since,
+        )
+    ]
+
+    if not rating_index.is_built:
+        # 索引ができるまではデータベースで最も近い問題を探す
+        query = (
+            db.query(Problem)
+            .join(ProblemTag, ProblemTag.problem_id == Problem.id)
+            .join(Tag, Tag.id == ProblemTag.tag_id)
+            .filter(Tag.name == tag_name)
+        )
+        if recent:
+            query = query.filter(Problem.id.notin_(recent))
+        return query.order_by(func.abs(Problem.rating - target)).first()
+
+    problem_id = rating_index.select(tag_name, target, exclude=recent)
+    if problem_id is None:
+        return None
+    return db.query(Problem).filter(Problem.id == problem_id).first()
+
+
+def refresh_rating_index() -> None:
+    from app.db.base import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rating_index.rebuild(db)
+    finally:
+        db.close()
+
+
+async def run_rating_index_refresh() -> None:
+    """古くなった (または要再構築になった) 索引を作り直すバックグラウンドタスク"""
+    from starlette.concurrency import run_in_threadpool
+
+    while True:
+        try:
+            if rating_index.is_stale:
+                await run_in_threadpool(refresh_rating_index)
+        except Exception:
+            logger.exception("Rating index rebuild failed")
+        await asyncio.sleep(settings.RATING_INDEX_CHECK_SECONDS)
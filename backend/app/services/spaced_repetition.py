@@ -0,0 +1,72 @@
+"""
+間隔反復（SM-2）による復習スケジューラ
+
+``stability`` は次回復習までの間隔（日）、``ease_factor`` は間隔の伸び率、
+``review_streak`` は連続正解回数を表す。
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+INITIAL_EASE_FACTOR = 2.5
+MIN_EASE_FACTOR = 1.3
+# 連続正解で間隔が指数的に伸びても日時の範囲を超えないようにする上限（日）
+MAX_STABILITY_DAYS = 36500.0
+
+# 選択式の回答は正誤しか分からないため、SM-2の回答品質(0-5)に次のように対応させる
+QUALITY_CORRECT = 4
+QUALITY_INCORRECT = 2
+
+
+@dataclass(frozen=True)
+class ReviewState:
+    ease_factor: float = INITIAL_EASE_FACTOR
+    stability: float = 0.0
+    review_streak: int = 0
+
+
+def quality_from_answer(is_correct: bool) -> int:
+    return QUALITY_CORRECT if is_correct else QUALITY_INCORRECT
+
+
+def schedule_review(
+    state: ReviewState,
+    quality: int,
+    reviewed_at: datetime
+) -> Tuple[ReviewState, datetime]:
+    """SM-2で次の状態と次回復習日時を求める"""
+    if quality >= 3:
+        if state.review_streak == 0:
+            stability = 1.0
+        elif state.review_streak == 1:
+            stability = 6.0
+        else:
+            stability = min(MAX_STABILITY_DAYS, state.stability * state.ease_factor)
+        review_streak = state.review_streak + 1
+    else:
+        # 不正解の場合は最初からやり直し
+        stability = 1.0
+        review_streak = 0
+
+    ease_factor = state.ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    ease_factor = max(MIN_EASE_FACTOR, ease_factor)
+
+    next_state = ReviewState(
+        ease_factor=ease_factor,
+        stability=stability,
+        review_streak=review_streak,
+    )
+    return next_state, reviewed_at + timedelta(days=stability)
+
+
+def review_state_of(
+    ease_factor: Optional[float],
+    stability: Optional[float],
+    review_streak: Optional[int]
+) -> ReviewState:
+    """未保存のモデルなど値が欠けている場合は初期状態として扱う"""
+    return ReviewState(
+        ease_factor=INITIAL_EASE_FACTOR if ease_factor is None else ease_factor,
+        stability=stability or 0.0,
+        review_streak=review_streak or 0,
+    )
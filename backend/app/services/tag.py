@@ -0,0 +1,101 @@
+"""
+問題数つきのタグ一覧
+
+タグごとの問題数と難易度別の内訳は problem_tags を1回の集計クエリで数える
+（タグごとに問題を数え直さない）。結果は並び順ごとにワーカー内でキャッシュし、
+共有カタログが有効なら作り直しにもホスト内のスナップショットを使う。
+タグ・問題の変更は ``app.services.invalidation`` の通知で破棄する。
+
+一覧はレプリカから読むため、読み込み中に無効化が届いた場合と、無効化から
+レプリカの許容遅延 (``DB_REPLICA_MAX_LAG_SECONDS``) が過ぎるまでの間は、
+変更前の一覧かもしれないのでキャッシュしない。
+"""
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.problem import Problem, ProblemTag, Tag
+from app.services.catalog import catalog
+from app.services.invalidation import invalidation_bus
+
+# 並び順: 名前順、問題数の多い順
+TAG_SORTS = ("name", "popularity")
+
+tag_cache = TTLCache(maxsize=len(TAG_SORTS), ttl=settings.TAG_LIST_CACHE_TTL_SECONDS)
+
+# 無効化の回数と最後の時刻 (time.monotonic)
+_generation = 0
+_invalidated_at = -float("inf")
+
+
+def load_tag_summaries(db: Session) -> List[Dict]:
+    """全タグを問題数と難易度別の内訳つきで返す (JSON にできる形)"""
+    rows = (
+        db.query(
+            Tag.id, Tag.name, Tag.description, Tag.created_by,
+            Problem.difficulty, func.count(ProblemTag.problem_id),
+        )
+        .outerjoin(ProblemTag, ProblemTag.tag_id == Tag.id)
+        .outerjoin(Problem, Problem.id == ProblemTag.problem_id)
+        .group_by(Tag.id, Tag.name, Tag.description, Tag.created_by, Problem.difficulty)
+        .all()
+    )
+    tags: Dict[str, Dict] = {}
+    for tag_id, name, description, created_by, difficulty, count in rows:
+        tag = tags.setdefault(str(tag_id), {
+            "id": str(tag_id),
+            "name": name,
+            "description": description,
+            "created_by": str(created_by),
+            "problem_count": 0,
+            "by_difficulty": {},
+        })
+        tag["problem_count"] += count
+        if difficulty is not None and count:
+            tag["by_difficulty"][str(difficulty)] = count
+    for tag in tags.values():
+        tag["by_difficulty"] = dict(sorted(tag["by_difficulty"].items(), key=lambda item: int(item[0])))
+    return list(tags.values())
+
+
+def sort_tags(tags: List[Dict], sort: str) -> List[Dict]:
+    if sort == "popularity":
+        return sorted(tags, key=lambda tag: (-tag["problem_count"], tag["name"]))
+    return sorted(tags, key=lambda tag: tag["name"])
+
+
+def cached_tags(sort: str) -> Optional[List[Dict]]:
+    """データベースを読まずに返せる並べ替え済みのタグ一覧 (なければ None)"""
+    tags = tag_cache.get(sort)
+    if tags is None:
+        summaries = catalog.tags()
+        if summaries is not None:
+            tags = sort_tags(summaries, sort)
+            tag_cache.set(sort, tags)
+    return tags
+
+
+def load_tags(db: Session, sort: str) -> List[Dict]:
+    """並べ替え済みのタグ一覧をデータベースから読み、キャッシュする"""
+    generation = _generation
+    tags = sort_tags(load_tag_summaries(db), sort)
+    lag = settings.DB_REPLICA_MAX_LAG_SECONDS if settings.DATABASE_REPLICA_URLS else 0
+    if generation == _generation and time.monotonic() - _invalidated_at >= lag:
+        tag_cache.set(sort, tags)
+    return tags
+
+
+def _invalidate_tags(keys=None) -> None:
+    # 問題の追加・削除・難易度の変更でも件数が変わるので一覧ごと破棄する
+    global _generation, _invalidated_at
+    _generation += 1
+    _invalidated_at = time.monotonic()
+    tag_cache.clear()
+
+
+invalidation_bus.subscribe("tag", _invalidate_tags, _invalidate_tags)
+invalidation_bus.subscribe("problem", _invalidate_tags, _invalidate_tags)
@@ -0,0 +1,174 @@
+"""
+リフレッシュトークンのローテーションとトークンの失効
+
+ログインごとにリフレッシュトークンの系列（family）を作り、リフレッシュの
+たびに使用済みにして同じ系列の新しいトークンを発行する。使用済みの
+トークンが再び提示された場合は漏えいとみなし、系列ごと失効させる。
+アクセストークンには jti と系列IDを含め、失効は revoked_tokens と
+各ワーカーのブルームフィルタ（``revocation_list``）に登録する。
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from uuid import UUID
+
+from jose import JWTError, jwt
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.tracing import traced
+from app.models.token import RefreshToken, RevokedToken
+from app.models.user import User
+from app.services.auth import create_access_token, decode_token, revocation_list
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidRefreshToken(ValueError):
+    """期限切れ・失効済み・再利用されたリフレッシュトークン"""
+
+
+def _refresh_expires_at(now: datetime) -> datetime:
+    return now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+def _issue_tokens(db: Session, user: User, family_id: UUID, now: datetime) -> Dict[str, str]:
+    refresh = RefreshToken(
+        id=uuid.uuid4(),
+        user_id=user.id,
+        family_id=family_id,
+        expires_at=_refresh_expires_at(now),
+    )
+    db.add(refresh)
+
+    access_token = create_access_token(
+        data={"sub": str(user.id), "role": user.role, "fam": str(family_id)},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    refresh_token = jwt.encode(
+        {
+            "sub": str(user.id),
+            "typ": "refresh",
+            "jti": str(refresh.id),
+            "fam": str(family_id),
+            "exp": refresh.expires_at,
+        },
+        settings.SECRET_KEY,
+        algorithm="HS256",
+    )
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@traced
+def issue_tokens(db: Session, user: User) -> Dict[str, str]:
+    """ログイン時に新しい系列のアクセストークンとリフレッシュトークンを発行する"""
+    tokens = _issue_tokens(db, user, uuid.uuid4(), datetime.utcnow())
+    db.commit()
+    return tokens
+
+
+@traced
+def revoke_token(
+    db: Session,
+    jti: UUID,
+    expires_at: datetime,
+    user_id: Optional[UUID] = None
+) -> None:
+    """トークンID（または系列ID）を失効させる。コミットは行わない"""
+    exists = db.query(RevokedToken.id).filter(RevokedToken.jti == jti).first()
+    if exists is None:
+        db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+    revocation_list.add(jti)
+
+
+@traced
+def revoke_family(db: Session, family_id: UUID, user_id: Optional[UUID] = None) -> None:
+    """系列のリフレッシュトークンと、系列から発行したアクセストークンを失効させる"""
+    now = datetime.utcnow()
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None),
+    ).update({"revoked_at": now}, synchronize_session=False)
+    # 系列IDを失効させれば、その系列のアクセストークンはすべて拒否される
+    revoke_token(db, family_id, _refresh_expires_at(now), user_id)
+
+
+@traced
+def rotate_refresh_token(db: Session, refresh_token: str) -> Dict[str, str]:
+    """リフレッシュトークンを使用済みにし、同じ系列の新しいトークンを発行する"""
+    try:
+        payload = decode_token(refresh_token)
+        if payload.get("typ") != "refresh":
+            raise InvalidRefreshToken("Invalid refresh token")
+        jti = UUID(payload["jti"])
+    except (JWTError, KeyError, ValueError):
+        raise InvalidRefreshToken("Invalid refresh token")
+
+    now = datetime.utcnow()
+    # 同じトークンでの並行したリフレッシュを直列化する
+    row = db.query(RefreshToken).filter(RefreshToken.id == jti).with_for_update().first()
+    if row is None or row.revoked_at is not None or row.expires_at <= now:
+        raise InvalidRefreshToken("Invalid refresh token")
+    if row.used_at is not None:
+        # 使用済みのトークンの再提示は漏えいとみなし、系列ごと失効させる
+        revoke_family(db, row.family_id, row.user_id)
+        db.commit()
+        logger.warning("Refresh token reuse detected for user %s", row.user_id)
+        raise InvalidRefreshToken("Refresh token reuse detected")
+
+    user = db.query(User).filter(User.id == row.user_id).first()
+    if user is None:
+        raise InvalidRefreshToken("Invalid refresh token")
+
+    row.used_at = now
+    tokens = _issue_tokens(db, user, row.family_id, now)
+    db.commit()
+    return tokens
+
+
+@traced
+def logout(db: Session, access_payload: dict) -> None:
+    """アクセストークンとそのログインの系列を失効させる"""
+    user_id = UUID(access_payload["sub"])
+    expires_at = datetime.utcfromtimestamp(access_payload["exp"])
+    if access_payload.get("jti"):
+        revoke_token(db, UUID(access_payload["jti"]), expires_at, user_id)
+    if access_payload.get("fam"):
+        revoke_family(db, UUID(access_payload["fam"]), user_id)
+    db.commit()
+
+
+@traced
+def purge_expired_tokens(db: Session) -> int:
+    """有効期限を過ぎたリフレッシュトークンと失効記録を削除し、削除件数を返す"""
+    now = datetime.utcnow()
+    deleted = db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now)).rowcount
+    deleted += db.execute(delete(RefreshToken).where(RefreshToken.expires_at <= now)).rowcount
+    db.commit()
+    return deleted
+
+
+async def run_revocation_sync() -> None:
+    """他のワーカーでの失効を取り込み、期限切れの記録を掃除するバックグラウンドタスク"""
+    from starlette.concurrency import run_in_threadpool
+
+    from app.db.base import SessionLocal
+
+    def sync() -> int:
+        db = SessionLocal()
+        try:
+            if revocation_list.is_stale:
+                purge_expired_tokens(db)
+            return revocation_list.sync(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            await run_in_threadpool(sync)
+        except Exception:
+            logger.exception("Token revocation sync failed")
+        await asyncio.sleep(settings.TOKEN_REVOCATION_SYNC_SECONDS)
@@ -3,27 +3,34 @@ from uuid import UUID
 
 from sqlalchemy.orm import Session
 
+from app.core.tracing import traced
 from app.models.user import User, UserProfile
 from app.schemas.user import UserCreate, UserUpdate
 from app.services.auth import get_password_hash
+from app.services.invalidation import notify
 
 
+@traced
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
 
+@traced
 def get_user_by_id(db: Session, user_id: UUID) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
 
+@traced
 def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
     return db.query(User).offset(skip).limit(limit).all()
 
 
-def create_user(db: Session, user_create: UserCreate) -> User:
+@traced
+def create_user(db: Session, user_create: UserCreate, password_hash: Optional[str] = None) -> User:
+    """ユーザーを作成する。計算済みのパスワードハッシュがあれば渡す"""
     db_user = User(
         email=user_create.email,
-        password_hash=get_password_hash(user_create.password),
+        password_hash=password_hash or get_password_hash(user_create.password),
         first_name=user_create.first_name,
         last_name=user_create.last_name,
         role=user_create.role,
@@ -36,23 +43,33 @@ def create_user(db: Session, user_create: UserCreate) -> User:
     return db_user
 
 
-def update_user(db: Session, user: User, user_update: UserUpdate) -> User:
+@traced
+def update_user(
+    db: Session,
+    user: User,
+    user_update: UserUpdate,
+    password_hash: Optional[str] = None
+) -> User:
+    """ユーザーを更新する。計算済みのパスワードハッシュがあれば渡す"""
     update_data = user_update.dict(exclude_unset=True)
     
     if update_data.get("password"):
-        update_data["password_hash"] = get_password_hash(update_data["password"])
+        update_data["password_hash"] = password_hash or get_password_hash(update_data["password"])
         del update_data["password"]
     
     for key, value in update_data.items():
         setattr(user, key, value)
     
     db.add(user)
+    notify(db, "user", user.id)
     db.commit()
     db.refresh(user)
     return user
 
 
+@traced
 def delete_user(db: Session, user: User) -> bool:
     db.delete(user)
+    notify(db, "user", user.id)
     db.commit()
     return True
\ No newline at end of file
@@ -1,32 +1,90 @@
+import base64
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.models.problem import Problem, Choice
+from app.core.tracing import traced
+from app.models.problem import Problem, Choice, ProblemTag, Tag
 from app.models.user import User
 from app.models.user_progress import UserAnswer, UserProgress
+from app.schemas.user_progress import UserAnswerResponse
+from app.services.idempotency import (
+    IdempotencyKeyConflict,
+    is_key_conflict,
+    remember_response,
+    request_fingerprint,
+)
+from app.services.catalog import catalog
+from app.services.rating import update_ratings
+from app.services.spaced_repetition import quality_from_answer, review_state_of, schedule_review
 
 
+def apply_answer_to_progress(
+    progress: UserProgress,
+    is_correct: bool,
+    answered_at: datetime
+) -> UserProgress:
+    """1回分の回答結果を進捗に反映する"""
+    if not progress.attempts:
+        # 初回の場合は回答結果をそのまま習熟度とする
+        progress.attempts = 1
+        progress.mastery_level = 1.0 if is_correct else 0.0
+    else:
+        progress.attempts += 1
+        
+        # 習熟度の計算 (簡易版)
+        if is_correct:
+            # 正解の場合は習熟度を上げる (最大1.0)
+            progress.mastery_level = min(1.0, progress.mastery_level + 0.2)
+        else:
+            # 不正解の場合は習熟度を下げる (最小0.0)
+            progress.mastery_level = max(0.0, progress.mastery_level - 0.1)
+    
+    progress.last_attempt_at = answered_at
+    
+    # 次回の復習日時の計算
+    state = review_state_of(progress.ease_factor, progress.stability, progress.review_streak)
+    state, progress.due_at = schedule_review(state, quality_from_answer(is_correct), answered_at)
+    progress.ease_factor = state.ease_factor
+    progress.stability = state.stability
+    progress.review_streak = state.review_streak
+    return progress
+
+
+@traced
 def submit_answer(
     db: Session, 
     user: User, 
     problem_id: UUID, 
-    choice_id: UUID
+    choice_id: UUID,
+    idempotency_key: Optional[str] = None
 ) -> UserAnswer:
-    # 選択肢の取得
-    choice = db.query(Choice).filter(Choice.id == choice_id).first()
-    if not choice or choice.problem_id != problem_id:
+    """回答を記録して進捗とレーティングを更新する
+
+    ``idempotency_key`` を指定すると、その結果を回答と同じトランザクションで
+    記録する。同じキーのリクエストが並行して先に確定していた場合は
+    ``IdempotencyKeyConflict`` を送出し、何も書き込まない。ほかの一意制約違反は
+    そのまま送出する。
+    """
+    # 選択肢の正誤 (共有カタログになければデータベースから取得)
+    graded = catalog.grade_choice(choice_id)
+    if graded is None:
+        choice = db.query(Choice).filter(Choice.id == choice_id).first()
+        graded = (choice.problem_id, choice.is_correct) if choice else None
+    if graded is None or graded[0] != problem_id:
         raise ValueError("Invalid choice for this problem")
+    is_correct = graded[1]
     
     # 回答の記録
     user_answer = UserAnswer(
         user_id=user.id,
         problem_id=problem_id,
         selected_choice=choice_id,
-        is_correct=choice.is_correct,
+        is_correct=is_correct,
     )
     db.add(user_answer)
     
@@ -37,35 +95,32 @@ def submit_answer(
     ).first()
     
     if not progress:
-        # 初回の場合は新規作成
-        progress = UserProgress(
-            user_id=user.id,
-            problem_id=problem_id,
-            attempts=1,
-            last_attempt_at=datetime.utcnow(),
-            mastery_level=1.0 if choice.is_correct else 0.0,
+        progress = UserProgress(user_id=user.id, problem_id=problem_id, attempts=0)
+    apply_answer_to_progress(progress, is_correct, datetime.utcnow())
+    db.add(progress)
+    
+    # 学習者と問題のレーティングの更新
+    update_ratings(db, user.id, [(problem_id, is_correct)])
+    
+    if idempotency_key:
+        db.flush()
+        response = UserAnswerResponse.model_validate(user_answer).model_dump(mode="json")
+        remember_response(
+            db, user.id, idempotency_key, request_fingerprint(problem_id, choice_id), response
         )
-        db.add(progress)
-    else:
-        # 既存の場合は更新
-        progress.attempts += 1
-        progress.last_attempt_at = datetime.utcnow()
-        
-        # 習熟度の計算 (簡易版)
-        if choice.is_correct:
-            # 正解の場合は習熟度を上げる (最大1.0)
-            progress.mastery_level = min(1.0, progress.mastery_level + 0.2)
-        else:
-            # 不正解の場合は習熟度を下げる (最小0.0)
-            progress.mastery_level = max(0.0, progress.mastery_level - 0.1)
-        
-        db.add(progress)
     
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if idempotency_key and is_key_conflict(e):
+            raise IdempotencyKeyConflict("Request with this Idempotency-Key was already processed")
+        raise
     db.refresh(user_answer)
     return user_answer
 
 
+@traced
 def get_user_progress(
     db: Session, 
     user: User, 
@@ -79,20 +134,87 @@ def get_user_progress(
     return query.all()
 
 
+@traced
+def get_review_queue(
+    db: Session, 
+    user: User, 
+    limit: int = 20,
+    now: Optional[datetime] = None
+) -> List[UserProgress]:
+    """復習期限を迎えた問題を期限の古い順に取得する
+
+    (user_id, due_at) インデックスの範囲スキャンで先頭 ``limit`` 件だけを読む。
+    """
+    now = now or datetime.utcnow()
+    return (
+        db.query(UserProgress)
+        .filter(UserProgress.user_id == user.id, UserProgress.due_at <= now)
+        .order_by(UserProgress.due_at)
+        .limit(limit)
+        .all()
+    )
+
+
+def encode_answer_cursor(answer: UserAnswer) -> str:
+    """回答履歴の次ページを指すカーソル（最後の回答の日時とID）"""
+    raw = f"{answer.created_at.isoformat()}|{answer.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_answer_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, answer_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(answer_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+@traced
 def get_user_answers(
     db: Session, 
     user: User, 
     problem_id: Optional[UUID] = None,
-    limit: int = 10
+    limit: int = 10,
+    before: Optional[str] = None,
+    tag: Optional[str] = None,
+    is_correct: Optional[bool] = None
 ) -> List[UserAnswer]:
+    """回答履歴を新しい順に取得する
+
+    ``before`` には前のページの末尾を指すカーソルを渡す。(created_at, id) の
+    キーセットで絞り込むため、ページの深さに関わらず
+    idx_user_answer_user_created の範囲走査だけで済む。
+    """
     query = db.query(UserAnswer).filter(UserAnswer.user_id == user.id)
     
     if problem_id:
         query = query.filter(UserAnswer.problem_id == problem_id)
+    if is_correct is not None:
+        query = query.filter(UserAnswer.is_correct == is_correct)
+    if tag:
+        tagged = (
+            db.query(ProblemTag.problem_id)
+            .join(Tag, Tag.id == ProblemTag.tag_id)
+            .filter(Tag.name == tag)
+        )
+        query = query.filter(UserAnswer.problem_id.in_(tagged))
+    if before:
+        created_at, answer_id = decode_answer_cursor(before)
+        query = query.filter(
+            # 単独の created_at 条件はパーティションの刈り込みに使われる
+            UserAnswer.created_at <= created_at,
+            tuple_(UserAnswer.created_at, UserAnswer.id) < (created_at, answer_id),
+        )
     
-    return query.order_by(UserAnswer.created_at.desc()).limit(limit).all()
+    return (
+        query.order_by(UserAnswer.created_at.desc(), UserAnswer.id.desc())
+        .limit(limit)
+        .all()
+    )
 
 
+@traced
 def get_user_stats(db: Session, user: User) -> Dict:
     # 合計問題数
     total_problems = db.query(func.count(Problem.id)).scalar()
@@ -0,0 +1,69 @@
+"""
+Benchmark adaptive next-problem selection.
+
+Builds an in-memory rating index for a synthetic problem bank (no database
+needed) and measures the latency of RatingIndex.select with a realistic
+set of recently seen problems excluded.
+
+Usage:
+    python benchmarks/bench_adaptive_selection.py [--problems 100000] [--tags 20]
+"""
+
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from app.services.rating import RatingIndex, target_problem_rating
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--problems", type=int, default=100_000)
+    parser.add_argument("--tags", type=int, default=20)
+    parser.add_argument("--recent", type=int, default=200, help="recently seen problems to exclude")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    problem_ids = [uuid.UUID(int=int(i) + 1) for i in range(args.problems)]
+    ratings = rng.normal(1500, 250, size=args.problems)
+    # 各問題に1〜2個のタグを付与し、1タグ目は全問題が共有する（最大バンク）
+    rows = [("all", pid, r) for pid, r in zip(problem_ids, ratings)]
+    tag_of = rng.integers(1, args.tags, size=args.problems)
+    rows += [(f"tag-{t}", pid, r) for pid, r, t in zip(problem_ids, ratings, tag_of)]
+
+    index = RatingIndex()
+    start = time.perf_counter()
+    index.load(rows)
+    print(f"index build: {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"for {len(rows)} (tag, problem) pairs")
+
+    timings = np.empty(args.iterations)
+    for i in range(args.iterations):
+        user_rating = rng.normal(1500, 300)
+        recent = [problem_ids[j] for j in rng.integers(0, args.problems, size=args.recent)]
+        tag = "all" if i % 2 == 0 else f"tag-{1 + i % (args.tags - 1)}"
+
+        start = time.perf_counter()
+        index.select(tag, target_problem_rating(user_rating, 0.7), exclude=recent)
+        timings[i] = time.perf_counter() - start
+
+        # 回答によるオンライン更新も混ぜる
+        index.update_rating(problem_ids[i % args.problems], float(rng.normal(1500, 250)))
+
+    p50, p95, p99 = np.percentile(timings * 1000, [50, 95, 99])
+    print(f"select over {args.iterations} iterations: "
+          f"p50={p50:.3f} ms  p95={p95:.3f} ms  p99={p99:.3f} ms  max={timings.max() * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
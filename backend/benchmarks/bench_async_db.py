@@ -0,0 +1,101 @@
+"""
+Benchmark request throughput of the sync and async database stacks.
+
+Simulates I/O-bound requests that each hold a session for one query of a
+fixed latency (``SELECT pg_sleep``). The sync stack runs them on a thread
+pool the size of Starlette's default (40 threads), as FastAPI does for
+``def`` endpoints; the async stack runs them as coroutines on one event
+loop with AsyncSession. Both use a connection pool of the same size.
+
+Requires PostgreSQL (DATABASE_URL).
+
+Usage:
+    python benchmarks/bench_async_db.py [--requests 400] [--concurrency 10 50 200]
+                                        [--latency 0.02] [--pool-size 100] [--threads 40]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base import async_database_url
+
+QUERY = text("SELECT pg_sleep(:latency)")
+
+
+def run_sync(requests: int, concurrency: int, threads: int, latency: float, pool_size: int) -> float:
+    engine = create_engine(settings.DATABASE_URL, pool_size=pool_size, max_overflow=0)
+    Session = sessionmaker(bind=engine)
+
+    def handle(_):
+        with Session() as db:
+            db.execute(QUERY, {"latency": latency})
+
+    # Concurrency is capped by the request thread pool
+    with ThreadPoolExecutor(max_workers=min(concurrency, threads)) as pool:
+        list(pool.map(handle, range(pool_size)))  # warm up the connection pool
+        start = time.perf_counter()
+        list(pool.map(handle, range(requests)))
+        elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+
+async def run_async(requests: int, concurrency: int, latency: float, pool_size: int) -> float:
+    engine = create_async_engine(
+        async_database_url(settings.DATABASE_URL), pool_size=pool_size, max_overflow=0
+    )
+    Session = async_sessionmaker(engine)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def handle():
+        async with limit, Session() as db:
+            await db.execute(QUERY, {"latency": latency})
+
+    await asyncio.gather(*(handle() for _ in range(pool_size)))  # warm up the connection pool
+    start = time.perf_counter()
+    await asyncio.gather(*(handle() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--latency", type=float, default=0.02, help="query latency in seconds")
+    parser.add_argument("--pool-size", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=40, help="sync request threads")
+    args = parser.parse_args()
+
+    if not settings.DATABASE_URL.startswith("postgresql"):
+        parser.error("this benchmark requires a PostgreSQL DATABASE_URL")
+
+    print(
+        f"{args.requests} requests, query latency {args.latency * 1000:.0f} ms, "
+        f"pool size {args.pool_size}, {args.threads} sync threads"
+    )
+    print(f"{'concurrency':>11} {'sync req/s':>11} {'async req/s':>12} {'speedup':>8}")
+    for concurrency in args.concurrency:
+        sync_elapsed = run_sync(args.requests, concurrency, args.threads, args.latency, args.pool_size)
+        async_elapsed = asyncio.run(run_async(args.requests, concurrency, args.latency, args.pool_size))
+        sync_rps = args.requests / sync_elapsed
+        async_rps = args.requests / async_elapsed
+        print(f"{concurrency:>11} {sync_rps:>11.1f} {async_rps:>12.1f} {async_rps / sync_rps:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
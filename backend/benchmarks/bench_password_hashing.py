@@ -0,0 +1,76 @@
+"""
+Benchmark password verification throughput (logins per second).
+
+Runs bcrypt verification inline on a single thread and through the
+PasswordHasher process pool with an increasing number of workers, and
+reports logins per second overall and per core.
+
+Usage:
+    python benchmarks/bench_password_hashing.py [--rounds 12] [--workers 1 2 4] [--logins 64]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from app.core.hashing import PasswordHasher, PasswordHasherBusy
+
+
+def run(hasher: PasswordHasher, hashed: str, logins: int, clients: int) -> tuple:
+    """Verify ``logins`` passwords from ``clients`` concurrent request threads."""
+    rejected = 0
+
+    def login(_):
+        nonlocal rejected
+        try:
+            hasher.verify("correct horse battery staple", hashed)
+        except PasswordHasherBusy:
+            rejected += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(login, range(logins)))
+    return time.perf_counter() - start, rejected
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent request threads")
+    args = parser.parse_args()
+
+    print(f"bcrypt rounds={args.rounds}, {os.cpu_count()} CPUs available")
+    hashed = PasswordHasher(workers=0, max_pending=1, rounds=args.rounds).hash("correct horse battery staple")
+
+    inline = PasswordHasher(workers=0, max_pending=args.logins, rounds=args.rounds)
+    elapsed, _ = run(inline, hashed, args.logins, 1)
+    print(f"inline     : {args.logins / elapsed:7.1f} logins/s")
+
+    for workers in args.workers:
+        cores = min(workers, os.cpu_count() or 1)
+        hasher = PasswordHasher(workers=workers, max_pending=args.logins, rounds=args.rounds)
+        hasher.verify("warm up", hashed)
+        elapsed, _ = run(hasher, hashed, args.logins, args.clients)
+        rate = args.logins / elapsed
+        print(f"pool x{workers:<3}  : {rate:7.1f} logins/s  ({rate / cores:.1f} per core)")
+        hasher.shutdown()
+
+        # 待ち行列をワーカー数に絞り、過負荷時に待たせず拒否されることを確認する
+        bounded = PasswordHasher(workers=workers, max_pending=workers, rounds=args.rounds)
+        bounded.verify("warm up", hashed)
+        elapsed, rejected = run(bounded, hashed, args.logins, args.clients)
+        print(f"  max_pending={workers:<3}: {rejected}/{args.logins} rejected with 503, "
+              f"{(args.logins - rejected) / elapsed:.1f} logins/s served")
+        bounded.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark the per-request overhead of the rate limiting middleware.
+
+Calls a bare ASGI app directly (no server, no network) with and without
+RateLimitMiddleware in front of it and reports the added time per request
+for anonymous requests, authenticated requests (cached token subject) and
+requests on routes without a rule.
+
+Usage:
+    python benchmarks/bench_rate_limit.py [--requests 100000] [--redis-url redis://localhost:6379/0]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from app.core.rate_limit import (
+    MemoryBucketStore,
+    RateLimiter,
+    RateLimitMiddleware,
+    RateLimitRule,
+    RedisBucketStore,
+)
+from app.services.auth import create_access_token
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def measure(app, scope, requests: int) -> float:
+    """Return seconds per request."""
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def scope_for(path: str, client_ip: str, token: str = None) -> dict:
+    headers = [(b"host", b"localhost"), (b"user-agent", b"bench")]
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": headers,
+        "client": (client_ip, 50000),
+    }
+
+
+async def run(args) -> None:
+    # Buckets large enough that no request is rejected during the run
+    rules = [
+        RateLimitRule.parse("GET /api/v1/problems", f"{args.requests * 10}/1"),
+        RateLimitRule.parse("POST /api/v1/progress/submit", "30/60"),
+        RateLimitRule.parse("* /api/v1/admin/*", "10/60"),
+    ]
+    store = MemoryBucketStore()
+    if args.redis_url:
+        store = RedisBucketStore(args.redis_url, fallback=store)
+    limited = RateLimitMiddleware(endpoint, RateLimiter(rules, store))
+    token = create_access_token({"sub": "123e4567-e89b-12d3-a456-426614174000", "role": "student"})
+
+    cases = [
+        ("anonymous", scope_for("/api/v1/problems", "10.0.0.1")),
+        ("authenticated", scope_for("/api/v1/problems", "10.0.0.1", token)),
+        ("no matching rule", scope_for("/api/v1/tags", "10.0.0.1", token)),
+    ]
+    baseline = await measure(endpoint, cases[0][1], args.requests)
+    print(f"store: {type(store).__name__}, {args.requests} requests per case")
+    print(f"{'case':<18} {'us/request':>11} {'overhead us':>12}")
+    print(f"{'no middleware':<18} {baseline * 1e6:>11.2f} {0:>12.2f}")
+    for name, scope in cases:
+        per_request = await measure(limited, scope, args.requests)
+        print(f"{name:<18} {per_request * 1e6:>11.2f} {(per_request - baseline) * 1e6:>12.2f}")
+    if args.redis_url:
+        await store.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--redis-url", default=None, help="measure the shared Redis store instead")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark response serialization and compression for read_problems.
+
+Builds the ProblemList that ``GET /api/v1/problems?limit=N`` returns (either
+synthetic problems with LaTeX statements and choices, or the first N problems
+from DATABASE_URL with --from-db), then measures:
+
+- serialization time of the stdlib-json JSONResponse and ORJSONResponse, from
+  the dumped response model to the body bytes (what FastAPI does after
+  validating the response model);
+- bytes on the wire and compression time for gzip and brotli at the levels
+  CompressionMiddleware can be configured with.
+
+The tree has no export endpoints, so only the problem list is measured.
+
+Usage:
+    python benchmarks/bench_responses.py [--limit 100] [--repeat 200] [--from-db]
+"""
+
+import argparse
+import gzip
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.core import compression
+from app.schemas.problem import ChoiceResponse, ProblemList, ProblemResponse
+
+STATEMENT = (
+    "次の定積分を求めよ。\n"
+    "$$\\int_0^{\\pi} \\frac{x \\sin x}{1 + \\cos^2 x} \\, dx$$\n"
+    "ただし、置換 $x = \\pi - t$ を用いてよい。また、"
+    "$\\displaystyle \\lim_{n \\to \\infty} \\sum_{k=1}^{n} \\frac{1}{n} f\\left(\\frac{k}{n}\\right)"
+    " = \\int_0^1 f(x) \\, dx$ を利用してもよい。"
+)
+
+
+def synthetic_problems(limit: int) -> ProblemList:
+    items = []
+    for i in range(limit):
+        problem_id = uuid.uuid4()
+        items.append(ProblemResponse(
+            id=problem_id,
+            title=f"定積分の計算 {i}",
+            description="置換積分と対称性を用いる問題",
+            problem_text=STATEMENT * 2,
+            difficulty=i % 5 + 1,
+            created_by=uuid.uuid4(),
+            created_at=datetime.utcnow().isoformat(),
+            choices=[
+                ChoiceResponse(
+                    id=uuid.uuid4(),
+                    problem_id=problem_id,
+                    text=f"\\frac{{\\pi^{k}}}{{{k + 3}}}",
+                    is_correct=k == 2,
+                )
+                for k in range(4)
+            ],
+            tags=["微分積分学", "定積分", "置換積分"],
+        ))
+    return ProblemList(items=items, total=limit * 10)
+
+
+def problems_from_db(limit: int) -> ProblemList:
+    from app.api.v1.endpoints.problems import _to_problem_response
+    from app.db.base import SessionLocal
+    from app.services.problem import get_problems
+
+    with SessionLocal() as db:
+        problems, total = get_problems(db, skip=0, limit=limit)
+        return ProblemList(items=[_to_problem_response(p) for p in problems], total=total)
+
+
+def measure(fn, repeat: int) -> float:
+    """Return the best seconds per call over ``repeat`` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=100, help="problems per page")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--from-db", action="store_true", help="load problems from DATABASE_URL")
+    args = parser.parse_args()
+
+    problem_list = problems_from_db(args.limit) if args.from_db else synthetic_problems(args.limit)
+    content = problem_list.model_dump(mode="json")
+    print(f"ProblemList with {len(problem_list.items)} problems")
+
+    print(f"\n{'serializer':<14} {'ms':>8} {'bytes':>9}")
+    body = None
+    for name, response_class in (("json", JSONResponse), ("orjson", ORJSONResponse)):
+        seconds = measure(lambda: response_class(content), args.repeat)
+        body = response_class(content).body
+        print(f"{name:<14} {seconds * 1000:>8.3f} {len(body):>9}")
+
+    encoders = [("identity", lambda data: data)]
+    for level in (1, 6, 9):
+        encoders.append((f"gzip-{level}", lambda data, level=level: gzip.compress(data, level)))
+    if compression.brotli is not None:
+        for quality in (1, 4, 11):
+            encoders.append((
+                f"br-{quality}",
+                lambda data, quality=quality: compression.brotli.compress(data, quality=quality),
+            ))
+    else:
+        print("\n(brotli is not installed; skipping br)")
+
+    print(f"\n{'encoding':<14} {'ms':>8} {'bytes':>9} {'ratio':>7}")
+    for name, encode in encoders:
+        # brotli at quality 11 is far too slow to repeat as often as the others
+        repeat = max(1, args.repeat // 20) if name == "br-11" else args.repeat
+        seconds = measure(lambda: encode(body), repeat)
+        size = len(encode(body))
+        print(f"{name:<14} {seconds * 1000:>8.3f} {size:>9} {size / len(body):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark worker startup and the first requests after it.
+
+Each run starts a fresh interpreter, as a new worker would, and measures:
+
+- import time of ``app.main`` and building the app (settings, engines,
+  models, routers);
+- lifespan startup time, with and without warm-up (WARMUP_ENABLED);
+- latency of the first few requests to ``GET /api/v1/problems`` and
+  ``GET /api/v1/progress/stats``, sent in-process through the ASGI app.
+
+A cold worker pays for mapper configuration, the first pool connections and
+filling caches inside its first requests; a warmed worker pays for them before
+``/health/ready`` reports ready. Needs DATABASE_URL with at least one student
+and one teacher (``python benchmarks/dataset.py`` creates them).
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 3] [--requests 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parent.parent
+
+WORKER = r"""
+import asyncio, json, sys, time
+start = time.perf_counter()
+import app.main
+application = app.main.app
+imported = time.perf_counter() - start
+
+import httpx
+from app.db.base import SessionLocal
+from app.models.user import User
+from app.services.auth import create_access_token
+
+def token_for(role):
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.role == role).first()
+        return create_access_token({"sub": str(user.id), "role": role})
+    finally:
+        db.close()
+
+async def main():
+    # Tokens are made before startup so the lookup does not warm the app
+    headers = {role: {"Authorization": "Bearer " + token_for(role)} for role in ("teacher", "student")}
+    async with application.router.lifespan_context(application):
+        ready = time.perf_counter() - start
+        transport = httpx.ASGITransport(app=application)
+        latencies = {"problems": [], "stats": []}
+        async with httpx.AsyncClient(transport=transport, base_url="http://worker") as client:
+            for _ in range(REQUESTS):
+                for name, path, role in (
+                    ("problems", "/api/v1/problems?limit=20", "teacher"),
+                    ("stats", "/api/v1/progress/stats", "student"),
+                ):
+                    t = time.perf_counter()
+                    response = await client.get(path, headers=headers[role])
+                    response.raise_for_status()
+                    latencies[name].append(time.perf_counter() - t)
+    print(json.dumps({"import": imported, "ready": ready, "latencies": latencies}))
+
+asyncio.run(main())
+"""
+
+
+def run_worker(warm_up: bool, requests: int) -> dict:
+    env = {**os.environ, "WARMUP_ENABLED": str(warm_up), "RATE_LIMIT_ENABLED": "False"}
+    output = subprocess.run(
+        [sys.executable, "-c", WORKER.replace("REQUESTS", str(requests))],
+        cwd=backend_dir, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh workers per configuration")
+    parser.add_argument("--requests", type=int, default=5, help="requests per endpoint per worker")
+    args = parser.parse_args()
+
+    print(f"{'worker':<8} {'import ms':>10} {'ready ms':>10} {'endpoint':<10} "
+          f"{'1st ms':>8} {'2nd ms':>8} {'rest ms':>8}")
+    for warm_up in (False, True):
+        results = [run_worker(warm_up, args.requests) for _ in range(args.runs)]
+        name = "warm" if warm_up else "cold"
+        imported = statistics.median(r["import"] for r in results) * 1000
+        ready = statistics.median(r["ready"] for r in results) * 1000
+        for endpoint in ("problems", "stats"):
+            first = statistics.median(r["latencies"][endpoint][0] for r in results) * 1000
+            second = statistics.median(r["latencies"][endpoint][1] for r in results) * 1000
+            rest = statistics.median(x for r in results for x in r["latencies"][endpoint][2:]) * 1000
+            print(f"{name:<8} {imported:>10.1f} {ready:>10.1f} {endpoint:<10} "
+                  f"{first:>8.1f} {second:>8.1f} {rest:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
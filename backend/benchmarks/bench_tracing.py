@@ -0,0 +1,172 @@
+"""
+Benchmark the overhead of tracing.
+
+Measures, with tracing sampled out (the default for almost every request) and
+with every request sampled:
+
+- a call to a ``@traced`` function against the undecorated function;
+- a SQL statement on an in-memory SQLite engine, with and without the
+  tracing event listeners registered;
+- a request driven straight through the ASGI app (no server or HTTP client, so
+  the middleware is not lost in their noise) to an endpoint that calls a traced
+  service and runs a query, with and without TracingMiddleware.
+
+Spans go to an exporter that discards them, so export cost is not included
+(exports happen on a background thread in production).
+
+Usage:
+    python benchmarks/bench_tracing.py [--repeat 5] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import timeit
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+
+from app.core import tracing
+from app.core.tracing import BatchSpanProcessor, Span, Tracer, TracingMiddleware, traced
+
+QUERY_LISTENERS = (
+    ("before_cursor_execute", tracing._start_query_span),
+    ("after_cursor_execute", tracing._end_query_span),
+    ("handle_error", tracing._fail_query_span),
+)
+
+
+class NullExporter:
+    def export(self, spans):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+def best(fn, number: int, repeat: int) -> float:
+    """Return the best microseconds per call."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def sampled_root():
+    """Make the current context look like a sampled request."""
+    return tracing._current_span.set(Span(name="bench", trace_id="a" * 32))
+
+
+def bench_function(repeat: int) -> None:
+    def plain(x):
+        return x + 1
+
+    decorated = traced(plain)
+    print(f"\n{'function call':<28} {'us/call':>9}")
+    print(f"{'undecorated':<28} {best(lambda: plain(1), 200_000, repeat):>9.3f}")
+    print(f"{'@traced, sampled out':<28} {best(lambda: decorated(1), 200_000, repeat):>9.3f}")
+    token = sampled_root()
+    try:
+        print(f"{'@traced, sampled':<28} {best(lambda: decorated(1), 50_000, repeat):>9.3f}")
+    finally:
+        tracing._current_span.reset(token)
+
+
+def bench_query(repeat: int) -> None:
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    conn = engine.connect()
+    run = lambda: conn.execute(text("SELECT 1")).scalar()
+
+    print(f"\n{'SELECT 1 on SQLite':<28} {'us/call':>9}")
+    for name, fn in QUERY_LISTENERS:
+        event.remove(Engine, name, fn)
+    print(f"{'no tracing listeners':<28} {best(run, 5_000, repeat):>9.3f}")
+    for name, fn in QUERY_LISTENERS:
+        event.listen(Engine, name, fn)
+    print(f"{'listeners, sampled out':<28} {best(run, 5_000, repeat):>9.3f}")
+    token = sampled_root()
+    try:
+        print(f"{'listeners, sampled':<28} {best(run, 5_000, repeat):>9.3f}")
+    finally:
+        tracing._current_span.reset(token)
+    conn.close()
+
+
+def make_app(tracer, with_middleware: bool) -> FastAPI:
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @traced
+    def load(item_id: int) -> int:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT :id"), {"id": item_id}).scalar()
+
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        return {"id": load(item_id)}
+
+    if with_middleware:
+        app.add_middleware(TracingMiddleware, tracer=tracer)
+    return app
+
+
+async def run_requests(app: FastAPI, requests: int) -> float:
+    """Return seconds for ``requests`` sequential GET /items/1 calls."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/items/1", "raw_path": b"/items/1", "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - start
+
+
+def bench_requests(requests: int, repeat: int) -> None:
+    print(f"\n{'GET /items/{id}':<28} {'us/req':>9}")
+    for name, with_middleware, sample_rate in (
+        ("no middleware", False, 0.0),
+        ("middleware, rate 0", True, 0.0),
+        ("middleware, rate 1", True, 1.0),
+    ):
+        tracer = Tracer(sample_rate=sample_rate, processor=BatchSpanProcessor(NullExporter()))
+        tracing.tracer = tracer
+        app = make_app(tracer, with_middleware)
+        asyncio.run(run_requests(app, 10))
+        seconds = min(asyncio.run(run_requests(app, requests)) for _ in range(repeat))
+        print(f"{name:<28} {seconds / requests * 1e6:>9.1f}")
+        tracer.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    bench_function(args.repeat)
+    bench_query(args.repeat)
+    bench_requests(args.requests, args.repeat)
+    print(f"\n(total {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Fixtures for the service microbenchmarks (pytest-benchmark).
+
+The benchmarks run against DATABASE_URL (PostgreSQL) inside one outer
+transaction that is rolled back at the end, so the database is left as it
+was. The application tables are truncated inside that transaction and filled
+with the synthetic dataset, which takes exclusive locks on them until the run
+finishes: do not point this at a database that is serving traffic.
+
+Usage:
+    python -m pytest benchmarks [--benchmark-autosave] [--benchmark-compare]
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the parent directory to the path so we can import app modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from benchmarks.dataset import APP_TABLES, generate_dataset
+
+
+class SyncRunSession:
+    """Runs ``run_sync`` on a sync session, the only way the API touches its AsyncSession"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.info = db.info
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.db, *args, **kwargs)
+
+
+@pytest.fixture(scope="session")
+def connection():
+    if not settings.DATABASE_URL.startswith("postgresql"):
+        pytest.skip("service benchmarks require a PostgreSQL DATABASE_URL")
+    engine = create_engine(settings.DATABASE_URL)
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            yield conn
+        finally:
+            transaction.rollback()
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def dataset(connection):
+    with Session(bind=connection, join_transaction_mode="create_savepoint") as db:
+        db.execute(text(f"TRUNCATE {', '.join(APP_TABLES)} CASCADE"))
+        dataset = generate_dataset(db, students=200, problems=500, answers_per_student=50)
+        db.commit()
+    return dataset
+
+
+@pytest.fixture
+def db(connection, dataset):
+    # Service commits only release a savepoint; the outer transaction is rolled back
+    with Session(bind=connection, join_transaction_mode="create_savepoint") as session:
+        yield session
@@ -0,0 +1,245 @@
+"""
+Synthetic dataset generator for benchmarks and load tests.
+
+Creates teachers, students, tags, problems with LaTeX statements and four
+choices each, and an answer history spread over the past weeks with the
+matching user_progress rows. Generation is deterministic for a given seed
+(ids, answers and timestamps relative to ``now``), and every user shares the
+same password so the load generator can log in as any of them:
+
+    bench-teacher-<i>@example.com / bench-student-<i>@example.com
+
+Rows are inserted in bulk with executemany; the answer history needs
+PostgreSQL because user_answers is partitioned by month.
+
+Usage:
+    python benchmarks/dataset.py [--students 200] [--teachers 5] [--problems 500]
+                                 [--tags 20] [--answers-per-student 50] [--seed 0] [--truncate]
+"""
+
+import argparse
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from app.db.partitioning import ensure_partitions
+from app.models.problem import Choice, Problem, ProblemTag, Tag, initial_rating_for_difficulty
+from app.models.user import User
+from app.models.user_progress import UserAnswer, UserProgress
+from app.services.auth import get_password_hash
+from app.services.user_progress import apply_answer_to_progress
+
+PASSWORD = "bench-password"
+
+# Tables emptied by --truncate (everything the application writes)
+APP_TABLES = [
+    "user_answers", "user_progress", "user_ratings", "quiz_sessions", "quiz_set_problems",
+    "quiz_sets", "problem_tags", "choices", "problems", "tags", "idempotency_keys",
+    "refresh_tokens", "revoked_tokens", "user_profiles", "users",
+]
+
+TOPICS = [
+    ("微分積分学", "\\int_0^{{{a}}} x^{{{b}}} \\, dx", "\\frac{{{a}^{{{c}}}}}{{{c}}}"),
+    ("線形代数", "\\det \\begin{{pmatrix}} {a} & {b} \\\\ {b} & {c} \\end{{pmatrix}}", "{a} \\cdot {c} - {b}^2"),
+    ("確率論", "P(X \\leq {a}), \\quad X \\sim \\mathrm{{Bin}}({c}, \\tfrac{{1}}{{{b}}})", "\\sum_{{k=0}}^{{{a}}} \\binom{{{c}}}{{k}}"),
+    ("級数", "\\sum_{{n=1}}^{{\\infty}} \\frac{{1}}{{n^{{{b}}}}} \\cdot {a}", "{a} \\zeta({b})"),
+    ("微分方程式", "y' = {a} y + {b}, \\quad y(0) = {c}", "y = ({c} + \\tfrac{{{b}}}{{{a}}}) e^{{{a} x}} - \\tfrac{{{b}}}{{{a}}}"),
+]
+
+
+@dataclass
+class Dataset:
+    """Ids of the generated rows, for benchmarks to pick from"""
+    teacher_ids: List[UUID] = field(default_factory=list)
+    student_ids: List[UUID] = field(default_factory=list)
+    tag_names: List[str] = field(default_factory=list)
+    # problem id -> [(choice id, is_correct)]
+    problems: Dict[UUID, List[Tuple[UUID, bool]]] = field(default_factory=dict)
+    answers: int = 0
+
+    @staticmethod
+    def email(role: str, index: int) -> str:
+        return f"bench-{role}-{index}@example.com"
+
+
+def _uuid(rng: random.Random) -> UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def generate_dataset(
+    db: Session,
+    students: int = 200,
+    teachers: int = 5,
+    problems: int = 500,
+    tags: int = 20,
+    answers_per_student: int = 50,
+    history_days: int = 60,
+    seed: int = 0,
+) -> Dataset:
+    """Insert a synthetic dataset through ``db`` and return its ids (does not commit)."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    dataset = Dataset()
+    password_hash = get_password_hash(PASSWORD)
+
+    users = []
+    for role, count, ids in (("teacher", teachers, dataset.teacher_ids), ("student", students, dataset.student_ids)):
+        for i in range(count):
+            user_id = _uuid(rng)
+            ids.append(user_id)
+            users.append({
+                "id": user_id, "email": Dataset.email(role, i), "password_hash": password_hash,
+                "full_name": f"Bench {role.title()} {i}", "role": role,
+                "created_at": now, "updated_at": now,
+            })
+    db.execute(insert(User), users)
+
+    tag_rows = []
+    for i in range(tags):
+        topic = TOPICS[i % len(TOPICS)][0]
+        name = f"{topic}{i // len(TOPICS) + 1}"
+        dataset.tag_names.append(name)
+        tag_rows.append({
+            "id": _uuid(rng), "name": name, "description": f"{topic}の問題",
+            "created_by": rng.choice(dataset.teacher_ids), "created_at": now, "updated_at": now,
+        })
+    db.execute(insert(Tag), tag_rows)
+
+    problem_rows, choice_rows, problem_tag_rows = [], [], []
+    for i in range(problems):
+        problem_id = _uuid(rng)
+        tag_index = rng.randrange(tags)
+        topic, statement, answer = TOPICS[tag_index % len(TOPICS)]
+        a, b, c = rng.randint(2, 9), rng.randint(2, 9), rng.randint(2, 9)
+        difficulty = rng.randint(1, 5)
+        problem_rows.append({
+            "id": problem_id,
+            "title": f"{topic} 問題 {i + 1}",
+            "description": f"{topic}の基本的な計算問題",
+            "problem_text": f"次の値を求めよ。\n$$ {statement.format(a=a, b=b, c=c)} $$",
+            "difficulty": difficulty,
+            "rating": initial_rating_for_difficulty(difficulty),
+            "rating_count": 0,
+            "created_by": rng.choice(dataset.teacher_ids),
+            "created_at": now - timedelta(days=history_days + 1),
+            "updated_at": now,
+        })
+        correct = rng.randrange(4)
+        choices = []
+        for k in range(4):
+            choice_id = _uuid(rng)
+            choices.append((choice_id, k == correct))
+            choice_rows.append({
+                "id": choice_id, "problem_id": problem_id, "is_correct": k == correct,
+                "text": answer.format(a=a + k - correct, b=b, c=c),
+                "created_at": now, "updated_at": now,
+            })
+        dataset.problems[problem_id] = choices
+        for extra in {tag_index, rng.randrange(tags)}:
+            problem_tag_rows.append({
+                "id": _uuid(rng), "problem_id": problem_id, "tag_id": tag_rows[extra]["id"],
+                "created_at": now, "updated_at": now,
+            })
+    db.execute(insert(Problem), problem_rows)
+    db.execute(insert(Choice), choice_rows)
+    db.execute(insert(ProblemTag), problem_tag_rows)
+
+    # Answer history: each student works on a subset of problems, answering
+    # the same problem several times; progress follows the answers in order
+    if answers_per_student:
+        if db.get_bind().dialect.name == "postgresql":
+            ensure_partitions(db.connection(), 0, since=(now - timedelta(days=history_days)).date())
+        problem_ids = list(dataset.problems)
+        answer_rows, progress_rows = [], []
+        for student_id in dataset.student_ids:
+            skill = rng.uniform(0.3, 0.9)
+            times = sorted(
+                now - timedelta(seconds=rng.uniform(60, history_days * 86400))
+                for _ in range(answers_per_student)
+            )
+            working_set = rng.sample(problem_ids, min(len(problem_ids), max(1, answers_per_student // 3)))
+            progress: Dict[UUID, UserProgress] = {}
+            for answered_at in times:
+                problem_id = rng.choice(working_set)
+                choices = dataset.problems[problem_id]
+                is_correct = rng.random() < skill
+                choice_id = next(c for c, ok in choices if ok) if is_correct else rng.choice(
+                    [c for c, ok in choices if not ok]
+                )
+                answer_rows.append({
+                    "id": _uuid(rng), "user_id": student_id, "problem_id": problem_id,
+                    "selected_choice": choice_id, "is_correct": is_correct,
+                    "created_at": answered_at, "updated_at": answered_at,
+                })
+                state = progress.setdefault(problem_id, UserProgress(
+                    attempts=0, mastery_level=0.0, ease_factor=2.5, stability=0.0, review_streak=0,
+                ))
+                apply_answer_to_progress(state, is_correct, answered_at)
+            for problem_id, state in progress.items():
+                progress_rows.append({
+                    "id": _uuid(rng), "user_id": student_id, "problem_id": problem_id,
+                    "attempts": state.attempts, "last_attempt_at": state.last_attempt_at,
+                    "mastery_level": state.mastery_level, "ease_factor": state.ease_factor,
+                    "stability": state.stability, "review_streak": state.review_streak,
+                    "due_at": state.due_at, "created_at": now, "updated_at": now,
+                })
+        for start in range(0, len(answer_rows), 10000):
+            db.execute(insert(UserAnswer), answer_rows[start:start + 10000])
+        db.execute(insert(UserProgress), progress_rows)
+        dataset.answers = len(answer_rows)
+
+    return dataset
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--teachers", type=int, default=5)
+    parser.add_argument("--problems", type=int, default=500)
+    parser.add_argument("--tags", type=int, default=20)
+    parser.add_argument("--answers-per-student", type=int, default=50)
+    parser.add_argument("--history-days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--truncate", action="store_true", help="empty all application tables first")
+    args = parser.parse_args()
+
+    from app.db.base import SessionLocal
+
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        if args.truncate:
+            db.execute(text(f"TRUNCATE {', '.join(APP_TABLES)} CASCADE"))
+        dataset = generate_dataset(
+            db,
+            students=args.students,
+            teachers=args.teachers,
+            problems=args.problems,
+            tags=args.tags,
+            answers_per_student=args.answers_per_student,
+            history_days=args.history_days,
+            seed=args.seed,
+        )
+        db.commit()
+    print(
+        f"Created {len(dataset.teacher_ids)} teachers, {len(dataset.student_ids)} students, "
+        f"{len(dataset.tag_names)} tags, {len(dataset.problems)} problems and "
+        f"{dataset.answers} answers in {time.perf_counter() - start:.1f}s "
+        f"(password: {PASSWORD})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Index advisor driven by the statements of a real workload.
+
+Reads the most expensive statements from pg_stat_statements (or from a file of
+SQL statements), plans each one with EXPLAIN (GENERIC_PLAN), and
+
+- suggests btree indexes where a large table is read by a sequential scan
+  with an indexable filter, or sorted in full for an ORDER BY;
+- validates indexes: it plans the affected statements before and after the
+  index exists (created or dropped inside a transaction that is always rolled
+  back) and prints both plans with their estimated costs.
+
+Typical session against a local PostgreSQL loaded with benchmarks/dataset.py
+(or scripts/seed_db.py), with pg_stat_statements enabled
+(shared_preload_libraries = 'pg_stat_statements' and
+CREATE EXTENSION pg_stat_statements):
+
+    python benchmarks/index_advisor.py --reset
+    python benchmarks/load_test.py --duration 60
+    python benchmarks/index_advisor.py --top 30
+    python benchmarks/index_advisor.py --validate "choices(problem_id)"
+    python benchmarks/index_advisor.py --validate idx_user_answer_selected_choice
+
+Validation takes a lock that blocks writes to the table while the index is
+built, so run it against a benchmark database, never production. Costs are the
+planner's estimates for a generic plan; confirm real gains with load_test.py.
+PostgreSQL 16 or later (EXPLAIN GENERIC_PLAN).
+
+Usage:
+    python benchmarks/index_advisor.py [--top 20] [--statements FILE] [--min-rows 10000]
+                                       [--validate "table(col, ...)" | INDEX_NAME ...] [--reset]
+"""
+
+import argparse
+import re
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.partitioning import PARTITIONED_TABLE, is_partition_table
+
+# Only statements that read rows are planned (EXPLAIN of writes is fine, but
+# their plans are dominated by the write itself)
+PLANNED_PREFIXES = ("select", "with")
+
+# "column op ..." in a Filter; the column may be qualified, quoted or cast
+_CONDITION_RE = re.compile(
+    r"\(*(?:\w+\.)?\"?(\w+)\"?\)?(?:::[\w ]+)?\s+(=|<>|<=|>=|<|>|IS NULL|IS NOT NULL)\s*(ANY)?"
+)
+_EQUALITY_OPERATORS = {"=", "IS NULL"}
+_RANGE_OPERATORS = {"<", ">", "<=", ">="}
+
+
+@dataclass
+class Statement:
+    query: str
+    calls: int = 0
+    total_ms: float = 0.0
+
+
+@dataclass(frozen=True)
+class Candidate:
+    table: str
+    columns: Tuple[str, ...]
+
+    @property
+    def ddl(self) -> str:
+        return f"{self.table}({', '.join(self.columns)})"
+
+
+@dataclass
+class Suggestion:
+    candidate: Candidate
+    reasons: List[str] = field(default_factory=list)
+    statements: Set[int] = field(default_factory=set)
+
+
+# -- reading the workload ---------------------------------------------------
+
+def has_pg_stat_statements(conn: Connection) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'"
+    )).first() is not None
+
+
+def top_statements(conn: Connection, limit: int) -> List[Statement]:
+    """The statements of this database with the largest total execution time"""
+    rows = conn.execute(text(
+        "SELECT query, calls, total_exec_time FROM pg_stat_statements "
+        "WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database()) "
+        "ORDER BY total_exec_time DESC"
+    )).all()
+    statements = [
+        Statement(query, calls, total_ms) for query, calls, total_ms in rows
+        if query.lstrip().lower().startswith(PLANNED_PREFIXES) and "pg_" not in query
+    ]
+    return statements[:limit]
+
+
+def read_statements(path: Path) -> List[Statement]:
+    """Statements separated by semicolons, e.g. copied from the SQL log"""
+    return [Statement(query.strip()) for query in path.read_text().split(";") if query.strip()]
+
+
+# -- plans ------------------------------------------------------------------
+
+def explain(conn: Connection, query: str) -> Dict:
+    """The generic plan of ``query`` ($n parameters are left unbound)"""
+    generic = "GENERIC_PLAN, " if re.search(r"\$\d", query) else ""
+    return conn.execute(text(f"EXPLAIN ({generic}FORMAT JSON) {query}")).scalar()[0]["Plan"]
+
+
+def walk(plan: Dict) -> Iterator[Dict]:
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from walk(child)
+
+
+def summarize(plan: Dict) -> str:
+    """One line per scan or sort: how each table is read"""
+    # Scans of the partitions of one table are counted together
+    lines: Dict[str, int] = {}
+    for node in walk(plan):
+        kind = node["Node Type"]
+        if "Relation Name" in node:
+            using = ""
+            if "Index Name" in node:
+                # Each partition has its own index name
+                using = " using an index" if is_partition_table(node["Relation Name"]) else f" using {node['Index Name']}"
+            line = f"{kind} on {parent_table(node['Relation Name'])}{using}"
+        elif kind == "Sort":
+            line = f"Sort by {', '.join(node.get('Sort Key', []))}"
+        else:
+            continue
+        lines[line] = lines.get(line, 0) + 1
+    return "; ".join(f"{line} x{count}" if count > 1 else line for line, count in lines.items())
+
+
+def filter_columns(condition: str) -> Tuple[List[str], List[str]]:
+    """Equality and range columns of a Filter, in order of appearance
+
+    Anything else (LIKE with a leading wildcard, function calls, OR) is left
+    out: a plain btree index would not help with it.
+    """
+    if " OR " in condition:
+        return [], []
+    equality, ranges = [], []
+    for column, operator, _ in _CONDITION_RE.findall(condition):
+        if operator in _EQUALITY_OPERATORS and column not in equality:
+            equality.append(column)
+        elif operator in _RANGE_OPERATORS and column not in ranges:
+            ranges.append(column)
+    return equality, [column for column in ranges if column not in equality]
+
+
+def sort_columns(sort_keys: Sequence[str]) -> Optional[List[str]]:
+    """Columns of a Sort Key, or None if it sorts by an expression"""
+    columns = []
+    for key in sort_keys:
+        key = re.sub(r"\s+(ASC|DESC|NULLS FIRST|NULLS LAST)\b", "", key).strip()
+        match = re.fullmatch(r"(?:\w+\.)?\"?(\w+)\"?", key)
+        if not match:
+            return None
+        columns.append(match.group(1))
+    return columns
+
+
+def candidates(plan: Dict, table_rows: Dict[str, float], min_rows: float) -> Iterator[Tuple[Candidate, str]]:
+    """Indexes that could replace sequential scans and sorts in ``plan``"""
+    for node in walk(plan):
+        kind = node["Node Type"]
+        if kind == "Seq Scan":
+            table = parent_table(node["Relation Name"])
+            if table_rows.get(table, 0) < min_rows or "Filter" not in node:
+                continue
+            equality, ranges = filter_columns(node["Filter"])
+            if equality or ranges:
+                # Equality columns first, then at most one range column
+                yield Candidate(table, tuple(equality + ranges[:1])), f"Seq Scan on {table} filtering {node['Filter']}"
+        elif kind == "Sort":
+            scans = [
+                child for child in walk(node)
+                if child is not node and "Relation Name" in child
+            ]
+            if len(scans) != 1 or scans[0]["Node Type"] != "Seq Scan":
+                continue
+            table = parent_table(scans[0]["Relation Name"])
+            columns = sort_columns(node.get("Sort Key", []))
+            if columns and table_rows.get(table, 0) >= min_rows:
+                yield Candidate(table, tuple(columns)), f"Sort of {table} by {', '.join(node['Sort Key'])}"
+
+
+def parent_table(relation: str) -> str:
+    return PARTITIONED_TABLE if is_partition_table(relation) else relation
+
+
+def table_sizes(conn: Connection) -> Dict[str, float]:
+    """Estimated rows per table (partitions are added to their parent)"""
+    sizes: Dict[str, float] = defaultdict(float)
+    for name, rows in conn.execute(text(
+        "SELECT relname, reltuples FROM pg_class "
+        "WHERE relkind IN ('r', 'p') AND relnamespace = 'public'::regnamespace"
+    )):
+        sizes[parent_table(name)] += max(rows, 0)
+    return sizes
+
+
+def existing_indexes(conn: Connection) -> Dict[str, List[Tuple[str, Tuple[str, ...]]]]:
+    """Per table, the (name, columns) of its btree indexes (parents of partitioned tables only)"""
+    indexes: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = defaultdict(list)
+    rows = conn.execute(text(
+        "SELECT t.relname, i.relname, array_agg(a.attname ORDER BY k.ordinality) "
+        "FROM pg_index x "
+        "JOIN pg_class i ON i.oid = x.indexrelid "
+        "JOIN pg_class t ON t.oid = x.indrelid "
+        "JOIN pg_am am ON am.oid = i.relam AND am.amname = 'btree' "
+        "CROSS JOIN LATERAL unnest(x.indkey) WITH ORDINALITY AS k(attnum, ordinality) "
+        "JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum "
+        "WHERE t.relnamespace = 'public'::regnamespace "
+        "GROUP BY t.relname, i.relname"
+    ))
+    for table, name, columns in rows:
+        if not is_partition_table(table):
+            indexes[table].append((name, tuple(columns)))
+    return indexes
+
+
+def covering_index(candidate: Candidate, indexes: Dict[str, List[Tuple[str, Tuple[str, ...]]]]) -> Optional[str]:
+    """An existing index that starts with the candidate's columns"""
+    for name, columns in indexes.get(candidate.table, ()):
+        if columns[:len(candidate.columns)] == candidate.columns:
+            return name
+    return None
+
+
+def suggest(conn: Connection, statements: List[Statement], min_rows: float) -> List[Suggestion]:
+    sizes = table_sizes(conn)
+    indexes = existing_indexes(conn)
+    suggestions: Dict[Candidate, Suggestion] = {}
+    for number, statement in enumerate(statements, 1):
+        try:
+            plan = explain(conn, statement.query)
+        except Exception as exc:
+            conn.rollback()
+            print(f"  [{number}] not planned: {str(exc).splitlines()[0]}")
+            continue
+        for candidate, reason in candidates(plan, sizes, min_rows):
+            covered_by = covering_index(candidate, indexes)
+            if covered_by:
+                # The planner preferred a sequential scan over an index that
+                # exists (low selectivity); another index would not help either
+                continue
+            suggestion = suggestions.setdefault(candidate, Suggestion(candidate))
+            if reason not in suggestion.reasons:
+                suggestion.reasons.append(reason)
+            suggestion.statements.add(number)
+    return sorted(
+        suggestions.values(),
+        key=lambda s: -sum(statements[n - 1].total_ms for n in s.statements),
+    )
+
+
+# -- validation -------------------------------------------------------------
+
+def parse_target(conn: Connection, target: str) -> Tuple[str, str, str]:
+    """(table, DDL to run, description) for ``table(col, ...)`` or an index name
+
+    For an existing index the DDL drops it, so the "before" plan is the one
+    with the index and "after" the one without; the report flips them back.
+    """
+    match = re.fullmatch(r"\s*(\w+)\s*\(([\w\s,]+)\)\s*", target)
+    if match:
+        table, columns = match.group(1), [c.strip() for c in match.group(2).split(",")]
+        return table, f"CREATE INDEX index_advisor_candidate ON {table} ({', '.join(columns)})", "create"
+    table = conn.execute(text(
+        "SELECT t.relname FROM pg_index x "
+        "JOIN pg_class i ON i.oid = x.indexrelid JOIN pg_class t ON t.oid = x.indrelid "
+        "WHERE i.relname = :name"
+    ), {"name": target}).scalar()
+    if table is None:
+        raise SystemExit(f"Unknown index {target!r}; give an index name or table(col, ...)")
+    return table, f"DROP INDEX {target}", "drop"
+
+
+def validate(conn: Connection, statements: List[Statement], target: str) -> None:
+    table, ddl, mode = parse_target(conn, target)
+    affected = [
+        (number, statement) for number, statement in enumerate(statements, 1)
+        if re.search(rf"\b{table}\b", statement.query)
+    ]
+    print(f"\n{target}: {len(affected)} of the statements read {table}")
+    if not affected:
+        return
+
+    def plans() -> Dict[int, Optional[Dict]]:
+        result = {}
+        for number, statement in affected:
+            conn.execute(text("SAVEPOINT index_advisor"))
+            try:
+                result[number] = explain(conn, statement.query)
+            except Exception:
+                conn.execute(text("ROLLBACK TO SAVEPOINT index_advisor"))
+                result[number] = None
+        return result
+
+    current = plans()
+    try:
+        conn.execute(text(ddl))
+        changed = plans()
+    finally:
+        conn.rollback()
+    without, with_index = (current, changed) if mode == "create" else (changed, current)
+
+    for number, statement in affected:
+        before, after = without[number], with_index[number]
+        if before is None or after is None:
+            continue
+        cost_before, cost_after = before["Total Cost"], after["Total Cost"]
+        verdict = "uses it" if summarize(before) != summarize(after) else "unchanged"
+        print(f"  [{number}] cost {cost_before:,.0f} -> {cost_after:,.0f} ({verdict})  {_shorten(statement.query)}")
+        if verdict == "uses it":
+            print(f"       without: {summarize(before)}")
+            print(f"       with:    {summarize(after)}")
+
+
+def _shorten(query: str, width: int = 100) -> str:
+    query = " ".join(query.split())
+    return query if len(query) <= width else query[:width - 3] + "..."
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=20, help="statements to look at, by total time")
+    parser.add_argument("--statements", type=Path, help="read statements from a file instead")
+    parser.add_argument("--min-rows", type=float, default=10000, help="ignore smaller tables")
+    parser.add_argument("--validate", nargs="+", metavar="INDEX",
+                        help='"table(col, ...)" to try a new index, or the name of an existing one')
+    parser.add_argument("--reset", action="store_true", help="reset pg_stat_statements and exit")
+    args = parser.parse_args()
+
+    from app.db.base import engine
+
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("The index advisor needs PostgreSQL")
+
+    with engine.connect() as conn:
+        if args.statements is None and not has_pg_stat_statements(conn):
+            raise SystemExit(
+                "pg_stat_statements is not installed: add it to shared_preload_libraries, restart, "
+                "run CREATE EXTENSION pg_stat_statements, or pass --statements FILE"
+            )
+        if args.reset:
+            conn.execute(text("SELECT pg_stat_statements_reset()"))
+            conn.commit()
+            print("Reset pg_stat_statements; run the workload, then the advisor again")
+            return
+
+        statements = read_statements(args.statements) if args.statements else top_statements(conn, args.top)
+        print(f"{len(statements)} statements")
+        for number, statement in enumerate(statements, 1):
+            timing = f"{statement.total_ms:10,.0f} ms {statement.calls:8,} calls  " if statement.calls else ""
+            print(f"  [{number}] {timing}{_shorten(statement.query)}")
+
+        if args.validate:
+            for target in args.validate:
+                validate(conn, statements, target)
+            return
+
+        suggestions = suggest(conn, statements, args.min_rows)
+        conn.rollback()
+        if not suggestions:
+            print("\nNo index suggestions: every large table is read through an index")
+            return
+        print("\nSuggested indexes (validate each with --validate before adding a migration):")
+        for suggestion in suggestions:
+            numbers = ", ".join(str(n) for n in sorted(suggestion.statements))
+            print(f"  {suggestion.candidate.ddl}  <- statements {numbers}")
+            for reason in suggestion.reasons:
+                print(f"      {reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+HTTP load generator replaying student and teacher traffic against the API.
+
+Virtual users log in as the accounts created by benchmarks/dataset.py and
+then loop over weighted actions until the duration elapses: students browse
+and open problems, ask for the next adaptive problem, submit answers and
+check their review queue, history and stats; teachers list problems, look at
+problem statistics and tags and occasionally create a problem. Each virtual
+user waits for its response before sending the next request (closed loop),
+optionally with think time in between.
+
+Reports throughput and p50/p95/p99 latency per endpoint, and compares them
+with a stored baseline (p95 regressions beyond --max-regression fail the run).
+
+Run the server against a seeded local PostgreSQL with rate limiting off, e.g.:
+    python benchmarks/dataset.py --truncate
+    RATE_LIMIT_ENABLED=False uvicorn app.main:app --workers 1
+
+Usage:
+    python benchmarks/load_test.py [--base-url http://127.0.0.1:8000] [--students 20]
+                                   [--teachers 2] [--duration 30] [--think-time 0]
+                                   [--baseline benchmarks/baselines/load_test.json]
+                                   [--save-baseline PATH] [--max-regression 0.25]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from benchmarks.dataset import PASSWORD, Dataset
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "load_test.json"
+
+# Endpoints with fewer samples than this are not compared with the baseline
+MIN_SAMPLES = 20
+
+
+class Recorder:
+    """Latencies and errors per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.latencies[name].append(time.perf_counter() - start)
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            return None
+        return response
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+class VirtualUser:
+    def __init__(self, client, recorder: Recorder, problems: List[dict], tags: List[str], rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.problems = problems
+        self.tags = tags
+        self.rng = rng
+        self.headers = {}
+
+    async def login(self, email: str) -> bool:
+        response = await self.recorder.request(
+            self.client, "POST /auth/login", "POST", "/auth/login",
+            data={"username": email, "password": PASSWORD},
+        )
+        if response is None:
+            return False
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return True
+
+    async def get(self, name: str, url: str, **kwargs):
+        return await self.recorder.request(self.client, name, "GET", url, headers=self.headers, **kwargs)
+
+    async def post(self, name: str, url: str, **kwargs):
+        return await self.recorder.request(self.client, name, "POST", url, headers=self.headers, **kwargs)
+
+    async def run(self, deadline: float, think_time: float) -> None:
+        actions = self.actions()
+        names, weights = list(actions), list(actions.values())
+        while time.perf_counter() < deadline:
+            await getattr(self, self.rng.choices(names, weights)[0])()
+            if think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / think_time))
+
+
+class Student(VirtualUser):
+    @staticmethod
+    def actions() -> Dict[str, int]:
+        return {
+            "list_problems": 25, "open_problem": 20, "next_problem": 10, "submit_answer": 25,
+            "review_queue": 8, "answer_history": 5, "stats": 7,
+        }
+
+    async def list_problems(self):
+        await self.get("GET /problems", "/problems", params={"limit": 20, "skip": self.rng.randrange(0, 200, 20)})
+
+    async def open_problem(self):
+        await self.get("GET /problems/{id}", f"/problems/{self.rng.choice(self.problems)['id']}")
+
+    async def next_problem(self):
+        await self.get("GET /problems/next", "/problems/next", params={"tag": self.rng.choice(self.tags)})
+
+    async def submit_answer(self):
+        problem = self.rng.choice(self.problems)
+        choice = self.rng.choice(problem["choices"])
+        await self.post(
+            "POST /progress/submit", "/progress/submit",
+            json={"problem_id": problem["id"], "selected_choice": choice["id"]},
+        )
+
+    async def review_queue(self):
+        await self.get("GET /progress/review-queue", "/progress/review-queue")
+
+    async def answer_history(self):
+        await self.get("GET /progress/answers", "/progress/answers", params={"limit": 20})
+
+    async def stats(self):
+        await self.get("GET /progress/stats", "/progress/stats")
+
+
+class Teacher(VirtualUser):
+    @staticmethod
+    def actions() -> Dict[str, int]:
+        return {"list_problems": 30, "problem_stats": 40, "list_tags": 20, "create_problem": 10}
+
+    async def list_problems(self):
+        await self.get("GET /problems?limit=100", "/problems", params={"limit": 100})
+
+    async def problem_stats(self):
+        await self.get("GET /problems/{id}/stats", f"/problems/{self.rng.choice(self.problems)['id']}/stats")
+
+    async def list_tags(self):
+        await self.get("GET /tags", "/tags")
+
+    async def create_problem(self):
+        n = self.rng.randint(2, 9)
+        await self.post("POST /problems", "/problems", json={
+            "title": f"負荷試験の問題 {n}",
+            "problem_text": f"\\int_0^1 x^{n} \\, dx",
+            "difficulty": self.rng.randint(1, 5),
+            "choices": [
+                {"text": f"\\frac{{1}}{{{n + 1}}}", "is_correct": True},
+                {"text": f"\\frac{{1}}{{{n}}}", "is_correct": False},
+            ],
+            "tags": [self.rng.choice(self.tags)],
+        })
+
+
+async def load_catalog(client: httpx.AsyncClient) -> tuple:
+    """Log in as a teacher and fetch the problems and tags to pick from"""
+    setup = VirtualUser(client, Recorder(), [], [], random.Random())
+    if not await setup.login(Dataset.email("teacher", 0)):
+        raise SystemExit("Could not log in; seed the database with benchmarks/dataset.py first")
+    problems = []
+    while len(problems) < 500:
+        response = await setup.get("setup", "/problems", params={"limit": 100, "skip": len(problems)})
+        items = response.json()["items"] if response is not None else []
+        if not items:
+            break
+        problems.extend(items)
+    response = await setup.get("setup", "/tags")
+    tags = [tag["name"] for tag in response.json()] if response is not None else []
+    if not problems or not tags:
+        raise SystemExit("The database has no problems or tags; run benchmarks/dataset.py first")
+    return problems, tags
+
+
+async def run(args) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.students + args.teachers + 1)
+    async with httpx.AsyncClient(base_url=args.base_url.rstrip("/") + "/api/v1", limits=limits, timeout=30) as client:
+        problems, tags = await load_catalog(client)
+        rng = random.Random(args.seed)
+        users = [
+            Student(client, recorder, problems, tags, random.Random(rng.random()))
+            for _ in range(args.students)
+        ] + [
+            Teacher(client, recorder, problems, tags, random.Random(rng.random()))
+            for _ in range(args.teachers)
+        ]
+        emails = [Dataset.email("student", i) for i in range(args.students)]
+        emails += [Dataset.email("teacher", i) for i in range(args.teachers)]
+        logged_in = await asyncio.gather(*(user.login(email) for user, email in zip(users, emails)))
+        if not all(logged_in):
+            raise SystemExit(
+                f"{logged_in.count(False)} virtual users could not log in; "
+                "does the dataset have enough students and teachers?"
+            )
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user.run(start + args.duration, args.think_time) for user in users))
+        elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for name in sorted(recorder.latencies):
+        latencies = sorted(recorder.latencies[name])
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": recorder.errors[name],
+            # Logins happen before the timed run
+            "rps": round(len(latencies) / elapsed, 2) if name != "POST /auth/login" else None,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+    timed = [stats for name, stats in endpoints.items() if stats["rps"] is not None]
+    return {
+        "meta": {
+            "date": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "base_url": args.base_url,
+            "students": args.students,
+            "teachers": args.teachers,
+            "duration": args.duration,
+            "think_time": args.think_time,
+            "seed": args.seed,
+        },
+        "total": {
+            "requests": sum(stats["requests"] for stats in timed),
+            "errors": sum(stats["errors"] for stats in timed),
+            "rps": round(sum(stats["requests"] for stats in timed) / elapsed, 2),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def print_report(result: dict) -> None:
+    print(f"{'endpoint':<30} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in result["endpoints"].items():
+        rps = f"{stats['rps']:.1f}" if stats["rps"] is not None else "-"
+        print(
+            f"{name:<30} {stats['requests']:>9} {stats['errors']:>7} {rps:>8} "
+            f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}"
+        )
+    total = result["total"]
+    print(f"{'total':<30} {total['requests']:>9} {total['errors']:>7} {total['rps']:>8.1f}")
+
+
+def compare(result: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Print the change from the baseline and return the regressed endpoints"""
+    print(f"\nCompared with the baseline of {baseline['meta']['date']} (p95 regression limit {max_regression:.0%}):")
+    print(f"{'endpoint':<30} {'p95 ms':>8} {'baseline':>9} {'change':>8} {'req/s':>8} {'baseline':>9}")
+    regressed = []
+    for name, stats in result["endpoints"].items():
+        base = baseline["endpoints"].get(name)
+        if base is None or stats["requests"] < MIN_SAMPLES or base["requests"] < MIN_SAMPLES:
+            continue
+        change = stats["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        flag = ""
+        if change > max_regression:
+            regressed.append(name)
+            flag = "  REGRESSED"
+        rps = f"{stats['rps']:.1f}" if stats["rps"] is not None else "-"
+        base_rps = f"{base['rps']:.1f}" if base.get("rps") is not None else "-"
+        print(
+            f"{name:<30} {stats['p95_ms']:>8.1f} {base['p95_ms']:>9.1f} {change:>+8.0%} "
+            f"{rps:>8} {base_rps:>9}{flag}"
+        )
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--students", type=int, default=20, help="concurrent virtual students")
+    parser.add_argument("--teachers", type=int, default=2, help="concurrent virtual teachers")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--think-time", type=float, default=0, help="mean seconds between requests per user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", type=Path, help="write this run as the new baseline")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed p95 increase")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_report(result)
+
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(result, indent=2, ensure_ascii=False) + "\n")
+        print(f"\nSaved the baseline to {args.save_baseline}")
+    elif args.baseline.exists():
+        regressed = compare(result, json.loads(args.baseline.read_text()), args.max_regression)
+        if regressed:
+            print(f"\np95 regressed on: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
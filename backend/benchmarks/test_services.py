@@ -0,0 +1,111 @@
+"""
+Microbenchmarks of the service functions behind the busiest endpoints.
+
+See conftest.py for the database setup.
+"""
+import asyncio
+import random
+
+import pytest
+from sqlalchemy import func
+
+from app.models.user import User
+from app.models.user_progress import UserAnswer
+from app.services import auth
+from app.services.auth import (
+    authenticate_user,
+    create_access_token,
+    get_current_active_user,
+    get_current_teacher,
+    get_current_user,
+)
+from app.services.problem import get_problem_stats, get_problems
+from app.services.user_progress import get_user_stats, submit_answer
+from benchmarks.conftest import SyncRunSession
+from benchmarks.dataset import PASSWORD, Dataset
+
+
+@pytest.mark.parametrize("limit", [20, 100])
+def test_get_problems(benchmark, db, limit):
+    problems, total = benchmark(get_problems, db, skip=0, limit=limit)
+    assert len(problems) == limit
+
+
+def test_get_problems_by_tag(benchmark, db, dataset):
+    problems, total = benchmark(get_problems, db, skip=0, limit=20, tag=dataset.tag_names[0])
+    assert problems
+
+
+def test_get_problems_search(benchmark, db):
+    benchmark(get_problems, db, skip=0, limit=20, search="微分")
+
+
+def test_submit_answer(benchmark, db, dataset):
+    rng = random.Random(0)
+    problems = list(dataset.problems.items())
+
+    def submit():
+        user = db.get(User, rng.choice(dataset.student_ids))
+        problem_id, choices = rng.choice(problems)
+        return submit_answer(db, user, problem_id, rng.choice(choices)[0])
+
+    answer = benchmark(submit)
+    assert answer.id is not None
+
+
+def test_get_problem_stats(benchmark, db):
+    # The most answered problem (one query per choice on top of the totals)
+    problem_id = (
+        db.query(UserAnswer.problem_id)
+        .group_by(UserAnswer.problem_id)
+        .order_by(func.count().desc())
+        .limit(1)
+        .scalar()
+    )
+    stats = benchmark(get_problem_stats, db, problem_id)
+    assert stats["total_answers"] > 0
+
+
+def test_get_user_stats(benchmark, db, dataset):
+    user = db.get(User, dataset.student_ids[0])
+    stats = benchmark(get_user_stats, db, user)
+    assert stats["total_answers"] > 0
+
+
+@pytest.mark.parametrize("cached", [True, False], ids=["principal-cached", "principal-uncached"])
+def test_get_current_user(benchmark, db, dataset, cached):
+    user_id = dataset.student_ids[0]
+    token = create_access_token({"sub": str(user_id), "role": "student"})
+    session = SyncRunSession(db)
+    loop = asyncio.new_event_loop()
+
+    def authenticate():
+        if not cached:
+            auth.invalidate_principal(user_id)
+        principal = loop.run_until_complete(get_current_user(db=session, token=token))
+        return get_current_active_user(principal)
+
+    principal = benchmark(authenticate)
+    loop.close()
+    assert principal.id == user_id
+
+
+def test_get_current_teacher(benchmark, db, dataset):
+    token = create_access_token({"sub": str(dataset.teacher_ids[0]), "role": "teacher"})
+    session = SyncRunSession(db)
+    loop = asyncio.new_event_loop()
+
+    def authorize():
+        principal = loop.run_until_complete(get_current_user(db=session, token=token))
+        return get_current_teacher(get_current_active_user(principal))
+
+    benchmark(authorize)
+    loop.close()
+
+
+def test_authenticate_user(benchmark, db, dataset):
+    # bcrypt dominates; a few rounds are enough
+    user = benchmark.pedantic(
+        authenticate_user, args=(db, Dataset.email("student", 0), PASSWORD), rounds=5, iterations=1
+    )
+    assert user is not None
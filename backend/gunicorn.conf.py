@@ -0,0 +1,83 @@
+"""
+Production server profile: gunicorn managing N uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported once in the master (``preload_app``) and forked, so
+workers share the imported code copy-on-write and start faster. Anything that
+holds a socket or file handle at import time is reopened in ``post_fork``.
+
+Read-mostly data (tags, problem counts, the choice grading table) lives in one
+shared-memory region (``app.services.catalog``) instead of a copy per worker.
+The master creates it before forking and removes it on exit. In-progress quiz
+sessions go to the host-local SQLite store so that consecutive requests of one
+quiz can land on different workers.
+"""
+
+import multiprocessing
+import os
+
+# The shared catalog is what makes several workers per host cheap; enable it
+# unless the environment says otherwise. Must be set before the app is loaded.
+os.environ.setdefault("SHARED_CACHE_ENABLED", "True")
+# The default in-memory quiz session store is per process; share it instead.
+os.environ.setdefault("QUIZ_SESSION_STORE", "sqlite")
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Recycle workers now and then so slow leaks cannot accumulate; the jitter
+# keeps them from all restarting at once.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+
+# Behind a load balancer every request arrives from the proxy's address, which
+# would put all anonymous clients in one rate-limit bucket. List the proxies
+# (exact IPs, comma-separated, or "*") so uvicorn takes the client address from
+# X-Forwarded-For instead.
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def on_starting(server):
+    from app.core.config import settings
+    from app.services.catalog import catalog
+
+    if server.cfg.workers > 1 and settings.QUIZ_SESSION_STORE == "memory":
+        server.log.warning(
+            "QUIZ_SESSION_STORE=memory keeps quiz sessions per worker; every request that "
+            "lands on another worker reloads the session from the database"
+        )
+
+    if catalog.enabled:
+        # Drop a region left behind by a master that was killed, then start empty
+        catalog.region
+        catalog.close(unlink=True)
+        server.log.info("Shared catalog region: %s", catalog.region.name)
+
+
+def post_fork(server, worker):
+    from app.db.base import engine
+    from app.services.quiz import session_store
+
+    # Connections opened in the master must not be used by two processes;
+    # close=False leaves them for the master instead of closing them under it.
+    # The async engines are left alone: they only connect inside a worker's
+    # event loop, and recreating their pool from sync code replaces the
+    # asyncio-aware first-connect lock with a thread lock that deadlocks.
+    engine.dispose(close=False)
+    if hasattr(session_store, "reopen"):
+        session_store.reopen()
+
+
+def on_exit(server):
+    from app.services.catalog import catalog
+
+    catalog.close(unlink=True)
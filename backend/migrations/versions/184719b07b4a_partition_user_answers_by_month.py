@@ -0,0 +1,78 @@
+"""partition user_answers by month
+
+Revision ID: 184719b07b4a
+Revises: c63ce35cdff4
+Create Date: 2026-10-19 16:58:40.212784
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+from app.db.partitioning import ensure_partitions
+
+
+# revision identifiers, used by Alembic.
+revision = '184719b07b4a'
+down_revision = 'c63ce35cdff4'
+branch_labels = None
+depends_on = None
+
+
+def _create_user_answers(partitioned: bool) -> None:
+    op.create_table('user_answers',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('problem_id', sa.UUID(), nullable=False),
+    sa.Column('selected_choice', sa.UUID(), nullable=False),
+    sa.Column('is_correct', sa.Boolean(), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['problem_id'], ['problems.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['selected_choice'], ['choices.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', 'created_at') if partitioned else sa.PrimaryKeyConstraint('id'),
+    **({'postgresql_partition_by': 'RANGE (created_at)'} if partitioned else {})
+    )
+    op.create_index('idx_user_answer_user_problem', 'user_answers', ['user_id', 'problem_id'], unique=False)
+
+
+def _copy_rows(source: str) -> None:
+    op.execute(
+        "INSERT INTO user_answers "
+        "(id, user_id, problem_id, selected_choice, is_correct, created_at, updated_at) "
+        "SELECT id, user_id, problem_id, selected_choice, is_correct, created_at, updated_at "
+        f"FROM {source}"
+    )
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    op.drop_index('idx_user_answer_user_problem', table_name='user_answers')
+    op.rename_table('user_answers', 'user_answers_unpartitioned')
+
+    _create_user_answers(partitioned=True)
+
+    # 既存データの最初の月から数か月先までのパーティションを用意する
+    oldest = conn.execute(sa.text("SELECT min(created_at) FROM user_answers_unpartitioned")).scalar()
+    ensure_partitions(
+        conn,
+        months_ahead=settings.ANSWER_PARTITION_MONTHS_AHEAD,
+        since=oldest.date() if oldest else date.today(),
+    )
+
+    _copy_rows('user_answers_unpartitioned')
+    op.drop_table('user_answers_unpartitioned')
+
+
+def downgrade() -> None:
+    op.rename_table('user_answers', 'user_answers_partitioned')
+    op.drop_index('idx_user_answer_user_problem', table_name='user_answers_partitioned')
+
+    _create_user_answers(partitioned=False)
+    _copy_rows('user_answers_partitioned')
+    # パーティションは親テーブルと一緒に削除される
+    op.drop_table('user_answers_partitioned')
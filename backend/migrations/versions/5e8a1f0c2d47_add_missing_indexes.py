@@ -0,0 +1,80 @@
+"""add missing indexes
+
+Revision ID: 5e8a1f0c2d47
+Revises: 31e357eaf03a
+Create Date: 2026-10-19 18:20:11.402518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8a1f0c2d47'
+down_revision = '31e357eaf03a'
+branch_labels = None
+depends_on = None
+
+# (索引名, テーブル, 列)
+INDEXES = [
+    ('idx_choice_problem', 'choices', ['problem_id']),
+    ('idx_problem_difficulty', 'problems', ['difficulty']),
+    ('idx_problem_created_at', 'problems', ['created_at', 'id']),
+]
+
+# パーティション化された user_answers の索引 (索引名, パーティションの索引名の接尾辞, 列)
+# (user_id, created_at) は 7cb6f8196130 の idx_user_answer_user_created が担う
+PARTITIONED_INDEXES = [
+    ('idx_user_answer_selected_choice', 'selected_choice_idx', ['selected_choice']),
+    ('idx_user_answer_problem', 'problem_idx', ['problem_id']),
+]
+
+
+def _partitions() -> list:
+    return op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'user_answers'::regclass"
+    )).scalars().all()
+
+
+def upgrade() -> None:
+    # 書き込みをブロックしないよう、すべて CONCURRENTLY で作成する。
+    # 途中で失敗すると INVALID な索引が残るため、再実行の前に削除すること。
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, table, columns in INDEXES + [(n, 'user_answers', c) for n, _, c in PARTITIONED_INDEXES]:
+            op.create_index(name, table, columns, unique=False)
+        return
+
+    # 親テーブルには ON ONLY で無効な索引だけを作り、各パーティションの索引を
+    # CONCURRENTLY で作成してからアタッチする（すべてアタッチされると有効になる）
+    for name, _, columns in PARTITIONED_INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY user_answers ({', '.join(columns)})")
+    partitions = _partitions()
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True
+            )
+        for name, suffix, columns in PARTITIONED_INDEXES:
+            for partition in partitions:
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_{suffix} "
+                    f"ON {partition} ({', '.join(columns)})"
+                )
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition}_{suffix}")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, table, _ in INDEXES + [(n, 'user_answers', c) for n, _, c in PARTITIONED_INDEXES]:
+            op.drop_index(name, table_name=table)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    # パーティションの索引は親の索引と一緒に削除される (パーティション化された索引は CONCURRENTLY で削除できない)
+    for name, _, _ in PARTITIONED_INDEXES:
+        op.drop_index(name, table_name='user_answers')
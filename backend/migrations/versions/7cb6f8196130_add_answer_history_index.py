@@ -0,0 +1,42 @@
+"""add answer history index
+
+Revision ID: 7cb6f8196130
+Revises: 184719b07b4a
+Create Date: 2026-10-19 17:03:22.846321
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7cb6f8196130'
+down_revision = '184719b07b4a'
+branch_labels = None
+depends_on = None
+
+INDEX = 'idx_user_answer_user_created'
+
+
+def upgrade() -> None:
+    # 親テーブルには ON ONLY で無効な索引だけを作り、各パーティションの索引を
+    # CONCURRENTLY で作成してからアタッチする（書き込みをブロックしない）
+    op.execute(f"CREATE INDEX IF NOT EXISTS {INDEX} ON ONLY user_answers (user_id, created_at, id)")
+    partitions = op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'user_answers'::regclass"
+    )).scalars().all()
+
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_user_created_idx "
+                f"ON {partition} (user_id, created_at, id)"
+            )
+            op.execute(f"ALTER INDEX {INDEX} ATTACH PARTITION {partition}_user_created_idx")
+
+
+def downgrade() -> None:
+    # パーティションの索引は親の索引と一緒に削除される
+    op.drop_index(INDEX, table_name='user_answers')
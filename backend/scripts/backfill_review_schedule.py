@@ -0,0 +1,111 @@
+"""
+Backfill the spaced-repetition schedule in user_progress.
+
+Replays the historical user_answers of every (user, problem) pair in
+chronological order through the SM-2 scheduler and writes the resulting
+ease factor, stability, streak and due date back in bulk.
+
+Usage:
+    python scripts/backfill_review_schedule.py [--batch-size 5000]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from app.db.base import SessionLocal
+from app.models.user_progress import UserAnswer, UserProgress
+from app.services.spaced_repetition import ReviewState, quality_from_answer, schedule_review
+
+
+def replay_answers(db: Session, batch_size: int) -> int:
+    """Stream answers ordered by (user, problem, time) and update progress in batches."""
+    stmt = (
+        select(UserAnswer.user_id, UserAnswer.problem_id, UserAnswer.is_correct, UserAnswer.created_at)
+        .order_by(UserAnswer.user_id, UserAnswer.problem_id, UserAnswer.created_at)
+        .execution_options(yield_per=batch_size)
+    )
+    update_stmt = (
+        update(UserProgress)
+        .where(
+            UserProgress.user_id == bindparam("b_user_id"),
+            UserProgress.problem_id == bindparam("b_problem_id"),
+        )
+        .values(
+            ease_factor=bindparam("b_ease_factor"),
+            stability=bindparam("b_stability"),
+            review_streak=bindparam("b_review_streak"),
+            due_at=bindparam("b_due_at"),
+        )
+    )
+
+    pending = []
+    updated = 0
+    current_key = None
+    state = ReviewState()
+    due_at = None
+
+    def flush_pair():
+        pending.append({
+            "b_user_id": current_key[0],
+            "b_problem_id": current_key[1],
+            "b_ease_factor": state.ease_factor,
+            "b_stability": state.stability,
+            "b_review_streak": state.review_streak,
+            "b_due_at": due_at,
+        })
+
+    # 読み取り用と書き込み用で接続を分け、サーバーサイドカーソルを保ったまま更新する
+    with db.get_bind().connect() as read_conn:
+        for user_id, problem_id, is_correct, created_at in read_conn.execute(stmt):
+            key = (user_id, problem_id)
+            if key != current_key:
+                if current_key is not None:
+                    flush_pair()
+                current_key = key
+                state = ReviewState()
+            state, due_at = schedule_review(state, quality_from_answer(is_correct), created_at)
+
+            if len(pending) >= batch_size:
+                db.connection().execute(update_stmt, pending)
+                db.commit()
+                updated += len(pending)
+                pending.clear()
+                print(f"  {updated} progress rows updated")
+
+    if current_key is not None:
+        flush_pair()
+    if pending:
+        db.connection().execute(update_stmt, pending)
+        db.commit()
+        updated += len(pending)
+
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        updated = replay_answers(db, args.batch_size)
+        print(f"Review schedule backfilled for {updated} progress rows")
+    except Exception as e:
+        db.rollback()
+        print(f"Error backfilling review schedule: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Manage the monthly partitions of user_answers.
+
+Subcommands:
+    ensure   create partitions for the upcoming months
+    archive  export partitions past the retention period to zstd-compressed
+             Parquet files, verify them, then detach and drop the partitions
+
+Archiving requires pyarrow (pip install pyarrow).
+
+Usage:
+    python scripts/manage_partitions.py ensure [--months-ahead 3]
+    python scripts/manage_partitions.py archive [--retention-months 24] [--keep-detached] [--dry-run]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.base import engine
+from app.db.partitioning import Partition, closed_partitions, detach_partition, ensure_partitions
+
+COLUMNS = ["id", "user_id", "problem_id", "selected_choice", "is_correct", "created_at", "updated_at"]
+UUID_COLUMNS = {"id", "user_id", "problem_id", "selected_choice"}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        sys.exit("pyarrow is required for archiving: pip install pyarrow")
+    return pyarrow
+
+
+def export_partition(partition: Partition, archive_dir: Path, batch_size: int) -> Path:
+    """Stream a partition into a Parquet file and verify the row count."""
+    pa = _require_pyarrow()
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("problem_id", pa.string()),
+        ("selected_choice", pa.string()),
+        ("is_correct", pa.bool_()),
+        ("created_at", pa.timestamp("us")),
+        ("updated_at", pa.timestamp("us")),
+    ])
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{partition.name}.parquet"
+    tmp_path = path.with_suffix(".parquet.tmp")
+
+    written = 0
+    with engine.connect() as conn:
+        expected = conn.execute(text(f"SELECT count(*) FROM {partition.name}")).scalar()
+        result = conn.execution_options(yield_per=batch_size).execute(
+            text(f"SELECT {', '.join(COLUMNS)} FROM {partition.name} ORDER BY created_at")
+        )
+        with pa.parquet.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            for rows in result.partitions():
+                batch = {}
+                for name, values in zip(COLUMNS, zip(*rows)):
+                    batch[name] = [str(v) for v in values] if name in UUID_COLUMNS else list(values)
+                writer.write_table(pa.table(batch, schema=schema))
+                written += len(rows)
+
+    stored = pa.parquet.ParquetFile(tmp_path).metadata.num_rows
+    if not (written == stored == expected):
+        tmp_path.unlink()
+        raise RuntimeError(
+            f"{partition.name}: row count mismatch (table={expected}, written={written}, file={stored})"
+        )
+    tmp_path.rename(path)
+    return path
+
+
+def ensure(months_ahead: int) -> None:
+    with engine.begin() as conn:
+        created = ensure_partitions(conn, months_ahead)
+    print(f"Created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+
+
+def archive(retention_months: int, archive_dir: Path, batch_size: int, keep_detached: bool, dry_run: bool) -> None:
+    with engine.connect() as conn:
+        partitions = closed_partitions(conn, retention_months)
+    if not partitions:
+        print("No partitions past the retention period")
+        return
+
+    for partition in partitions:
+        if dry_run:
+            print(f"Would archive {partition.name} [{partition.start}, {partition.end})")
+            continue
+
+        path = export_partition(partition, archive_dir, batch_size)
+        print(f"Exported {partition.name} to {path}")
+
+        # DETACH ... CONCURRENTLY はトランザクションブロック内では実行できない
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            detach_partition(conn, partition.name)
+            if not keep_detached:
+                conn.execute(text(f"DROP TABLE {partition.name}"))
+        print(f"{'Detached' if keep_detached else 'Dropped'} {partition.name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ensure_parser = subparsers.add_parser("ensure", help="create upcoming partitions")
+    ensure_parser.add_argument("--months-ahead", type=int, default=settings.ANSWER_PARTITION_MONTHS_AHEAD)
+
+    archive_parser = subparsers.add_parser("archive", help="archive partitions past retention")
+    archive_parser.add_argument("--retention-months", type=int, default=settings.ANSWER_RETENTION_MONTHS)
+    archive_parser.add_argument("--archive-dir", type=Path, default=Path(settings.ANSWER_ARCHIVE_DIR))
+    archive_parser.add_argument("--batch-size", type=int, default=50_000)
+    archive_parser.add_argument("--keep-detached", action="store_true",
+                                help="detach partitions but keep the tables")
+    archive_parser.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args()
+    if engine.dialect.name != "postgresql":
+        sys.exit("Partition management requires PostgreSQL")
+
+    if args.command == "ensure":
+        ensure(args.months_ahead)
+    else:
+        archive(args.retention_months, args.archive_dir, args.batch_size, args.keep_detached, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
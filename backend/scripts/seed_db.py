@@ -1,80 +1,462 @@
 """
-Database seeding script for the Math LMS application.
-This script creates sample data in the database for development and testing.
+Synthetic data generator for the Math LMS database.
+
+Creates teachers and students with realistic names, a tag taxonomy
+(area / topic / level), problems with LaTeX statements and four choices each,
+and an answer history with the matching user_progress rows:
+
+- problem popularity follows a Zipf distribution, so a few problems collect
+  most of the answers, as in a real course;
+- student activity is heavy-tailed (log-normal around --answers-per-student);
+- the chance of a correct answer depends on the student's skill and the
+  problem's difficulty;
+- user_progress is derived from each student's answers in time order with
+  the same code the API uses (``apply_answer_to_progress``).
+
+The output is deterministic for a given --seed and --as-of date, whatever the
+number of --jobs: students are generated in fixed-size chunks, each with its
+own random stream. Chunks are generated in parallel worker processes, and
+every worker loads its rows with COPY over its own connection. PostgreSQL only.
+
+Accounts follow the scheme of benchmarks/dataset.py, so the load tools
+(benchmarks/load_test.py, benchmarks/test_services.py) run against either
+dataset: every user shares one password (--password, default
+``bench-password``) and logs in as ``bench-<role>-<index>@example.com``,
+numbered from 0, e.g. ``bench-student-0@example.com``.
+
+Ratings start fresh, as in benchmarks/dataset.py: the generated history is
+not replayed through the Elo update, so problems keep the initial rating of
+their difficulty with rating_count 0 and there are no user_ratings rows.
+Adaptive practice starts every student at the initial rating and both sides
+move with answers made through the API.
+
+Usage:
+    python scripts/seed_db.py [--preset small|semester|university] [--seed 0] [--jobs N]
+                              [--students N] [--teachers N] [--problems N] [--tags N]
+                              [--answers-per-student N] [--history-days N]
+                              [--as-of YYYY-MM-DD] [--truncate]
 """
 
+import argparse
+import io
+import multiprocessing
 import sys
-import os
+import time
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 # Add the parent directory to the path so we can import app modules
 parent_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(parent_dir))
 
-from sqlalchemy.orm import Session
-from app.db.base import SessionLocal
-
-# Import models
-# from app.models.user import User
-# Import other models as needed
-
-
-def seed_users(db: Session) -> None:
-    """Seed sample users into the database."""
-    # Example:
-    # users = [
-    #    User(
-    #        email="admin@example.com",
-    #        hashed_password="hashed_password_here",  # Use actual hashing in real app
-    #        is_active=True,
-    #        is_superuser=True,
-    #        full_name="Admin User"
-    #    ),
-    #    User(
-    #        email="student@example.com",
-    #        hashed_password="hashed_password_here",  # Use actual hashing in real app
-    #        is_active=True,
-    #        full_name="Student User"
-    #    ),
-    # ]
-    # for user in users:
-    #    db.add(user)
-    
-    print("Users seeded successfully")
-
-
-def seed_courses(db: Session) -> None:
-    """Seed sample courses into the database."""
-    # Example:
-    # courses = [
-    #    Course(
-    #        title="Calculus I",
-    #        description="Introduction to differential calculus",
-    #        level="undergraduate",
-    #    ),
-    # ]
-    # for course in courses:
-    #    db.add(course)
-    
-    print("Courses seeded successfully")
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
 
+from app.core.config import settings
+from app.db.partitioning import ensure_partitions
+from benchmarks.dataset import PASSWORD, Dataset
+from app.models.problem import initial_rating_for_difficulty
+from app.services.auth import get_password_hash
+from app.services.user_progress import apply_answer_to_progress
 
-def main() -> None:
-    """Main function to run the database seeding."""
-    db = SessionLocal()
+# Tables emptied by --truncate (everything the application writes)
+APP_TABLES = [
+    "user_answers", "user_progress", "user_ratings", "quiz_sessions", "quiz_set_problems",
+    "quiz_sets", "problem_tags", "choices", "problems", "tags", "idempotency_keys",
+    "refresh_tokens", "revoked_tokens", "user_profiles", "users",
+]
+
+
+@dataclass(frozen=True)
+class Scale:
+    teachers: int
+    students: int
+    problems: int
+    tags: int
+    answers_per_student: int
+    history_days: int
+
+
+PRESETS = {
+    # A seminar: enough to click through the UI
+    "small": Scale(teachers=5, students=200, problems=500, tags=20, answers_per_student=50, history_days=60),
+    # One faculty over a semester: ~1M answers
+    "semester": Scale(teachers=40, students=5000, problems=5000, tags=60, answers_per_student=200,
+                      history_days=120),
+    # A whole university over a year: ~20M answers
+    "university": Scale(teachers=400, students=50000, problems=40000, tags=80, answers_per_student=400,
+                        history_days=365),
+}
+
+# Students per generation chunk. Fixed, so the output does not depend on --jobs.
+CHUNK_STUDENTS = 500
+
+# Zipf exponent of problem popularity
+ZIPF_EXPONENT = 1.05
+
+FAMILY_NAMES = [
+    "佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "山本", "中村", "小林", "加藤",
+    "吉田", "山田", "佐々木", "山口", "松本", "井上", "木村", "林", "斎藤", "清水",
+]
+GIVEN_NAMES = [
+    "翔太", "蓮", "大翔", "悠真", "陽斗", "湊", "健太", "拓海", "颯", "樹",
+    "陽菜", "結衣", "葵", "さくら", "美咲", "凛", "花子", "芽依", "結菜", "莉子",
+]
+
+# (area, topic, statement, answer) -- statement and answer are str.format
+# templates over the integers a, b, c; wrong choices shift a.
+TOPICS = [
+    ("解析学", "極限", "\\lim_{{x \\to 0}} \\frac{{\\sin {a}x}}{{{b}x}}", "\\frac{{{a}}}{{{b}}}"),
+    ("解析学", "微分積分学", "\\int_0^{{{a}}} x^{{{b}}} \\, dx", "\\frac{{{a}^{{{c}}}}}{{{c}}}"),
+    ("解析学", "級数", "\\sum_{{n=1}}^{{\\infty}} \\frac{{{a}}}{{n^{{{b}}}}}", "{a} \\zeta({b})"),
+    ("解析学", "微分方程式", "y' = {a} y + {b}, \\quad y(0) = {c}",
+     "y = ({c} + \\tfrac{{{b}}}{{{a}}}) e^{{{a} x}} - \\tfrac{{{b}}}{{{a}}}"),
+    ("解析学", "多変数関数", "\\frac{{\\partial^2}}{{\\partial x \\partial y}} x^{{{a}}} y^{{{b}}}",
+     "{a} \\cdot {b} \\, x^{{{a} - 1}} y^{{{b} - 1}}"),
+    ("代数学", "線形代数", "\\det \\begin{{pmatrix}} {a} & {b} \\\\ {b} & {c} \\end{{pmatrix}}",
+     "{a} \\cdot {c} - {b}^2"),
+    ("代数学", "固有値", "A = \\begin{{pmatrix}} {a} & 0 \\\\ {b} & {c} \\end{{pmatrix}} \\text{{ の固有値}}",
+     "\\lambda = {a}, {c}"),
+    ("代数学", "群論", "\\mathbb{{Z}}/{a}\\mathbb{{Z}} \\times \\mathbb{{Z}}/{b}\\mathbb{{Z}} \\text{{ の位数}}",
+     "{a} \\cdot {b}"),
+    ("確率・統計", "確率論", "P(X \\leq {a}), \\quad X \\sim \\mathrm{{Bin}}({c}, \\tfrac{{1}}{{{b}}})",
+     "\\sum_{{k=0}}^{{{a}}} \\binom{{{c}}}{{k}} \\left(\\tfrac{{1}}{{{b}}}\\right)^k"),
+    ("確率・統計", "期待値", "E[X^2], \\quad X \\sim N({a}, {b}^2)", "{a}^2 + {b}^2"),
+    ("確率・統計", "推定", "\\bar{{X}} \\text{{ の分散}}, \\quad n = {c}, \\ \\sigma^2 = {a}",
+     "\\frac{{{a}}}{{{c}}}"),
+    ("離散数学", "組合せ", "\\binom{{{a} + {b}}}{{{b}}}", "\\frac{{({a} + {b})!}}{{{a}! \\, {b}!}}"),
+    ("離散数学", "漸化式", "a_{{n+1}} = {a} a_n, \\ a_1 = {b} \\text{{ のとき }} a_{{{c}}}",
+     "{b} \\cdot {a}^{{{c} - 1}}"),
+    ("幾何学", "曲線", "y = x^{{{a}}} \\ (0 \\leq x \\leq {b}) \\text{{ と }} x \\text{{ 軸で囲まれた面積}}",
+     "\\frac{{{b}^{{{a} + 1}}}}{{{a} + 1}}"),
+]
+LEVELS = ["入門", "基礎", "標準", "応用", "発展"]
+
+
+def _uuids(rng: np.random.Generator, count: int) -> List[str]:
+    """``count`` random version 4 UUIDs as strings (in bulk; one at a time is the bottleneck)"""
+    raw = rng.integers(0, 256, size=(count, 16), dtype=np.uint8)
+    raw[:, 6] = raw[:, 6] & 0x0F | 0x40
+    raw[:, 8] = raw[:, 8] & 0x3F | 0x80
+    digits = raw.tobytes().hex()
+    return [
+        f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+        for h in (digits[i:i + 32] for i in range(0, len(digits), 32))
+    ]
+
+
+def _uuid(rng: np.random.Generator) -> str:
+    return _uuids(rng, 1)[0]
+
+
+def _copy_value(value) -> str:
+    """Render one value in COPY's text format"""
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, str):
+        return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return str(value)
+
+
+class CopyBuffer:
+    """Rows of one table, rendered for ``COPY ... FROM STDIN``"""
+
+    def __init__(self, table: str, columns: Sequence[str]):
+        self.table = table
+        self.columns = columns
+        self.rows = 0
+        self._buffer = io.StringIO()
+
+    def add(self, *values) -> None:
+        self._buffer.write("\t".join(map(_copy_value, values)))
+        self._buffer.write("\n")
+        self.rows += 1
+
+    def add_lines(self, lines: List[str], rows: int) -> None:
+        """Rows already rendered (values that need no escaping)"""
+        self._buffer.writelines(lines)
+        self.rows += rows
+
+    def copy_to(self, cursor) -> int:
+        self._buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN", self._buffer, size=1 << 20
+        )
+        return self.rows
+
+
+def tag_taxonomy(count: int) -> List[Tuple[str, int]]:
+    """``count`` tag names as area/topic/level, with the TOPICS index of each"""
+    tags = []
+    for i in range(count):
+        topic_index = i % len(TOPICS)
+        area, topic = TOPICS[topic_index][:2]
+        level = i // len(TOPICS)
+        name = f"{area}/{topic}/{LEVELS[level % len(LEVELS)]}"
+        if level >= len(LEVELS):
+            name += str(level // len(LEVELS) + 1)
+        tags.append((name, topic_index))
+    return tags
+
+
+@dataclass
+class Catalog:
+    """What the answer generation needs to know about the generated content"""
+    student_ids: List[str]
+    problem_ids: List[str]
+    difficulties: np.ndarray
+    # problem index -> correct choice id / the three wrong choice ids
+    correct_choices: List[str]
+    wrong_choices: List[List[str]]
+    # Zipf popularity over a shuffled problem order
+    popularity: np.ndarray
+
+
+def generate_content(scale: Scale, seed: int, as_of: datetime, password_hash: str) -> Tuple[Catalog, List[CopyBuffer]]:
+    """Users, tags, problems, choices and problem tags, as COPY buffers"""
+    rng = np.random.default_rng([seed, 0])
+    stamp = as_of - timedelta(days=scale.history_days + 1)
+
+    users = CopyBuffer("users", ["id", "email", "password_hash", "full_name", "role", "created_at", "updated_at"])
+    teacher_ids, student_ids = [], []
+    for role, count, ids in (("teacher", scale.teachers, teacher_ids), ("student", scale.students, student_ids)):
+        for i in range(count):
+            user_id = _uuid(rng)
+            ids.append(user_id)
+            name = f"{FAMILY_NAMES[rng.integers(len(FAMILY_NAMES))]} {GIVEN_NAMES[rng.integers(len(GIVEN_NAMES))]}"
+            users.add(user_id, Dataset.email(role, i), password_hash, name, role, stamp, stamp)
+
+    tags = CopyBuffer("tags", ["id", "name", "description", "created_by", "created_at", "updated_at"])
+    tag_ids_by_topic: Dict[int, List[str]] = {}
+    for name, topic_index in tag_taxonomy(scale.tags):
+        tag_id = _uuid(rng)
+        tag_ids_by_topic.setdefault(topic_index, []).append(tag_id)
+        area, topic = TOPICS[topic_index][:2]
+        creator = teacher_ids[rng.integers(len(teacher_ids))]
+        tags.add(tag_id, name, f"{area}の{topic}に関する問題", creator, stamp, stamp)
+    all_tag_ids = [tag_id for ids in tag_ids_by_topic.values() for tag_id in ids]
+
+    problems = CopyBuffer("problems", [
+        "id", "title", "description", "problem_text", "difficulty", "rating", "rating_count",
+        "created_by", "created_at", "updated_at",
+    ])
+    choices_buffer = CopyBuffer("choices", ["id", "problem_id", "text", "is_correct", "created_at", "updated_at"])
+    problem_tags = CopyBuffer("problem_tags", ["id", "problem_id", "tag_id", "created_at", "updated_at"])
+    problem_ids, correct_choices, wrong_choices = [], [], []
+    difficulties = rng.integers(1, 6, size=scale.problems)
+    for i in range(scale.problems):
+        problem_id = _uuid(rng)
+        problem_ids.append(problem_id)
+        topic_index = int(rng.integers(len(TOPICS)))
+        area, topic, statement, answer = TOPICS[topic_index]
+        a, b, c = (int(x) for x in rng.integers(2, 10, size=3))
+        difficulty = int(difficulties[i])
+        problems.add(
+            problem_id, f"{topic} 問題 {i + 1}", f"{area}・{topic}の計算問題",
+            f"次の値を求めよ。\n$$ {statement.format(a=a, b=b, c=c)} $$",
+            difficulty, initial_rating_for_difficulty(difficulty), 0,
+            teacher_ids[rng.integers(len(teacher_ids))], stamp, stamp,
+        )
+        correct = int(rng.integers(4))
+        wrong = []
+        for k, choice_id in enumerate(_uuids(rng, 4)):
+            if k == correct:
+                correct_choices.append(choice_id)
+            else:
+                wrong.append(choice_id)
+            choices_buffer.add(
+                choice_id, problem_id, answer.format(a=a + k - correct, b=b, c=c), k == correct, stamp, stamp
+            )
+        wrong_choices.append(wrong)
+        # A tag of the problem's own topic, sometimes a second one from anywhere
+        own = tag_ids_by_topic.get(topic_index) or all_tag_ids
+        tag_ids = {own[rng.integers(len(own))]}
+        if all_tag_ids and rng.random() < 0.3:
+            tag_ids.add(all_tag_ids[rng.integers(len(all_tag_ids))])
+        for tag_id in sorted(tag_ids):
+            problem_tags.add(_uuid(rng), problem_id, tag_id, stamp, stamp)
+
+    ranks = rng.permutation(scale.problems) + 1
+    popularity = 1.0 / ranks ** ZIPF_EXPONENT
+    catalog = Catalog(
+        student_ids=student_ids,
+        problem_ids=problem_ids,
+        difficulties=difficulties,
+        correct_choices=correct_choices,
+        wrong_choices=wrong_choices,
+        popularity=popularity / popularity.sum(),
+    )
+    return catalog, [users, tags, problems, choices_buffer, problem_tags]
+
+
+def generate_answers(
+    catalog: Catalog, scale: Scale, seed: int, as_of: datetime, chunk: int
+) -> Tuple[CopyBuffer, CopyBuffer]:
+    """Answer history and progress of one chunk of students"""
+    rng = np.random.default_rng([seed, 1, chunk])
+    answers = CopyBuffer("user_answers", [
+        "id", "user_id", "problem_id", "selected_choice", "is_correct", "created_at", "updated_at",
+    ])
+    progress_rows = CopyBuffer("user_progress", [
+        "id", "user_id", "problem_id", "attempts", "last_attempt_at", "mastery_level", "ease_factor",
+        "stability", "review_streak", "due_at", "created_at", "updated_at",
+    ])
+    history = scale.history_days * 86400.0
+    end = np.datetime64(as_of, "us")
+    students = catalog.student_ids[chunk * CHUNK_STUDENTS:(chunk + 1) * CHUNK_STUDENTS]
+    for student_id in students:
+        # Heavy-tailed activity with mean answers_per_student
+        count = max(1, int(scale.answers_per_student * rng.lognormal(-0.5, 1.0)))
+        skill = rng.normal(0.0, 1.0)
+        problem_indices = rng.choice(len(catalog.problem_ids), size=count, p=catalog.popularity)
+        offsets = np.sort(rng.uniform(60.0, history, size=count))[::-1]
+        times = end - (offsets * 1e6).astype("timedelta64[us]")
+        p_correct = 1.0 / (1.0 + np.exp(-(skill + 1.5 - 0.6 * catalog.difficulties[problem_indices])))
+        correct = rng.random(count) < p_correct
+        wrong_pick = rng.integers(3, size=count)
+        answer_ids = _uuids(rng, count)
+
+        lines = []
+        progress: Dict[int, SimpleNamespace] = {}
+        for answer_id, problem_index, answered_at, stamp, is_correct, wrong in zip(
+            answer_ids, problem_indices.tolist(), times.tolist(), np.datetime_as_string(times).tolist(),
+            correct.tolist(), wrong_pick.tolist(),
+        ):
+            if is_correct:
+                choice_id = catalog.correct_choices[problem_index]
+            else:
+                choice_id = catalog.wrong_choices[problem_index][wrong]
+            lines.append(
+                f"{answer_id}\t{student_id}\t{catalog.problem_ids[problem_index]}\t{choice_id}\t"
+                f"{'t' if is_correct else 'f'}\t{stamp}\t{stamp}\n"
+            )
+            state = progress.get(problem_index)
+            if state is None:
+                state = progress[problem_index] = SimpleNamespace(
+                    attempts=0, mastery_level=0.0, ease_factor=2.5, stability=0.0, review_streak=0,
+                    last_attempt_at=None, due_at=None, first_attempt_at=answered_at,
+                )
+            apply_answer_to_progress(state, is_correct, answered_at)
+        answers.add_lines(lines, count)
+
+        for progress_id, (problem_index, state) in zip(_uuids(rng, len(progress)), progress.items()):
+            progress_rows.add(
+                progress_id, student_id, catalog.problem_ids[problem_index], state.attempts,
+                state.last_attempt_at, state.mastery_level, state.ease_factor, state.stability,
+                state.review_streak, state.due_at, state.first_attempt_at, state.last_attempt_at,
+            )
+    return answers, progress_rows
+
+
+# Set in each worker process by _init_worker
+_worker: Optional[SimpleNamespace] = None
+
+
+def _init_worker(catalog: Catalog, scale: Scale, seed: int, as_of: datetime, url: str) -> None:
+    global _worker
+    _worker = SimpleNamespace(
+        catalog=catalog, scale=scale, seed=seed, as_of=as_of,
+        engine=create_engine(url, poolclass=NullPool),
+    )
+
+
+def _load_chunk(chunk: int) -> Tuple[int, int]:
+    """Generate one chunk and COPY it in its own transaction"""
+    buffers = generate_answers(_worker.catalog, _worker.scale, _worker.seed, _worker.as_of, chunk)
+    return copy_buffers(_worker.engine, buffers)
+
+
+def copy_buffers(engine, buffers: Iterable[CopyBuffer]) -> Tuple[int, ...]:
+    connection = engine.raw_connection()
     try:
-        # Uncomment these as models are implemented
-        # seed_users(db)
-        # seed_courses(db)
-        
-        db.commit()
-        print("Database seeded successfully!")
-    except Exception as e:
-        db.rollback()
-        print(f"Error seeding database: {e}")
+        with connection.cursor() as cursor:
+            counts = tuple(buffer.copy_to(cursor) for buffer in buffers)
+        connection.commit()
+        return counts
     finally:
-        db.close()
+        connection.close()
+
+
+def seed_database(
+    url: str, scale: Scale, seed: int, as_of: datetime, password: str, jobs: int, truncate: bool
+) -> Dict[str, int]:
+    engine = create_engine(url, poolclass=NullPool)
+    if engine.dialect.name != "postgresql":
+        sys.exit("seed_db.py loads data with COPY and needs PostgreSQL")
+
+    with engine.begin() as conn:
+        if truncate:
+            conn.execute(text(f"TRUNCATE {', '.join(APP_TABLES)} CASCADE"))
+        since = (as_of - timedelta(days=scale.history_days)).date()
+        ensure_partitions(conn, 0, since=since, today=max(as_of.date(), date.today()))
+
+    catalog, buffers = generate_content(scale, seed, as_of, get_password_hash(password))
+    counts = dict(zip((buffer.table for buffer in buffers), copy_buffers(engine, buffers)))
+
+    chunks = range((len(catalog.student_ids) + CHUNK_STUDENTS - 1) // CHUNK_STUDENTS)
+    counts["user_answers"] = counts["user_progress"] = 0
+    initargs = (catalog, scale, seed, as_of, url)
+    if jobs > 1:
+        pool = multiprocessing.get_context("fork").Pool(jobs, initializer=_init_worker, initargs=initargs)
+        results = pool.imap_unordered(_load_chunk, chunks)
+    else:
+        pool = None
+        _init_worker(*initargs)
+        results = map(_load_chunk, chunks)
+    try:
+        for answers, progress in results:
+            counts["user_answers"] += answers
+            counts["user_progress"] += progress
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    with engine.begin() as conn:
+        for table in counts:
+            conn.execute(text(f"ANALYZE {table}"))
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--teachers", type=int)
+    parser.add_argument("--students", type=int)
+    parser.add_argument("--problems", type=int)
+    parser.add_argument("--tags", type=int)
+    parser.add_argument("--answers-per-student", type=int)
+    parser.add_argument("--history-days", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--as-of", type=date.fromisoformat, default=date.today(),
+                        help="date the answer history ends (part of what makes the output deterministic)")
+    parser.add_argument("--password", default=PASSWORD)
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(),
+                        help="worker processes generating and loading answers")
+    parser.add_argument("--truncate", action="store_true", help="empty all application tables first")
+    args = parser.parse_args()
+
+    scale = replace(PRESETS[args.preset], **{
+        name: getattr(args, name) for name in Scale.__dataclass_fields__ if getattr(args, name) is not None
+    })
+    as_of = datetime.combine(args.as_of, datetime.min.time())
+
+    start = time.perf_counter()
+    counts = seed_database(settings.DATABASE_URL, scale, args.seed, as_of, args.password, args.jobs, args.truncate)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(", ".join(f"{table}={rows}" for table, rows in counts.items()))
+    print(f"Loaded {total} rows in {elapsed:.1f}s ({total / elapsed * 60:,.0f} rows/min, password: {args.password})")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
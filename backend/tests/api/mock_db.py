@@ -1,22 +1,32 @@
 """
 データベースへの依存を取り除くためのモックユーティリティ
 """
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from uuid import UUID
 
 from fastapi import Depends, FastAPI
 from sqlalchemy.orm import Session
 
-from app.db.base import get_db
+from app.db.base import get_async_db
+
+
+def mock_async_session(db: MagicMock = None) -> MagicMock:
+    """
+    AsyncSession のモックを作成する
+    run_sync に渡された関数には、同期セッションの代わりにモック自身を渡す
+    """
+    db = db if db is not None else MagicMock()
+    db.run_sync = AsyncMock(side_effect=lambda fn, *args, **kwargs: fn(db, *args, **kwargs))
+    return db
 
 
 class MockDB:
     """
     テスト用にSQLAlchemyセッションをモックするクラス
-    アプリケーション全体で使用されるget_db依存関係を置き換える
+    アプリケーション全体で使用されるget_async_db依存関係を置き換える
     """
     def __init__(self):
-        self.mock_db = MagicMock(spec=Session)
+        self.mock_db = mock_async_session(MagicMock(spec=Session))
         self._setup()
 
     def _setup(self):
@@ -37,36 +47,36 @@ class MockDB:
     
     def setup_mocks(self):
         """
-        テスト中にget_db依存関係をこのモックに置き換える
+        テスト中にget_async_db依存関係をこのモックに置き換える
         """
-        # get_dbのパッチを作成
-        db_patch = patch('app.db.base.get_db', self.get_mock_db)
+        # get_async_dbのパッチを作成
+        db_patch = patch('app.db.base.get_async_db', self.get_mock_db)
         db_patch.start()
         
-        # 他の場所でのget_dbの使用もモック
-        api_auth_patch = patch('app.api.v1.endpoints.auth.get_db', self.get_mock_db)
+        # 他の場所でのget_async_dbの使用もモック
+        api_auth_patch = patch('app.api.v1.endpoints.auth.get_async_db', self.get_mock_db)
         api_auth_patch.start()
         
-        api_problems_patch = patch('app.api.v1.endpoints.problems.get_db', self.get_mock_db)
+        api_problems_patch = patch('app.api.v1.endpoints.problems.get_async_db', self.get_mock_db)
         api_problems_patch.start()
         
-        api_progress_patch = patch('app.api.v1.endpoints.progress.get_db', self.get_mock_db)
+        api_progress_patch = patch('app.api.v1.endpoints.progress.get_async_db', self.get_mock_db)
         api_progress_patch.start()
         
-        api_tags_patch = patch('app.api.v1.endpoints.tags.get_db', self.get_mock_db)
+        api_tags_patch = patch('app.api.v1.endpoints.tags.get_async_db', self.get_mock_db)
         api_tags_patch.start()
         
-        api_users_patch = patch('app.api.v1.endpoints.users.get_db', self.get_mock_db)
+        api_users_patch = patch('app.api.v1.endpoints.users.get_async_db', self.get_mock_db)
         api_users_patch.start()
         
-        services_auth_patch = patch('app.services.auth.get_db', self.get_mock_db)
+        services_auth_patch = patch('app.services.auth.get_async_db', self.get_mock_db)
         services_auth_patch.start()
         
         # 戻り値にパッチオブジェクトを含めて、テスト後にstop()できるようにする
         return [db_patch, api_auth_patch, api_problems_patch, api_progress_patch, 
                 api_tags_patch, api_users_patch, services_auth_patch]
     
-    def get_mock_db(self):
+    async def get_mock_db(self):
         """モックDBセッションのジェネレータ関数"""
         yield self.mock_db
 
@@ -0,0 +1,134 @@
+"""
+データベースに依存しない認証依存関係の直接テスト
+"""
+import asyncio
+import pytest
+from dataclasses import FrozenInstanceError
+from unittest.mock import MagicMock, patch
+from uuid import UUID
+
+from fastapi import status, HTTPException
+
+from app.services.auth import (
+    Principal,
+    authenticate_user_async,
+    create_access_token,
+    get_current_user,
+    invalidate_principal,
+    principal_cache,
+    revocation_list,
+)
+from tests.api.mock_db import mock_async_session
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    principal_cache.clear()
+    # 失効リストは空の状態で読み込み済みにしておく
+    revocation_list.load([])
+    yield
+    principal_cache.clear()
+
+
+@pytest.fixture
+def mock_user():
+    """モックユーザー"""
+    user = MagicMock()
+    user.id = UUID("123e4567-e89b-12d3-a456-426614174000")
+    user.email = "test@example.com"
+    user.role = "teacher"
+    user.is_active = True
+    return user
+
+
+@pytest.fixture
+def mock_db(mock_user):
+    db = mock_async_session()
+    db.query.return_value.filter.return_value.first.return_value = mock_user
+    return db
+
+
+@pytest.fixture
+def token(mock_user):
+    return create_access_token({"sub": str(mock_user.id), "role": mock_user.role})
+
+
+def test_get_current_user_caches_principal(mock_db, mock_user, token):
+    """2回目以降の認証ではデータベースを参照しない"""
+    first = asyncio.run(get_current_user(mock_db, token))
+    second = asyncio.run(get_current_user(mock_db, token))
+    
+    assert first == Principal(id=mock_user.id, role="teacher")
+    assert second is first
+    assert mock_db.query.call_count == 1
+    with pytest.raises(FrozenInstanceError):
+        first.role = "student"
+
+
+def test_get_current_user_releases_connection(mock_db, token):
+    """認証で開いたトランザクションを終え、接続を保持したままにしない"""
+    mock_db.in_transaction.return_value = True
+    asyncio.run(get_current_user(mock_db, token))
+
+    mock_db.commit.assert_called_once()
+
+
+def test_invalidate_principal_reloads_user(mock_db, mock_user, token):
+    """無効化後はユーザーを読み直し、変更が反映される"""
+    asyncio.run(get_current_user(mock_db, token))
+    mock_user.role = "student"
+    invalidate_principal(mock_user.id)
+    
+    principal = asyncio.run(get_current_user(mock_db, token))
+    
+    assert mock_db.query.call_count == 2
+    assert principal.role == "student"
+
+
+def test_get_current_user_unknown_user(mock_db, token):
+    """存在しないユーザーのトークンは401エラーになり、キャッシュされない"""
+    mock_db.query.return_value.filter.return_value.first.return_value = None
+    
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(get_current_user(mock_db, token))
+    
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+    assert len(principal_cache) == 0
+
+
+def test_get_current_user_rejects_revoked_token(mock_db, mock_user):
+    """失効させたトークンはフィルタで検出し、データベースで確認して拒否する"""
+    jti = "123e4567-e89b-12d3-a456-426614174009"
+    token = create_access_token({"sub": str(mock_user.id), "role": mock_user.role, "jti": jti})
+    revocation_list.add(jti)
+    
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(get_current_user(mock_db, token))
+    
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_get_current_user_rejects_refresh_token(mock_db, mock_user):
+    """リフレッシュトークンはアクセストークンとして使えない"""
+    token = create_access_token({"sub": str(mock_user.id), "role": mock_user.role, "typ": "refresh"})
+    
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(get_current_user(mock_db, token))
+    
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+    assert mock_db.query.call_count == 0
+
+
+def test_authenticate_user_releases_connection_before_hashing(mock_db, mock_user):
+    """パスワードの照合中はデータベースの接続を保持しない"""
+    async def verify(password, password_hash):
+        mock_db.commit.assert_called_once()
+        return True, "new-hash"
+
+    with patch("app.services.auth.password_hasher.verify_and_update_async", side_effect=verify):
+        user = asyncio.run(authenticate_user_async(mock_db, mock_user.email, "password"))
+
+    assert user is mock_user
+    assert mock_user.password_hash == "new-hash"
+    # ハッシュの更新は別のトランザクションで書く
+    assert mock_db.commit.call_count == 2
@@ -1,17 +1,22 @@
 """
 データベースに依存しないエンドポイントの直接テスト
 """
+import asyncio
 import pytest
 from unittest.mock import patch, MagicMock
 from datetime import datetime
 from typing import List
 from uuid import UUID
 
-from fastapi import status, HTTPException
+from fastapi import status, HTTPException, Response
 from pydantic import TypeAdapter
 
-from app.api.v1.endpoints.progress import submit_problem_answer, read_user_answer_history, read_user_progress, read_user_statistics
+from app.api.v1.endpoints.progress import submit_problem_answer, read_user_answer_history, read_user_progress, read_user_statistics, read_review_queue
 from app.schemas.user_progress import UserAnswerCreate, UserAnswerResponse, UserProgressResponse
+from app.services.auth import get_current_active_user, get_read_db
+from app.services.idempotency import IdempotencyKeyConflict, IdempotencyKeyReused
+from app.services.user_progress import decode_answer_cursor
+from tests.api.mock_db import mock_async_session
 
 
 @pytest.fixture
@@ -48,7 +53,7 @@ def mock_choice_id():
 @pytest.fixture
 def mock_db():
     """モックデータベースセッション"""
-    return MagicMock()
+    return mock_async_session()
 
 
 def test_submit_problem_answer(mock_user, mock_db, mock_problem, mock_choice_id):
@@ -85,7 +90,7 @@ def test_submit_problem_answer(mock_user, mock_db, mock_problem, mock_choice_id)
             mock_submit.return_value = mock_answer
             
             # エンドポイント関数を直接呼び出し
-            result = submit_problem_answer(answer_in, mock_db, mock_user)
+            result = asyncio.run(submit_problem_answer(answer_in, mock_db, mock_user))
             
             # 結果の検証
             assert hasattr(result, "id")
@@ -108,7 +113,7 @@ def test_submit_problem_answer_not_found(mock_user, mock_db, mock_problem, mock_
     with patch("app.api.v1.endpoints.progress.get_problem_by_id", return_value=None):
         # 例外が発生することを確認
         with pytest.raises(HTTPException) as exc_info:
-            submit_problem_answer(answer_in, mock_db, mock_user)
+            asyncio.run(submit_problem_answer(answer_in, mock_db, mock_user))
         
         # 例外の詳細をチェック
         assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
@@ -136,7 +141,7 @@ def test_read_user_answer_history(mock_user, mock_db, mock_uuid, mock_problem, m
         mock_get_answers.return_value = user_answer_adapter.validate_python(mock_answers)
         
         # エンドポイント関数を直接呼び出し
-        result = read_user_answer_history(None, 10, mock_db, mock_user)
+        result = asyncio.run(read_user_answer_history(None, 10, mock_db, mock_user))
         
         # 結果の検証
         assert isinstance(result, list)
@@ -171,7 +176,7 @@ def test_read_user_progress(mock_user, mock_db, mock_uuid, mock_problem):
         mock_get_progress.return_value = user_progress_adapter.validate_python(mock_progress)
         
         # エンドポイント関数を直接呼び出し
-        result = read_user_progress(None, mock_db, mock_user)
+        result = asyncio.run(read_user_progress(None, mock_db, mock_user))
         
         # 結果の検証
         assert isinstance(result, list)
@@ -206,7 +211,7 @@ def test_read_user_stats(mock_user, mock_db):
         mock_get_stats.return_value = mock_stats
         
         # エンドポイント関数を直接呼び出し
-        result = read_user_statistics(mock_db, mock_user)
+        result = asyncio.run(read_user_statistics(mock_db, mock_user))
         
         # 結果の検証
         assert isinstance(result, dict)
@@ -221,4 +226,129 @@ def test_read_user_stats(mock_user, mock_db):
         assert result["total_problems"] == 10
         assert result["attempted_problems"] == 5
         assert result["correct_answers"] == 10
-        assert result["correct_rate"] == 0.67
\ No newline at end of file
+        assert result["correct_rate"] == 0.67
+
+def test_read_review_queue(mock_user, mock_db, mock_problem):
+    """復習キューの取得エンドポイントのテスト"""
+    with patch("app.api.v1.endpoints.progress.get_review_queue") as mock_get_queue:
+        progress = MagicMock()
+        progress.problem_id = mock_problem.id
+        progress.due_at = datetime(2023, 1, 7)
+        progress.stability = 6.0
+        progress.ease_factor = 2.5
+        progress.attempts = 2
+        progress.mastery_level = 1.0
+        mock_get_queue.return_value = [progress]
+        
+        # エンドポイント関数を直接呼び出し
+        result = asyncio.run(read_review_queue(5, mock_db, mock_user))
+        
+        # 結果の検証
+        mock_get_queue.assert_called_once_with(mock_db, mock_user, limit=5)
+        assert len(result) == 1
+        assert result[0].problem_id == mock_problem.id
+        assert result[0].due_at == "2023-01-07T00:00:00"
+        assert result[0].stability == 6.0
+
+
+def test_read_user_answer_history_next_cursor(mock_user, mock_db, mock_uuid):
+    """1ページ分の回答が返ると次ページのカーソルをヘッダーで返し、デコードできる"""
+    with patch("app.api.v1.endpoints.progress.get_user_answers") as mock_get_answers:
+        answer = MagicMock()
+        answer.id = UUID(mock_uuid)
+        answer.created_at = datetime(2023, 1, 1, 12, 30)
+        mock_get_answers.return_value = [answer, answer]
+        response = Response()
+        
+        # エンドポイント関数を直接呼び出し
+        asyncio.run(read_user_answer_history(None, 2, mock_db, mock_user, None, "algebra", True, response))
+        
+        # 結果の検証
+        mock_get_answers.assert_called_once_with(
+            mock_db, mock_user, None, 2, before=None, tag="algebra", is_correct=True
+        )
+        cursor = response.headers["X-Next-Cursor"]
+        assert decode_answer_cursor(cursor) == (answer.created_at, answer.id)
+
+
+def test_read_user_answer_history_invalid_cursor(mock_user, mock_db):
+    """不正なカーソルは400エラーになる"""
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(read_user_answer_history(None, 10, mock_db, mock_user, "not-a-cursor"))
+    
+    assert excinfo.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_submit_problem_answer_replays_idempotent_request(mock_user, mock_db, mock_problem, mock_choice_id, mock_uuid):
+    """同じ冪等キーの再送には記録済みの結果を返し、回答を記録しない"""
+    answer_in = UserAnswerCreate(
+        problem_id=str(mock_problem.id),
+        selected_choice=mock_choice_id
+    )
+    stored = {
+        "id": mock_uuid,
+        "user_id": str(mock_user.id),
+        "problem_id": str(mock_problem.id),
+        "selected_choice": mock_choice_id,
+        "is_correct": True,
+        "created_at": "2023-01-01T00:00:00"
+    }
+    
+    with patch("app.api.v1.endpoints.progress.find_response", return_value=stored):
+        with patch("app.api.v1.endpoints.progress.submit_answer") as mock_submit:
+            response = Response()
+            result = asyncio.run(submit_problem_answer(answer_in, mock_db, mock_user, "retry-1", response))
+            
+            # 結果の検証
+            mock_submit.assert_not_called()
+            assert str(result.id) == mock_uuid
+            assert response.headers["Idempotent-Replayed"] == "true"
+
+
+def test_submit_problem_answer_idempotency_key_reused(mock_user, mock_db, mock_problem, mock_choice_id):
+    """同じ冪等キーで内容の異なるリクエストは422エラーになる"""
+    answer_in = UserAnswerCreate(
+        problem_id=str(mock_problem.id),
+        selected_choice=mock_choice_id
+    )
+    
+    with patch(
+        "app.api.v1.endpoints.progress.find_response",
+        side_effect=IdempotencyKeyReused("Idempotency-Key was already used for a different request"),
+    ):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(submit_problem_answer(answer_in, mock_db, mock_user, "retry-1"))
+    
+    assert exc_info.value.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_submit_problem_answer_conflict_without_stored_result(mock_user, mock_db, mock_problem, mock_choice_id):
+    """並行した再送が先に確定したのに結果を読めない場合は409エラーになる"""
+    answer_in = UserAnswerCreate(
+        problem_id=str(mock_problem.id),
+        selected_choice=mock_choice_id
+    )
+    
+    with patch("app.api.v1.endpoints.progress.get_problem_by_id", return_value=mock_problem):
+        with patch("app.api.v1.endpoints.progress.find_response", return_value=None):
+            with patch(
+                "app.api.v1.endpoints.progress.submit_answer",
+                side_effect=IdempotencyKeyConflict("Request with this Idempotency-Key was already processed"),
+            ):
+                with pytest.raises(HTTPException) as exc_info:
+                    asyncio.run(submit_problem_answer(answer_in, mock_db, mock_user, "retry-1"))
+    
+    assert exc_info.value.status_code == status.HTTP_409_CONFLICT
+
+
+@pytest.mark.parametrize("limit", [0, 101])
+def test_read_user_answer_history_limit_is_bounded(app, client, mock_user, mock_db, limit):
+    """履歴の件数の上限を超える指定は422エラーになる (全件の走査をさせない)"""
+    app.dependency_overrides[get_current_active_user] = lambda: mock_user
+    app.dependency_overrides[get_read_db] = lambda: mock_db
+
+    with patch("app.api.v1.endpoints.progress.get_user_answers") as mock_get_answers:
+        response = client.get("/api/v1/progress/answers", params={"limit": limit})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    mock_get_answers.assert_not_called()
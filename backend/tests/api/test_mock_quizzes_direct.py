@@ -0,0 +1,320 @@
+"""
+データベースに依存しない小テストエンドポイントの直接テスト
+"""
+import asyncio
+import time
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from app.api.v1.endpoints.quizzes import answer_quiz_problem, read_quiz_session, submit_quiz_session
+from app.schemas.quiz import QuizAnswerSubmit
+from app.services.quiz import (
+    MemoryQuizSessionStore,
+    PaperChoice,
+    PaperProblem,
+    QuizPaper,
+    QuizSessionState,
+    SqliteQuizSessionStore,
+    _unflushed,
+    finalize_session,
+    flush_answers,
+    pinned_papers,
+)
+from tests.api.mock_db import mock_async_session
+
+
+@pytest.fixture
+def mock_user():
+    """モックユーザー"""
+    user = MagicMock()
+    user.id = UUID("123e4567-e89b-12d3-a456-426614174000")
+    user.role = "student"
+    user.is_active = True
+    return user
+
+
+@pytest.fixture
+def mock_db():
+    """モックデータベースセッション"""
+    return mock_async_session()
+
+
+@pytest.fixture
+def paper():
+    """2問・各3択の問題セット"""
+    problems = []
+    choice_index = {}
+    for p in range(2):
+        choices = []
+        for c in range(3):
+            choice_id = UUID(f"00000000-0000-0000-0000-0000000{p}{c}000")
+            choices.append(PaperChoice(choice_id, f"choice {p}-{c}", c == 0))
+            choice_index[choice_id] = (p, c)
+        problems.append(PaperProblem(
+            id=UUID(f"00000000-0000-0000-0000-00000000000{p}"),
+            title=f"problem {p}",
+            problem_text="\\int x dx",
+            choices=tuple(choices),
+        ))
+    return QuizPaper(
+        quiz_set_id=UUID("00000000-0000-0000-0000-00000000aaaa"),
+        title="小テスト",
+        time_limit_seconds=600,
+        shuffle_choices=True,
+        problems=tuple(problems),
+        choice_index=choice_index,
+        version="v1",
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_quiz_caches():
+    yield
+    pinned_papers.clear()
+    _unflushed.clear()
+
+
+@pytest.fixture
+def state(mock_user, paper):
+    """受験中のセッション状態"""
+    return QuizSessionState(
+        session_id="00000000-0000-0000-0000-00000000bbbb",
+        user_id=str(mock_user.id),
+        quiz_set_id=str(paper.quiz_set_id),
+        seed=42,
+        expires_at=time.time() + 600,
+        answers=bytearray(len(paper.problems)),
+        paper_version=paper.version,
+    )
+
+
+@pytest.fixture
+def session_row(mock_db, state):
+    """ロックして読むセッション行"""
+    row = MagicMock()
+    row.id = UUID(state.session_id)
+    row.user_id = UUID(state.user_id)
+    row.quiz_set_id = UUID(state.quiz_set_id)
+    row.status = "active"
+    row.answers = {}
+    mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = row
+    return row
+
+
+def test_choice_order_is_reproducible_from_seed(paper):
+    """同じシードからは同じ選択肢の提示順が復元される"""
+    assert paper.choice_order(7) == paper.choice_order(7)
+    for order in paper.choice_order(7):
+        assert sorted(order) == [0, 1, 2]
+
+
+@pytest.mark.parametrize("store_factory", [
+    lambda tmp_path: MemoryQuizSessionStore(),
+    lambda tmp_path: SqliteQuizSessionStore(str(tmp_path / "sessions.sqlite3")),
+])
+def test_session_store_roundtrip(tmp_path, state, store_factory):
+    """セッションストアに保存した状態を取得・失効判定・削除できる"""
+    store = store_factory(tmp_path)
+    state.answers[1] = 3
+    store.put(state)
+
+    loaded = store.get(state.session_id)
+    assert loaded.answers == bytearray([0, 3])
+    assert loaded.paper_version == state.paper_version
+    assert loaded.answered == 1
+    assert loaded.total == 2
+    assert list(store.expired(time.time())) == []
+    assert [s.session_id for s in store.expired(state.expires_at + 1)] == [state.session_id]
+
+    store.delete(state.session_id)
+    assert store.get(state.session_id) is None
+
+
+def test_answer_quiz_problem(mock_db, mock_user, paper, state):
+    """回答はデータベースに書き込まずセッション状態に記録されることをテスト"""
+    problem, choice = paper.problems[1], paper.problems[1].choices[2]
+    answer_in = QuizAnswerSubmit(problem_id=problem.id, choice_id=choice.id)
+    store = MemoryQuizSessionStore()
+    store.put(state)
+
+    with patch("app.services.quiz.session_store", store), \
+            patch("app.services.quiz.get_quiz_paper", return_value=paper):
+        result = asyncio.run(answer_quiz_problem(state.session_id, answer_in, mock_db, mock_user))
+
+    assert result.answered == 1
+    assert result.total == 2
+    assert result.status == "active"
+    assert store.get(state.session_id).answers == bytearray([0, 3])
+    assert state.session_id in _unflushed
+    mock_db.query.assert_not_called()
+    mock_db.commit.assert_not_called()
+
+
+def test_flush_answers(mock_db, paper, state):
+    """記録した回答が選択肢IDの控えとしてまとめて書き戻されることをテスト"""
+    state.answers[0] = 2
+    store = MemoryQuizSessionStore()
+    store.put(state)
+    pinned_papers.set(paper.version, paper)
+    _unflushed.add(state.session_id)
+
+    with patch("app.services.quiz.session_store", store):
+        assert flush_answers(mock_db) == 1
+
+    params = mock_db.execute.call_args.args[1]
+    assert params == [{
+        "session_id": UUID(state.session_id),
+        "recorded": {str(paper.problems[0].id): str(paper.problems[0].choices[1].id)},
+    }]
+    mock_db.commit.assert_called_once()
+    assert not _unflushed
+
+
+def test_session_state_restored_from_row(mock_db, mock_user, paper, state):
+    """ストアにないセッションは行に記録した回答から復元されることをテスト"""
+    row = MagicMock()
+    row.id = UUID(state.session_id)
+    row.user_id = mock_user.id
+    row.quiz_set_id = paper.quiz_set_id
+    row.seed = 42
+    row.expires_at = datetime.utcnow() + timedelta(minutes=5)
+    row.status = "active"
+    row.answers = {str(paper.problems[1].id): str(paper.problems[1].choices[2].id)}
+    mock_db.query.return_value.filter.return_value.first.return_value = row
+
+    with patch("app.services.quiz.session_store", MemoryQuizSessionStore()), \
+            patch("app.services.quiz.get_quiz_paper", return_value=paper):
+        result = asyncio.run(read_quiz_session(state.session_id, mock_db, mock_user))
+
+    assert result.answered == 1
+    assert result.total == 2
+
+
+def test_finalize_grades_session_answers(mock_db, paper, state, session_row):
+    """開始時の版の問題セットで採点し、回答のスナップショットを書き込むことをテスト"""
+    right = paper.problems[0].choices[0]
+    wrong = paper.problems[1].choices[1]
+    state.answers[:] = bytes([1, 2])
+    pinned_papers.set(paper.version, paper)
+    store = MemoryQuizSessionStore()
+    store.put(state)
+
+    with patch("app.services.quiz.session_store", store), \
+            patch("app.services.quiz.update_ratings") as mock_ratings:
+        row = finalize_session(mock_db, state)
+
+    assert row is session_row
+    assert row.status == "submitted"
+    assert row.score == 1
+    assert row.answers == {
+        str(paper.problems[0].id): str(right.id),
+        str(paper.problems[1].id): str(wrong.id),
+    }
+    mock_ratings.assert_called_once_with(
+        mock_db, session_row.user_id, [(paper.problems[0].id, True), (paper.problems[1].id, False)]
+    )
+    assert store.get(state.session_id) is None
+
+
+def test_finalize_after_paper_changed(mock_db, paper, state, session_row):
+    """開始時の版がなければ、書き戻した回答の控えを現在の問題セットに対応させることをテスト"""
+    state.paper_version = "v0"
+    state.answers[:] = bytes([3, 3])
+    right = paper.problems[1].choices[0]
+    mock_db.query.return_value.filter.return_value.scalar.return_value = {
+        str(paper.problems[1].id): str(right.id),
+        # 受験中に削除された選択肢
+        str(paper.problems[0].id): "00000000-0000-0000-0000-0000000000ff",
+    }
+    store = MemoryQuizSessionStore()
+    store.put(state)
+
+    with patch("app.services.quiz.session_store", store), \
+            patch("app.services.quiz.get_quiz_paper", return_value=paper), \
+            patch("app.services.quiz.update_ratings") as mock_ratings:
+        row = finalize_session(mock_db, state)
+
+    assert row.score == 1
+    assert row.answers == {str(paper.problems[1].id): str(right.id)}
+    mock_ratings.assert_called_once_with(mock_db, session_row.user_id, [(paper.problems[1].id, True)])
+
+
+def test_finalize_deleted_session(mock_db, mock_user, state):
+    """問題セットとともに削除されたセッションの提出は404になることをテスト"""
+    mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = None
+    store = MemoryQuizSessionStore()
+    store.put(state)
+
+    with patch("app.services.quiz.session_store", store):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(submit_quiz_session(state.session_id, mock_db, mock_user))
+
+    assert exc_info.value.status_code == 404
+    assert store.get(state.session_id) is None
+
+
+def test_answer_quiz_problem_invalid_choice(mock_db, mock_user, paper, state):
+    """別の問題の選択肢で回答するとエラーになることをテスト"""
+    answer_in = QuizAnswerSubmit(problem_id=paper.problems[0].id, choice_id=paper.problems[1].choices[0].id)
+    store = MemoryQuizSessionStore()
+    store.put(state)
+
+    with patch("app.services.quiz.session_store", store), \
+            patch("app.services.quiz.get_quiz_paper", return_value=paper):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(answer_quiz_problem(state.session_id, answer_in, mock_db, mock_user))
+
+    assert exc_info.value.status_code == 400
+
+
+def test_answer_quiz_problem_after_deadline(mock_db, mock_user, paper, state):
+    """制限時間を過ぎた回答はセッションを確定して拒否されることをテスト"""
+    state.expires_at = time.time() - 3600
+    answer_in = QuizAnswerSubmit(problem_id=paper.problems[0].id, choice_id=paper.problems[0].choices[0].id)
+    store = MemoryQuizSessionStore()
+    store.put(state)
+
+    with patch("app.services.quiz.session_store", store), \
+            patch("app.services.quiz.finalize_session") as mock_finalize:
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(answer_quiz_problem(state.session_id, answer_in, mock_db, mock_user))
+
+    assert exc_info.value.status_code == 409
+    mock_finalize.assert_called_once_with(mock_db, state, status="expired")
+
+
+def test_read_quiz_session_of_other_user(mock_db, mock_user, state):
+    """他人のセッションは取得できないことをテスト"""
+    state.user_id = "123e4567-e89b-12d3-a456-426614174999"
+    store = MemoryQuizSessionStore()
+    store.put(state)
+
+    with patch("app.services.quiz.session_store", store):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(read_quiz_session(state.session_id, mock_db, mock_user))
+
+    assert exc_info.value.status_code == 404
+
+
+def test_submit_quiz_session(mock_db, mock_user, state):
+    """提出すると一括確定されスコアが返ることをテスト"""
+    store = MemoryQuizSessionStore()
+    store.put(state)
+
+    def finalize(db, s, status):
+        s.status = status
+        row = MagicMock()
+        row.score = 1
+        return row
+
+    with patch("app.services.quiz.session_store", store), \
+            patch("app.api.v1.endpoints.quizzes.finalize_session", side_effect=finalize):
+        result = asyncio.run(submit_quiz_session(state.session_id, mock_db, mock_user))
+
+    assert result.status == "submitted"
+    assert result.score == 1
+    assert result.remaining_seconds == 0
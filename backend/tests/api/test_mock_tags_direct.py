@@ -1,6 +1,7 @@
 """
 データベースに依存しないタグエンドポイントの直接テスト
 """
+import asyncio
 import pytest
 from unittest.mock import patch, MagicMock
 from datetime import datetime
@@ -11,6 +12,7 @@ from fastapi import status, HTTPException
 
 from app.api.v1.endpoints.tags import read_tags, create_tag, read_tag, update_tag, delete_tag
 from app.schemas.tag import TagCreate, TagUpdate
+from tests.api.mock_db import mock_async_session
 
 
 @pytest.fixture
@@ -65,27 +67,111 @@ def mock_tag():
 @pytest.fixture
 def mock_db():
     """モックデータベースセッション"""
-    return MagicMock()
+    return mock_async_session()
 
 
-def test_read_tags(mock_db, mock_student_user, mock_tag):
-    """タグ一覧を取得できることをテスト"""
-    # タグ一覧のモック
-    mock_db.query.return_value.offset.return_value.limit.return_value.all.return_value = [mock_tag]
+@pytest.fixture
+def tag_cache():
+    """タグ一覧のキャッシュを空にして使う"""
+    from app.services.tag import tag_cache
+    tag_cache.clear()
+    yield tag_cache
+    tag_cache.clear()
+
+
+def _grouped_rows(mock_db, rows):
+    """タグ一覧の集計クエリ (タグ × 難易度ごとの件数) の結果を設定する"""
+    query = mock_db.query.return_value.outerjoin.return_value.outerjoin.return_value.group_by.return_value
+    query.all.return_value = rows
+    return query
+
+
+def test_read_tags(mock_db, mock_student_user, mock_tag, tag_cache):
+    """タグ一覧を問題数と難易度別の内訳つきで取得できることをテスト"""
+    # 1つのタグに難易度2の問題が3問、難易度4の問題が1問
+    _grouped_rows(mock_db, [
+        (mock_tag.id, mock_tag.name, mock_tag.description, mock_tag.created_by, 2, 3),
+        (mock_tag.id, mock_tag.name, mock_tag.description, mock_tag.created_by, 4, 1),
+    ])
     
     # エンドポイント関数を直接呼び出し
-    result = read_tags(0, 100, mock_db, mock_student_user)
+    result = asyncio.run(read_tags(0, 100, mock_db, mock_student_user))
     
     # 結果の検証
     assert isinstance(result, list)
     assert len(result) == 1
     tag = result[0]
-    assert hasattr(tag, "id")
-    assert hasattr(tag, "name")
-    assert hasattr(tag, "description")
-    assert hasattr(tag, "created_by")
-    assert tag.name == "微分積分学"
-    assert tag.description == "微分と積分に関する問題"
+    assert tag["id"] == str(mock_tag.id)
+    assert tag["name"] == "微分積分学"
+    assert tag["description"] == "微分と積分に関する問題"
+    assert tag["created_by"] == str(mock_tag.created_by)
+    assert tag["problem_count"] == 4
+    assert tag["by_difficulty"] == {"2": 3, "4": 1}
+
+
+def test_read_tags_sorted_by_popularity(mock_db, mock_student_user, tag_cache):
+    """問題数の多い順・名前順に並べ替えられることをテスト"""
+    teacher = UUID("123e4567-e89b-12d3-a456-426614174001")
+    _grouped_rows(mock_db, [
+        (UUID(int=1), "線形代数", None, teacher, 3, 2),
+        (UUID(int=2), "確率論", None, teacher, 3, 5),
+        # 問題のないタグ (外部結合で難易度は None、件数は 0)
+        (UUID(int=3), "群論", None, teacher, None, 0),
+    ])
+    
+    popular = asyncio.run(read_tags(0, 100, mock_db, mock_student_user, sort="popularity"))
+    assert [tag["name"] for tag in popular] == ["確率論", "線形代数", "群論"]
+    assert popular[2]["problem_count"] == 0
+    assert popular[2]["by_difficulty"] == {}
+    
+    by_name = asyncio.run(read_tags(0, 2, mock_db, mock_student_user, sort="name"))
+    assert [tag["name"] for tag in by_name] == sorted(["線形代数", "確率論", "群論"])[:2]
+
+
+def test_read_tags_cached_until_invalidated(mock_db, mock_student_user, mock_tag, tag_cache):
+    """タグ一覧はキャッシュされ、問題・タグの変更の通知で破棄されることをテスト"""
+    from app.services.invalidation import invalidation_bus
+
+    query = _grouped_rows(mock_db, [
+        (mock_tag.id, mock_tag.name, mock_tag.description, mock_tag.created_by, 3, 1),
+    ])
+    asyncio.run(read_tags(0, 100, mock_db, mock_student_user))
+    asyncio.run(read_tags(0, 100, mock_db, mock_student_user))
+    assert query.all.call_count == 1
+    
+    # 問題の追加で件数が変わる
+    query.all.return_value = [
+        (mock_tag.id, mock_tag.name, mock_tag.description, mock_tag.created_by, 3, 2),
+    ]
+    invalidation_bus.apply_local({"problem": {str(UUID(int=9))}})
+    result = asyncio.run(read_tags(0, 100, mock_db, mock_student_user))
+    assert query.all.call_count == 2
+    assert result[0]["problem_count"] == 2
+    
+    invalidation_bus.apply_local({"tag": {str(mock_tag.id)}})
+    asyncio.run(read_tags(0, 100, mock_db, mock_student_user))
+    assert query.all.call_count == 3
+
+
+def test_read_tags_not_cached_when_invalidated_while_loading(mock_db, mock_student_user, mock_tag, tag_cache):
+    """読み込み中に無効化が届いた一覧はキャッシュしないことをテスト"""
+    from app.services.invalidation import invalidation_bus
+
+    query = _grouped_rows(mock_db, [])
+    rows = [(mock_tag.id, mock_tag.name, mock_tag.description, mock_tag.created_by, 3, 1)]
+
+    def load_then_invalidate():
+        invalidation_bus.apply_local({"problem": {str(UUID(int=9))}})
+        return rows
+
+    query.all.side_effect = load_then_invalidate
+    asyncio.run(read_tags(0, 100, mock_db, mock_student_user))
+    assert tag_cache.get("name") is None
+
+    query.all.side_effect = None
+    query.all.return_value = rows
+    asyncio.run(read_tags(0, 100, mock_db, mock_student_user))
+    assert tag_cache.get("name") is not None
 
 
 def test_create_tag(mock_db, mock_teacher_user):
@@ -116,7 +202,7 @@ def test_create_tag(mock_db, mock_teacher_user):
     mock_db.refresh.side_effect = mock_refresh
     
     # エンドポイント関数を直接呼び出し
-    result = create_tag(tag_in, mock_db, mock_teacher_user)
+    result = asyncio.run(create_tag(tag_in, mock_db, mock_teacher_user))
     
     # add、commitが呼ばれたことを確認
     mock_db.add.assert_called_once()
@@ -145,7 +231,7 @@ def test_create_duplicate_tag(mock_db, mock_teacher_user, mock_tag):
     
     # エンドポイント関数を呼び出すと例外が発生
     with pytest.raises(HTTPException) as exc_info:
-        create_tag(tag_in, mock_db, mock_teacher_user)
+        asyncio.run(create_tag(tag_in, mock_db, mock_teacher_user))
     
     # 例外の詳細をチェック
     assert exc_info.value.status_code == 400
@@ -158,7 +244,7 @@ def test_read_tag(mock_db, mock_student_user, mock_tag):
     mock_db.query.return_value.filter.return_value.first.return_value = mock_tag
     
     # エンドポイント関数を直接呼び出し
-    result = read_tag(str(mock_tag.id), mock_db, mock_student_user)
+    result = asyncio.run(read_tag(str(mock_tag.id), mock_db, mock_student_user))
     
     # 結果の検証
     assert hasattr(result, "id")
@@ -176,7 +262,7 @@ def test_read_tag_not_found(mock_db, mock_student_user, mock_uuid):
     
     # エンドポイント関数を呼び出すと例外が発生
     with pytest.raises(HTTPException) as exc_info:
-        read_tag(mock_uuid, mock_db, mock_student_user)
+        asyncio.run(read_tag(mock_uuid, mock_db, mock_student_user))
     
     # 例外の詳細をチェック
     assert exc_info.value.status_code == 404
@@ -194,7 +280,7 @@ def test_update_tag(mock_db, mock_teacher_user, mock_tag):
     mock_db.query.return_value.filter.return_value.first.return_value = mock_tag
     
     # エンドポイント関数を直接呼び出し
-    result = update_tag(str(mock_tag.id), tag_in, mock_db, mock_teacher_user)
+    result = asyncio.run(update_tag(str(mock_tag.id), tag_in, mock_db, mock_teacher_user))
     
     # add、commitが呼ばれたことを確認
     mock_db.add.assert_called_once_with(mock_tag)
@@ -218,7 +304,7 @@ def test_update_tag_not_found(mock_db, mock_teacher_user, mock_uuid):
     
     # エンドポイント関数を呼び出すと例外が発生
     with pytest.raises(HTTPException) as exc_info:
-        update_tag(mock_uuid, tag_in, mock_db, mock_teacher_user)
+        asyncio.run(update_tag(mock_uuid, tag_in, mock_db, mock_teacher_user))
     
     # 例外の詳細をチェック
     assert exc_info.value.status_code == 404
@@ -245,7 +331,7 @@ def test_update_tag_name_conflict(mock_db, mock_teacher_user, mock_tag):
     
     # エンドポイント関数を呼び出すと例外が発生
     with pytest.raises(HTTPException) as exc_info:
-        update_tag(str(mock_tag.id), tag_in, mock_db, mock_teacher_user)
+        asyncio.run(update_tag(str(mock_tag.id), tag_in, mock_db, mock_teacher_user))
     
     # 例外の詳細をチェック
     assert exc_info.value.status_code == 400
@@ -258,7 +344,7 @@ def test_delete_tag(mock_db, mock_teacher_user, mock_tag):
     mock_db.query.return_value.filter.return_value.first.return_value = mock_tag
     
     # エンドポイント関数を直接呼び出し
-    result = delete_tag(str(mock_tag.id), mock_db, mock_teacher_user)
+    result = asyncio.run(delete_tag(str(mock_tag.id), mock_db, mock_teacher_user))
     
     # delete、commitが呼ばれたことを確認
     mock_db.delete.assert_called_once_with(mock_tag)
@@ -275,7 +361,7 @@ def test_delete_tag_not_found(mock_db, mock_teacher_user, mock_uuid):
     
     # エンドポイント関数を呼び出すと例外が発生
     with pytest.raises(HTTPException) as exc_info:
-        delete_tag(mock_uuid, mock_db, mock_teacher_user)
+        asyncio.run(delete_tag(mock_uuid, mock_db, mock_teacher_user))
     
     # 例外の詳細をチェック
     assert exc_info.value.status_code == 404
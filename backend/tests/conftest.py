@@ -10,10 +10,32 @@ from fastapi.testclient import TestClient
 # モジュールパスの追加
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from app.main import app
+# テストの実行でスロークエリログのディレクトリ (logs/) を作らない
+os.environ.setdefault("SLOW_QUERY_LOG_PATH", "")
+
+from app.main import create_app
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """データベースに接続しないアプリケーション
+
+    ライフスパンは実際に通すが、接続プールのウォームアップとキャッシュの
+    読み込み、バックグラウンドタスクは止める。
+    """
+    async def warm_up_pool():
+        return 0
+
+    monkeypatch.setattr("app.core.warmup.warm_up_pool", warm_up_pool)
+    monkeypatch.setattr("app.core.warmup.prefill_caches", lambda: {})
+    monkeypatch.setattr(
+        "app.main.start_background_tasks", lambda app: setattr(app.state, "background_tasks", [])
+    )
+    return create_app()
+
 
 @pytest.fixture
-def client():
+def client(app):
     """シンプルなテストクライアント"""
     with TestClient(app) as c:
         yield c
\ No newline at end of file
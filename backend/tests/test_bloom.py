@@ -0,0 +1,24 @@
+import uuid
+
+from app.core.bloom import BloomFilter
+
+
+def test_no_false_negatives():
+    """登録した要素は必ず含まれると判定される"""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    # 偽陽性があると件数が変わるため、結果が固定される要素を使う
+    items = [str(uuid.UUID(int=i)) for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    assert len(bloom) == 1000
+
+
+def test_false_positive_rate_within_bound():
+    """想定件数まで登録しても偽陽性率は指定値の数倍以内に収まる"""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for _ in range(1000):
+        bloom.add(str(uuid.uuid4()))
+    trials = 20000
+    false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(trials))
+    assert false_positives / trials < 0.03
@@ -0,0 +1,75 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core import compression
+from app.core.compression import CompressionMiddleware, negotiate_encoding
+
+PAYLOAD = {"items": [{"problem_text": "\\int_0^1 x^2 \\, dx = \\frac{1}{3}"}] * 100}
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate, br", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("gzip, br;q=0.5", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("br;q=0, *", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("identity", ["br", "gzip"]) is None
+    assert negotiate_encoding("", ["gzip"]) is None
+
+
+@pytest.fixture
+def client():
+    app = FastAPI(default_response_class=ORJSONResponse)
+
+    @app.get("/large")
+    def large():
+        return PAYLOAD
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b"line %d\n" % i for i in range(1000)), media_type="text/plain")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=500, encodings=["gzip"])
+    return TestClient(app)
+
+
+def test_compresses_large_json(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json() == PAYLOAD
+
+
+def test_skips_small_and_unaccepted(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"ok": True}
+
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == PAYLOAD
+
+
+def test_compresses_streaming_response(client):
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(raw) == b"".join(b"line %d\n" % i for i in range(1000))
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+def test_brotli_preferred_when_available():
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.get("/large")(lambda: PAYLOAD)
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    response = TestClient(app).get("/large", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == PAYLOAD
@@ -0,0 +1,43 @@
+import sqlite3
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.core.config import settings
+from app.db.base import set_statement_timeout
+from app.db.pool import InstrumentedQueuePool, pool_status
+
+
+def test_pool_status_counts_checkouts_and_timeouts():
+    """チェックアウト数・オーバーフロー・待ち時間を集計する"""
+    pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=1, timeout=0.01)
+    first = pool.connect()
+    second = pool.connect()
+    with pytest.raises(PoolTimeoutError):
+        pool.connect()
+
+    status = pool_status(pool)
+    assert status["checked_out"] == 2
+    assert status["overflow"] == 1
+    assert status["checkouts"] == 2
+    assert status["timeouts"] == 1
+    assert status["wait_max_ms"] >= 10
+
+    first.close()
+    second.close()
+    # dispose() で作り直したプールにも累計を引き継ぐ
+    assert pool.recreate().wait_stats is pool.wait_stats
+
+
+def test_set_statement_timeout_by_role(monkeypatch):
+    """ロールごとの設定があればそれを、なければ既定値を使う"""
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 30000)
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_BY_ROLE", {"student": 5000})
+    db = MagicMock()
+    db.info = {}
+
+    set_statement_timeout(db, "student")
+    assert db.info["statement_timeout_ms"] == 5000
+    set_statement_timeout(db, "teacher")
+    assert db.info["statement_timeout_ms"] == 30000
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.core.hashing import PasswordHasher, PasswordHasherBusy
+
+
+def test_hash_and_verify_inline():
+    """ワーカー数0では呼び出し元のスレッドで計算する"""
+    hasher = PasswordHasher(workers=0, max_pending=4, rounds=4)
+    hashed = hasher.hash("secret")
+    assert hasher.verify("secret", hashed)
+    assert not hasher.verify("wrong", hashed)
+
+
+def test_verify_and_update_rehashes_outdated_parameters():
+    """rounds が設定と異なるハッシュは照合時に再計算したハッシュを返す"""
+    old = PasswordHasher(workers=0, max_pending=4, rounds=4).hash("secret")
+    hasher = PasswordHasher(workers=0, max_pending=4, rounds=5)
+
+    verified, new_hash = hasher.verify_and_update("secret", old)
+    assert verified
+    assert new_hash.startswith("$2b$05$")
+    assert hasher.verify_and_update("secret", new_hash) == (True, None)
+
+
+def test_rejects_when_queue_is_full():
+    """待ち行列が満杯の場合は待たずに拒否する"""
+    hasher = PasswordHasher(workers=0, max_pending=1, rounds=4)
+    hasher._slots.acquire()
+    try:
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash("secret")
+    finally:
+        hasher._slots.release()
+    assert hasher.hash("secret")
+
+
+def test_process_pool():
+    """プロセスプールでの計算結果も照合できる"""
+    hasher = PasswordHasher(workers=1, max_pending=2, rounds=4)
+    try:
+        assert hasher.verify("secret", hasher.hash("secret"))
+    finally:
+        hasher.shutdown()
+
+
+def test_async_hash_and_verify():
+    """非同期版でもプロセスプールで計算し、結果を照合できる"""
+    hasher = PasswordHasher(workers=1, max_pending=2, rounds=4)
+
+    async def run():
+        hashed = await hasher.hash_async("secret")
+        return await hasher.verify_and_update_async("secret", hashed)
+
+    try:
+        assert asyncio.run(run()) == (True, None)
+    finally:
+        hasher.shutdown()
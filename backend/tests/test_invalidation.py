@@ -0,0 +1,65 @@
+import json
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.services import invalidation
+from app.services.invalidation import MAX_PAYLOAD_BYTES, InvalidationBus, notify, origin
+
+
+def _bus(calls):
+    def resync():
+        calls.append(("resync", None))
+
+    bus = InvalidationBus("test")
+    bus.subscribe("user", lambda keys: calls.append(("user", keys)), resync)
+    bus.subscribe("problem", lambda keys: calls.append(("shared", keys)), resync, per_host=True)
+    return bus
+
+
+def test_receive_batches_and_skips_own_messages():
+    calls = []
+    bus = _bus(calls)
+    other_worker = f"{invalidation.HOST}:1"
+    other_host = "elsewhere:1"
+    bus.receive([
+        json.dumps({"o": origin(), "m": {"user": ["mine"]}}),
+        json.dumps({"o": other_worker, "m": {"user": ["a"], "problem": ["p1"]}}),
+        json.dumps({"o": other_worker, "m": {"user": ["b"]}}),
+        json.dumps({"o": other_host, "m": {"problem": ["p2"]}}),
+        "not json",
+    ])
+    # 同じホストからの通知では共有メモリの処理を呼ばない
+    assert ("user", {"a", "b"}) in calls
+    assert ("shared", {"p2"}) in calls
+    assert not any(keys and ("mine" in keys or "p1" in keys) for _, keys in calls)
+
+
+def test_oversized_payload_requests_resync():
+    calls = []
+    bus = _bus(calls)
+    payload = bus.payload({"user": {str(i) * 40 for i in range(1000)}})
+    assert len(payload) < MAX_PAYLOAD_BYTES
+    bus.receive([payload.replace(origin(), "elsewhere:1")])
+    # 同じ処理は1回だけ呼ぶ
+    assert calls == [("resync", None)]
+
+
+def test_commit_applies_locally_and_rollback_discards(monkeypatch):
+    calls = []
+    monkeypatch.setattr(invalidation, "invalidation_bus", _bus(calls))
+    engine = create_engine("sqlite://")
+
+    with Session(engine) as db:
+        db.execute(text("SELECT 1"))
+        notify(db, "user", "u1")
+        db.rollback()
+        db.commit()
+        assert calls == []
+
+        notify(db, "user", "u2")
+        notify(db, "problem", "p1")
+        db.commit()
+    assert ("user", {"u2"}) in calls
+    # このワーカーでの変更はホスト内の共有状態にも反映する
+    assert ("shared", {"p1"}) in calls
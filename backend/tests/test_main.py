@@ -1,10 +1,27 @@
+import pytest
 from fastapi.testclient import TestClient
-from app.main import app
 
 
-def test_read_root():
+def test_read_root(app):
     """Test the root endpoint."""
     with TestClient(app) as client:
         response = client.get("/")
         assert response.status_code == 200
-        assert response.json() == {"message": "Welcome to the Math LMS API"}
\ No newline at end of file
+        assert response.json() == {"message": "Welcome to the Math LMS API"}
+
+def test_ready_after_warm_up(app):
+    """Readiness flips only while the app is started."""
+    assert not getattr(app.state, "ready", False)
+    with TestClient(app) as client:
+        response = client.get("/health/ready")
+        assert response.status_code == 200
+        assert set(response.json()["warmup"]) >= {"configure_mappers", "connection_pool", "schemas"}
+    assert app.state.ready is False
+
+
+@pytest.mark.parametrize("path", ["/health/db", "/metrics"])
+def test_operational_endpoints_require_authentication(app, path):
+    """Pool, replica and route details are not public."""
+    with TestClient(app) as client:
+        response = client.get(path)
+        assert response.status_code == 401
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app.core import metrics
+from app.core.metrics import Counter, Histogram, MetricsMiddleware, Registry
+from app.db.pool import InstrumentedQueuePool, pool_metrics
+
+
+def test_render_text_format():
+    registry = Registry()
+    counter = registry.register(Counter("requests_total", "Requests", ("route",)))
+    histogram = registry.register(Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1)))
+    counter.inc(('/a"b',))
+    histogram.observe(0.05, ("/a",))
+    histogram.observe(0.5, ("/a",))
+    histogram.observe(5, ("/a",))
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/a\\"b"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{route="/a"} 5.55' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+
+
+def test_render_adds_worker_label():
+    """複数ワーカーの系列を区別できるよう、すべてのサンプルにプロセスIDを付ける"""
+    registry = Registry(worker_label=True)
+    counter = registry.register(Counter("requests_total", "Requests", ("route",)))
+    counter.inc(("/a",))
+    registry.add_collector(lambda: [("pool_size", "gauge", "Pool size", [({"pool": "api"}, 5)])])
+
+    lines = registry.render().splitlines()
+    worker = str(os.getpid())
+    assert f'requests_total{{worker="{worker}",route="/a"}} 1' in lines
+    assert f'pool_size{{worker="{worker}",pool="api"}} 5' in lines
+
+
+@pytest.fixture
+def client():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        with engine.connect() as conn:
+            for _ in range(item_id):
+                conn.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    @app.get("/fail")
+    def fail():
+        raise HTTPException(status_code=503)
+
+    app.add_middleware(MetricsMiddleware, server_timing=True, repeat_threshold=5)
+    return TestClient(app)
+
+
+def test_counts_queries_per_route(client):
+    before = metrics.db_queries.value(("GET", "/items/{item_id}"))
+    response = client.get("/items/3")
+
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert 'desc="3 queries"' in response.headers["server-timing"]
+    assert metrics.db_queries.value(("GET", "/items/{item_id}")) == before + 3
+    assert metrics.http_requests.value(("GET", "/items/{item_id}", "200")) >= 1
+
+
+def test_flags_repeated_statements(client, caplog):
+    before = metrics.db_repeated_queries.value(("GET", "/items/{item_id}"))
+    client.get("/items/4")
+    assert metrics.db_repeated_queries.value(("GET", "/items/{item_id}")) == before
+
+    with caplog.at_level("WARNING", logger="app.core.metrics"):
+        client.get("/items/6")
+    assert metrics.db_repeated_queries.value(("GET", "/items/{item_id}")) == before + 1
+    assert "Suspected N+1 queries on GET /items/{item_id}: executed 6 times" in caplog.text
+
+
+def test_records_errors_and_unmatched_routes(client):
+    client.get("/fail")
+    client.get("/nowhere")
+    assert metrics.http_requests.value(("GET", "/fail", "503")) >= 1
+    assert metrics.http_requests.value(("GET", "unmatched", "404")) >= 1
+
+
+def test_pool_metrics():
+    engine = create_engine("sqlite://", poolclass=InstrumentedQueuePool, pool_size=2)
+    with engine.connect():
+        families = {name: samples for name, _, _, samples in pool_metrics({"api": engine.pool})}
+    assert families["db_pool_size"] == [({"pool": "api"}, 2)]
+    assert families["db_pool_checked_out"] == [({"pool": "api"}, 1)]
+    assert families["db_pool_checkouts_total"] == [({"pool": "api"}, 1)]
@@ -0,0 +1,32 @@
+from datetime import date
+
+from app.db.partitioning import (
+    add_months,
+    create_partition_sql,
+    is_partition_table,
+    month_start,
+    partition_name,
+)
+
+
+def test_add_months_crosses_year_boundaries():
+    """月の加減算で年をまたいでも月初を返す"""
+    assert add_months(date(2023, 11, 1), 2) == date(2024, 1, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert month_start(date(2024, 2, 29)) == date(2024, 2, 1)
+
+
+def test_partition_sql_covers_one_month():
+    """パーティションは月初から翌月初までの範囲で作成される"""
+    start = date(2023, 12, 1)
+    assert partition_name(start) == "user_answers_p2023_12"
+    sql = create_partition_sql(start)
+    assert "PARTITION OF user_answers" in sql
+    assert "FROM ('2023-12-01') TO ('2024-01-01')" in sql
+
+
+def test_is_partition_table_matches_only_monthly_children():
+    """マイグレーションの自動生成から除外するのは月次パーティションだけ"""
+    assert is_partition_table("user_answers_p2023_12")
+    assert not is_partition_table("user_answers")
+    assert not is_partition_table("user_progress")
@@ -0,0 +1,102 @@
+import json
+import pstats
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.profiling import MemoryTracker, ProfileStore, ProfilingMiddleware, SamplingProfiler, requested_mode
+from app.services.auth import create_access_token
+
+
+def _busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_requested_mode():
+    assert requested_mode({"headers": [(b"x-profile", b"cprofile")]}) == "cprofile"
+    assert requested_mode({"headers": [], "query_string": b"profile=1"}) == "sample"
+    assert requested_mode({"headers": [], "query_string": b"limit=10"}) is None
+    assert requested_mode({"headers": [(b"x-profile", b"bogus")]}) is None
+
+
+def test_sampling_profiler_builds_speedscope_profile():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    _busy(0.05)
+    profiler.stop()
+
+    data = profiler.speedscope("busy")
+    profile = data["profiles"][0]
+    assert profile["type"] == "sampled"
+    assert len(profile["samples"]) == len(profile["weights"]) > 0
+    names = {frame["name"] for frame in data["shared"]["frames"]}
+    assert "_busy" in names
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        _busy(0.02)
+        return {"ok": True}
+
+    store = ProfileStore(str(tmp_path), max_artifacts=2)
+    app.add_middleware(ProfilingMiddleware, store=store, download_path="/profiles/{id}")
+    return TestClient(app), store
+
+
+def _auth(role: str) -> dict:
+    return {"Authorization": "Bearer " + create_access_token({"sub": "u", "role": role})}
+
+
+@pytest.mark.parametrize("mode", ["sample", "cprofile"])
+def test_profiles_teacher_requests(client, mode):
+    client, store = client
+    response = client.get(f"/slow?profile={mode}", headers=_auth("teacher"))
+
+    assert response.status_code == 200
+    artifact_id = response.headers["x-profile-id"]
+    assert response.headers["x-profile-url"] == f"/profiles/{artifact_id}"
+    path = store.find(artifact_id)
+    if mode == "sample":
+        assert json.loads(path.read_text())["profiles"][0]["samples"]
+    else:
+        assert pstats.Stats(str(path)).total_calls > 0
+
+
+def test_ignores_students_and_unflagged_requests(client):
+    client, store = client
+    assert "x-profile-id" not in client.get("/slow", headers={"X-Profile": "sample", **_auth("student")}).headers
+    assert "x-profile-id" not in client.get("/slow", headers=_auth("teacher")).headers
+    assert "x-profile-id" not in client.get("/slow", headers={"X-Profile": "sample"}).headers
+    assert store.list() == []
+
+
+def test_keeps_latest_artifacts(client):
+    client, store = client
+    ids = [client.get("/slow", headers={"X-Profile": "sample", **_auth("teacher")}).headers["x-profile-id"]
+           for _ in range(3)]
+    assert {artifact["id"] for artifact in store.list()} <= set(ids)
+    assert len(store.list()) == 2
+    assert store.find("../../etc/passwd") is None
+
+
+def test_memory_diff():
+    tracker = MemoryTracker(frames=1)
+    assert tracker.diff() is None
+    try:
+        tracker.snapshot()
+        retained = [bytearray(1024) for _ in range(1000)]
+        growth = tracker.diff(limit=5)
+        assert growth[0]["size_diff"] >= 1024 * 1000
+        assert "test_profiling.py" in growth[0]["traceback"][0]
+        del retained
+    finally:
+        tracker.stop()
+    assert not tracker.is_tracing
@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI, Form
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.core.config import settings
+from app.core.rate_limit import (
+    MemoryBucketStore,
+    RateLimiter,
+    RateLimitMiddleware,
+    RateLimitRule,
+    _identity,
+    _token_subjects,
+)
+from app.services.auth import create_access_token
+
+
+def test_parse_rule():
+    rule = RateLimitRule.parse("get /api/v1/problems", "30/60")
+    assert (rule.method, rule.path, rule.capacity, rule.period) == ("GET", "/api/v1/problems", 30, 60.0)
+    assert rule.rate == 0.5
+    with pytest.raises(ValueError):
+        RateLimitRule.parse("/api/v1/problems", "30/60")
+
+
+def test_match_prefers_exact_then_longest_prefix():
+    exact = RateLimitRule.parse("GET /api/v1/problems", "1/1")
+    short = RateLimitRule.parse("* /api/v1/*", "1/1")
+    long = RateLimitRule.parse("GET /api/v1/problems/*", "1/1")
+    limiter = RateLimiter([short, exact, long], MemoryBucketStore())
+
+    assert limiter.match("GET", "/api/v1/problems") is exact
+    assert limiter.match("GET", "/api/v1/problems/123") is long
+    assert limiter.match("POST", "/api/v1/problems/123") is short
+    assert limiter.match("GET", "/") is None
+
+
+def test_bucket_refills_over_time(monkeypatch):
+    """容量を使い切ると拒否し、補充に必要な秒数を返す"""
+    now = [1000.0]
+    monkeypatch.setattr("app.core.rate_limit.time.monotonic", lambda: now[0])
+    store = MemoryBucketStore()
+    rule = RateLimitRule.parse("GET /x", "2/10")
+
+    take = lambda: asyncio.run(store.take("k", rule))
+    assert take() == (True, 0.0)
+    assert take() == (True, 0.0)
+    allowed, retry_after = take()
+    assert not allowed
+    assert retry_after == pytest.approx(5.0)
+
+    now[0] += 5
+    assert take()[0]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/limited")
+    def limited():
+        return {"ok": True}
+
+    limiter = RateLimiter([RateLimitRule.parse("GET /limited", "2/60")], MemoryBucketStore())
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return TestClient(app)
+
+
+def test_middleware_returns_retry_after(client):
+    assert client.get("/limited").status_code == 200
+    assert client.get("/limited").status_code == 200
+    response = client.get("/limited")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+
+
+def test_middleware_keys_buckets_by_user(client):
+    """ユーザーごとに別のバケットを使う"""
+    for _ in range(2):
+        client.get("/limited")
+    token = create_access_token({"sub": "123e4567-e89b-12d3-a456-426614174000", "role": "student"})
+    response = client.get("/limited", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+
+
+def _login_client(ip_spec: str) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/login")
+    def login(username: str = Form(...), password: str = Form(...)):
+        return {"username": username}
+
+    limiter = RateLimiter(
+        [RateLimitRule.parse("POST /login", "1/60")], MemoryBucketStore(), username_routes={"post /login": ip_spec}
+    )
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return TestClient(app)
+
+
+def test_login_is_keyed_on_ip_and_username():
+    """ログインは IP と username の組ごとに数え、本文はそのままアプリに渡す"""
+    client = _login_client("10/60")
+
+    response = client.post("/login", data={"username": "alice", "password": "x"})
+    assert response.status_code == 200
+    assert response.json() == {"username": "alice"}
+    assert client.post("/login", data={"username": "Alice", "password": "x"}).status_code == 429
+    assert client.post("/login", data={"username": "bob", "password": "x"}).status_code == 200
+
+
+def test_login_is_also_limited_per_ip():
+    """username を変えながらの試行は IP ごとのバケットで止める"""
+    client = _login_client("3/60")
+
+    for username in ("alice", "bob", "carol"):
+        assert client.post("/login", data={"username": username, "password": "x"}).status_code == 200
+    assert client.post("/login", data={"username": "dave", "password": "x"}).status_code == 429
+
+
+def _scope(token: str):
+    return {"headers": [(b"authorization", f"Bearer {token}".encode())], "client": ("10.0.0.1", 1234)}
+
+
+def test_refresh_token_is_not_a_user_identity():
+    """リフレッシュトークンではユーザーとして数えない"""
+    _token_subjects.clear()
+    token = jwt.encode(
+        {"sub": "u1", "typ": "refresh", "exp": int(time.time()) + 3600}, settings.SECRET_KEY, algorithm="HS256"
+    )
+    assert _identity(_scope(token)) == "ip:10.0.0.1"
+
+
+def test_token_subject_is_cached_until_expiry(monkeypatch):
+    """トークンの有効期限を過ぎてまでユーザーIDをキャッシュしない"""
+    _token_subjects.clear()
+    token = jwt.encode({"sub": "u1", "exp": int(time.time()) + 10}, settings.SECRET_KEY, algorithm="HS256")
+    assert _identity(_scope(token)) == "user:u1"
+
+    now = time.monotonic()
+    monkeypatch.setattr("app.core.cache.time.monotonic", lambda: now + 11)
+    assert _token_subjects.get(token) is None
@@ -0,0 +1,66 @@
+from uuid import UUID
+
+import pytest
+
+from app.services.rating import RatingIndex, expected_score, target_problem_rating
+
+
+def _pid(n: int) -> UUID:
+    return UUID(int=n)
+
+
+@pytest.fixture
+def index():
+    """レーティング 1000, 1100, ..., 1900 の問題を持つ "calc" タグの索引"""
+    index = RatingIndex()
+    index.load([("calc", _pid(n), 1000.0 + 100 * n) for n in range(10)])
+    return index
+
+
+def test_target_rating_matches_success_rate():
+    """目標レーティングの問題に対する正答率の推定値が指定した値になる"""
+    target = target_problem_rating(1500.0, 0.7)
+    assert target < 1500.0
+    assert expected_score(1500.0, target) == pytest.approx(0.7)
+
+
+def test_select_nearest_problem(index):
+    """目標に最も近いレーティングの問題が選ばれる"""
+    assert index.select("calc", 1420.0) == _pid(4)
+    assert index.select("calc", 5000.0) == _pid(9)
+    assert index.select("unknown", 1420.0) is None
+
+
+def test_select_excludes_recent_problems(index):
+    """最近出題した問題は除外され、すべて除外されると None になる"""
+    assert index.select("calc", 1420.0, exclude=[_pid(4)]) in (_pid(3), _pid(5))
+    assert index.select("calc", 1420.0, exclude=[_pid(n) for n in range(10)]) is None
+
+
+def test_update_rating_is_reflected_in_selection(index):
+    """オンライン更新したレーティングが次の選択に反映される"""
+    index.update_rating(_pid(9), 1405.0)
+    assert index.select("calc", 1410.0) == _pid(9)
+
+
+def test_update_rating_keeps_order(index):
+    """更新した問題は昇順を保つ位置へ移り、ほかの問題の位置も付け直される"""
+    index.update_rating(_pid(2), 1750.0)
+    index.update_rating(_pid(8), 1050.0)
+    bank = index._banks["calc"]
+    assert list(bank.ratings) == sorted(bank.ratings)
+    assert index.select("calc", 1740.0) == _pid(2)
+    index.update_rating(_pid(2), 1210.0)
+    assert list(bank.ratings) == sorted(bank.ratings)
+    assert index.select("calc", 1215.0) == _pid(2)
+    for code, positions in index._positions.items():
+        for tag_name, pos in positions.items():
+            assert index._banks[tag_name].codes[pos] == code
+
+
+def test_invalidate_marks_index_stale(index):
+    """無効化すると索引は作り直しの対象になるが、作り直すまでは引き続き使われる"""
+    assert not index.is_stale
+    index.invalidate()
+    assert index.is_stale
+    assert index.select("calc", 1420.0) == _pid(4)
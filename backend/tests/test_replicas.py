@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from app.db.replicas import ReplicaRouter, has_valid_write_marker, recently_wrote, write_marker
+
+
+@pytest.fixture
+def router():
+    return ReplicaRouter(["sqlite:///replica1.db", "sqlite:///replica2.db"])
+
+
+def test_round_robin_skips_unhealthy_replicas(router):
+    """ラウンドロビンで選び、外れたレプリカは選ばない"""
+    first, second = router.replicas
+    assert [router.choose() for _ in range(4)] == [first, second, first, second]
+
+    router.mark_unhealthy(first)
+    assert [router.choose() for _ in range(3)] == [second, second, second]
+
+
+def test_falls_back_to_primary_when_no_replica_is_healthy(router):
+    """利用できるレプリカがなければ None (プライマリを使う)"""
+    for replica in router.replicas:
+        router.mark_unhealthy(replica)
+    assert router.choose() is None
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        ReplicaRouter([], strategy="random")
+
+
+def test_write_marker_is_bound_to_user_and_expires(monkeypatch):
+    """書き込みの印は本人のものだけが期限内に有効で、改ざんすると無効になる"""
+    marker = write_marker("user-1")
+    assert has_valid_write_marker("user-1", marker)
+    assert recently_wrote("user-1", marker)
+    assert not has_valid_write_marker("user-2", marker)
+    assert not has_valid_write_marker("user-1", "9999999999." + marker.partition(".")[2])
+    assert not has_valid_write_marker("user-1", None)
+
+    monkeypatch.setattr(time, "time", lambda: 2 ** 40)
+    assert not has_valid_write_marker("user-1", marker)
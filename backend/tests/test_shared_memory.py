@@ -0,0 +1,122 @@
+import json
+import struct
+import uuid
+from unittest.mock import Mock
+
+import pytest
+
+from app.core.shared_memory import SharedRegion, SharedRegionFull, find_record, pack_table
+from app.services import catalog as catalog_module
+from app.services.catalog import GRADING_RECORD, SharedCatalog
+
+
+@pytest.fixture
+def region():
+    region = SharedRegion.open(f"test-region-{uuid.uuid4().hex[:8]}", 64 * 1024)
+    yield region
+    region.unlink()
+    region.close()
+
+
+def test_publish_and_read(region):
+    assert region.read(lambda sections: bytes(sections["a"])) is None
+
+    with region.lock():
+        assert region.publish({"a": b"hello", "b": b"world"})
+    assert region.read(lambda sections: bytes(sections["a"]) + bytes(sections["b"])) == b"helloworld"
+
+    # 別のプロセスと同じく名前で接続すると同じ内容が見える
+    other = SharedRegion.open(region.name, region.size)
+    assert not other.created
+    assert other.read(lambda sections: bytes(sections["b"])) == b"world"
+    other.close()
+
+    with pytest.raises(SharedRegionFull):
+        region.publish({"a": bytes(region.size)})
+
+
+def test_invalidation_during_rebuild_keeps_snapshot_stale(region):
+    with region.lock():
+        region.publish({"a": b"v1"})
+    region.mark_stale()
+    assert region.status()["state"] == "stale"
+    assert region.read(lambda sections: bytes(sections["a"])) is None
+
+    # 作り直しを始めた後に無効化された
+    invalidations = region.invalidations
+    region.mark_stale()
+    with region.lock():
+        assert not region.publish({"a": b"v2"}, invalidations=invalidations)
+    assert region.read(lambda sections: bytes(sections["a"])) is None
+
+    with region.lock():
+        assert region.publish({"a": b"v3"}, invalidations=region.invalidations)
+    assert region.read(lambda sections: bytes(sections["a"])) == b"v3"
+
+
+def test_lock_is_exclusive_across_handles(region):
+    other = SharedRegion.open(region.name, region.size)
+    with region.lock() as locked:
+        assert locked
+        with other.lock(blocking=False) as other_locked:
+            assert not other_locked
+    other.close()
+
+
+def test_table_lookup():
+    record = struct.Struct("<4sI")
+    keys = [uuid.uuid4().bytes[:4] for _ in range(100)]
+    table = pack_table(((key, struct.pack("<I", i)) for i, key in enumerate(keys)), record, key_size=4)
+    view = memoryview(table)
+    for i, key in enumerate(keys):
+        assert find_record(view, record, key) == (key, i)
+    missing = next(key for key in (bytes([i]) * 4 for i in range(256)) if key not in keys)
+    assert find_record(view, record, missing) is None
+
+
+def test_catalog_serves_snapshot_until_invalidated(monkeypatch):
+    problem_id, right, wrong = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    tag = {"id": str(uuid.uuid4()), "name": "calculus", "description": None, "created_by": str(uuid.uuid4())}
+    sections = {
+        "tags": json.dumps([tag]).encode(),
+        "counts": json.dumps({"problems": 1, "by_tag": {"calculus": 1}, "by_difficulty": {"2": 1}}).encode(),
+        "grading": pack_table(
+            [(right.bytes, problem_id.bytes + b"\x01"), (wrong.bytes, problem_id.bytes + b"\x00")],
+            GRADING_RECORD,
+            key_size=16,
+        ),
+    }
+    monkeypatch.setattr(catalog_module, "region_name", lambda: f"test-catalog-{uuid.uuid4().hex[:8]}")
+    monkeypatch.setattr(catalog_module, "build_sections", lambda db: sections)
+
+    catalog = SharedCatalog(enabled=True, size=1024 * 1024)
+    try:
+        assert catalog.grade_choice(right) is None
+        assert catalog.needs_refresh()
+        assert catalog.refresh(Mock())
+        assert not catalog.needs_refresh()
+
+        assert catalog.grade_choice(right) == (problem_id, True)
+        assert catalog.grade_choice(wrong) == (problem_id, False)
+        assert catalog.grade_choice(uuid.uuid4()) is None
+        assert catalog.tags() == [tag]
+        assert catalog.problem_count() == 1
+        assert catalog.problem_count(tag="calculus") == 1
+        assert catalog.problem_count(tag="algebra") == 0
+        assert catalog.problem_count(difficulty=2) == 1
+        assert catalog.problem_count(tag="calculus", difficulty=2) is None
+
+        catalog.invalidate()
+        assert catalog.tags() is None
+        assert catalog.needs_refresh()
+    finally:
+        catalog.close(unlink=True)
+
+
+def test_disabled_catalog_falls_back_to_database():
+    catalog = SharedCatalog(enabled=False, size=1024 * 1024)
+    assert catalog.region is None
+    assert catalog.grade_choice(uuid.uuid4()) is None
+    assert catalog.problem_count() is None
+    assert not catalog.refresh(Mock())
+    catalog.invalidate()
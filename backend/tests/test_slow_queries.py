@@ -0,0 +1,94 @@
+import json
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app.core.metrics import MetricsMiddleware
+from app.db import slow_queries
+from app.db.slow_queries import SlowQueryLog, fingerprint, normalize_statement, redact_parameters
+
+
+def test_fingerprint_ignores_literals_and_placeholders():
+    assert normalize_statement(
+        "SELECT * FROM problems\n WHERE id = $1 AND title = 'a''b' AND points > 10 LIMIT %(limit)s"
+    ) == "SELECT * FROM problems WHERE id = ? AND title = ? AND points > ? LIMIT ?"
+    assert fingerprint("SELECT * FROM tags WHERE id IN (?, ?)") == fingerprint(
+        "SELECT * FROM tags WHERE id IN (%s, %s, %s)"
+    )
+    assert fingerprint("SELECT * FROM tags") != fingerprint("SELECT * FROM problems")
+
+
+def test_redact_parameters():
+    user_id = uuid.uuid4()
+    assert redact_parameters({"email": "a@example.com", "id": user_id, "limit": 20, "flag": None}) == {
+        "email": "<str:13>", "id": "<uuid>", "limit": 20, "flag": None,
+    }
+    assert redact_parameters(("secret", 1.5)) == ["<str:6>", 1.5]
+
+
+def test_aggregates_by_fingerprint(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    log = SlowQueryLog(threshold_ms=1, path=str(path))
+    for i, duration in enumerate([0.1, 0.2, 0.3, 0.4]):
+        log.record(f"SELECT * FROM problems WHERE id = {i}", (), duration, route="/problems/{problem_id}")
+    log.record("SELECT 1", (), 0.05)
+
+    top, other = log.summaries()
+    assert top["count"] == 4
+    assert top["total_ms"] == 1000.0
+    assert top["max_ms"] == 400.0
+    assert top["p50_ms"] == 250.0
+    assert top["routes"] == {"/problems/{problem_id}": 4}
+    assert other["routes"] == {"-": 1}
+    assert [s["count"] for s in log.summaries(sort="count", limit=1)] == [4]
+
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(entries) == 5
+    assert entries[0]["fingerprint"] == top["fingerprint"]
+    assert entries[0]["duration_ms"] == 100.0
+
+
+@pytest.fixture
+def slow_log(monkeypatch):
+    # しきい値 0 ミリ秒に近い値にして、すべてのクエリを記録させる
+    log = SlowQueryLog(threshold_ms=0.000001)
+    monkeypatch.setattr(slow_queries, "slow_query_log", log)
+    return log
+
+
+def test_records_route_of_slow_queries(slow_log):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT :id"), {"id": item_id})
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware)
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+
+    [summary] = [s for s in slow_log.summaries() if s["statement"] == "SELECT ?"]
+    assert summary["count"] == 2
+    assert summary["routes"] == {"/items/{item_id}": 2}
+    assert summary["plan"] is None
+
+
+def test_first_explain_is_reserved():
+    """初めての文でも実行計画の取得は一度だけ予約され、記録前の集計は一覧に出ない"""
+    log = SlowQueryLog(threshold_ms=1, explain_interval=300)
+    statement = "SELECT * FROM problems WHERE id = 1"
+    assert log.should_explain(statement)
+    assert not log.should_explain("SELECT * FROM problems WHERE id = 2")
+    assert log.summaries() == []
+
+    log.record(statement, (), 0.2, plan=[{"Plan": {}}])
+    assert [s["count"] for s in log.summaries()] == [1]
+    assert not log.should_explain(statement)
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from app.services.spaced_repetition import (
+    MAX_STABILITY_DAYS,
+    MIN_EASE_FACTOR,
+    ReviewState,
+    quality_from_answer,
+    review_state_of,
+    schedule_review,
+)
+
+
+def test_intervals_grow_with_consecutive_correct_answers():
+    """連続正解で復習間隔が 1日 → 6日 → 6×EF日 と伸びる"""
+    now = datetime(2023, 1, 1)
+    state = ReviewState()
+    intervals = []
+    for _ in range(3):
+        state, due_at = schedule_review(state, quality_from_answer(True), now)
+        intervals.append(due_at - now)
+    assert intervals[0] == timedelta(days=1)
+    assert intervals[1] == timedelta(days=6)
+    assert intervals[2] == timedelta(days=6 * state.ease_factor)
+    assert state.review_streak == 3
+
+
+def test_incorrect_answer_resets_streak_and_lowers_ease():
+    """不正解で連続正解数がリセットされ、伸び率が下がる（下限あり）"""
+    now = datetime(2023, 1, 1)
+    state = ReviewState(ease_factor=2.5, stability=15.0, review_streak=3)
+    state, due_at = schedule_review(state, quality_from_answer(False), now)
+    assert state.review_streak == 0
+    assert due_at == now + timedelta(days=1)
+    assert state.ease_factor < 2.5
+
+    for _ in range(10):
+        state, _ = schedule_review(state, quality_from_answer(False), now)
+    assert state.ease_factor == MIN_EASE_FACTOR
+
+
+def test_interval_is_capped_after_many_correct_answers():
+    """連続正解が続いても復習日時が日時の範囲を超えない"""
+    now = datetime(2023, 1, 1)
+    state = ReviewState()
+    for _ in range(100):
+        state, due_at = schedule_review(state, quality_from_answer(True), now)
+    assert state.stability == MAX_STABILITY_DAYS
+    assert due_at == now + timedelta(days=MAX_STABILITY_DAYS)
+
+
+def test_review_state_of_unsaved_progress():
+    """値が未設定の進捗は初期状態として扱われる"""
+    assert review_state_of(None, None, None) == ReviewState()
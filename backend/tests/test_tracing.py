@@ -0,0 +1,114 @@
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app.core import tracing
+from app.core.tracing import (
+    BatchSpanProcessor, OTLPExporter, Span, Tracer, TracingMiddleware, parse_traceparent, traced,
+)
+
+PARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def shutdown(self):
+        pass
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(PARENT) == ("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331", True)
+    assert parse_traceparent(PARENT[:-1] + "0")[2] is False
+    assert parse_traceparent("00-" + "0" * 32 + "-b7ad6b7169203331-01") is None
+    assert parse_traceparent("garbage") is None
+
+
+@pytest.fixture
+def traced_app(monkeypatch):
+    exporter = ListExporter()
+    test_tracer = Tracer(sample_rate=0.0, processor=BatchSpanProcessor(exporter, interval=60))
+    monkeypatch.setattr(tracing, "tracer", test_tracer)
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @traced
+    def load_item(item_id: int) -> int:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT :id"), {"id": item_id}).scalar()
+
+    @traced(name="dependency")
+    async def dependency() -> str:
+        return "ok"
+
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int, value: str = Depends(dependency)):
+        return {"id": load_item(item_id), "value": value}
+
+    app.add_middleware(TracingMiddleware, tracer=test_tracer)
+    yield TestClient(app), test_tracer, exporter
+    test_tracer.shutdown()
+
+
+def _spans(test_tracer, exporter):
+    test_tracer.processor.flush()
+    return {span.name: span for span in exporter.spans}
+
+
+def test_records_nested_spans_for_sampled_parent(traced_app):
+    client, test_tracer, exporter = traced_app
+    response = client.get("/items/7", headers={"traceparent": PARENT})
+
+    assert response.json() == {"id": 7, "value": "ok"}
+    spans = _spans(test_tracer, exporter)
+    root = spans["GET /items/{item_id}"]
+    assert root.trace_id == "0af7651916cd43dd8448eb211c80319c"
+    assert root.parent_id == "b7ad6b7169203331"
+    assert root.attributes["http.status_code"] == 200
+    assert response.headers["traceresponse"] == f"00-{root.trace_id}-{root.span_id}-01"
+
+    assert spans["dependency"].parent_id == root.span_id
+    load = spans["test_tracing.traced_app.<locals>.load_item"]
+    assert load.parent_id == root.span_id
+    query = spans["db.query"]
+    assert query.parent_id == load.span_id
+    assert query.kind == "client"
+    assert query.attributes["db.statement"] == "SELECT ?"
+    assert {span.trace_id for span in spans.values()} == {root.trace_id}
+
+
+def test_skips_unsampled_requests(traced_app):
+    client, test_tracer, exporter = traced_app
+    client.get("/items/1")
+    client.get("/items/1", headers={"traceparent": PARENT[:-1] + "0"})
+    assert _spans(test_tracer, exporter) == {}
+
+
+def test_otlp_export():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    exporter = OTLPExporter("http://collector:4318/", "math-lms-api", client=client)
+    span = Span(name="GET /", trace_id="a" * 32, kind="server", attributes={"http.status_code": 200})
+    span.end_ns = span.start_ns + 1000
+    exporter.export([span])
+
+    [request] = requests
+    assert request.url == "http://collector:4318/v1/traces"
+    [resource] = httpx.Response(200, content=request.content).json()["resourceSpans"]
+    [exported] = resource["scopeSpans"][0]["spans"]
+    assert exported["traceId"] == "a" * 32
+    assert exported["kind"] == 2
+    assert exported["attributes"] == [{"key": "http.status_code", "value": {"intValue": "200"}}]